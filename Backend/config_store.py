@@ -0,0 +1,169 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+
+LOGGER = logging.getLogger(__name__)
+
+# Overridable to run the controller outside of its container
+CONFIG_PATH = os.environ.get("REGPAC_CONFIG", "/container/config/config.json")
+
+
+def atomic_write(path: str, content: str) -> tuple:
+    """
+    Write to a temporary file, fsync it then rename it over path: readers see the old or the new content, never a mix.
+    Returns the (mtime_ns, size, inode) signature of the written file, kept by the rename.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+        stat = os.fstat(f.fileno())
+    os.replace(temp_path, path)
+    # Persist the rename itself
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+class ConfigStore:
+    """
+    Write-behind persistence of the program config.
+    The config stays in memory, save() only marks it dirty: changes made within flush_interval
+    seconds after the first pending one are written once, by a job of the scheduler given to attach(),
+    without one by the next save or by flush()/close(). Writes go to a temporary file which is
+    fsynced then renamed over the config, so a crash never leaves a truncated config.json.
+    The signature of the last write is kept so that a watcher of the file can tell it from an edit.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 2.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._lock = threading.RLock()
+        self._config: dict = None
+        self._pending_since: float = None
+        self._written: tuple = None
+        self._scheduler = None
+        self._job: str = None
+        self._stats = {
+            "saves": 0,
+            "writes": 0,
+            "errors": 0,
+            "last_flush_latency": 0.0,
+            "max_flush_latency": 0.0,
+        }
+
+    def load(self) -> dict:
+        with open(self.path, "r") as f:
+            return json.load(f)
+
+    def attach(self, scheduler, job: str = "config_flush"):
+        """Run the deferred writes as a triggered job of scheduler, None detaches it."""
+        with self._lock:
+            self._scheduler, self._job = scheduler, job
+            if scheduler is not None:
+                scheduler.add_job(job, self.flush)
+                if self._pending_since is not None:
+                    scheduler.trigger(job, at=self._pending_since + self.flush_interval)
+
+    def save(self, config: dict):
+        with self._lock:
+            self._config = config
+            self._stats["saves"] += 1
+            if self._pending_since is None:
+                self._pending_since = time.monotonic()
+                if self._scheduler is not None and self.flush_interval > 0:
+                    self._scheduler.trigger(self._job, at=self._pending_since + self.flush_interval)
+            if self.flush_interval <= 0 or time.monotonic() >= self._pending_since + self.flush_interval:
+                self._flush()
+
+    def is_pending(self) -> bool:
+        with self._lock:
+            return self._pending_since is not None
+
+    def is_own_write(self, signature: tuple) -> bool:
+        """Tell whether the file with this (mtime_ns, size, inode) signature is the last one written by the store."""
+        with self._lock:  # A write in progress is waited for
+            return signature is not None and signature == self._written
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        self.flush()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending"] = self._pending_since is not None
+            stats["pending_age"] = time.monotonic() - self._pending_since if self._pending_since is not None else 0.0
+            return stats
+
+    def _flush(self):
+        if self._pending_since is None:
+            return
+
+        start = time.monotonic()
+        try:
+            self._written = self._write(json.dumps(self._config, indent=4))
+        except OSError as e:
+            # Keep the change pending, the next save or flush retries
+            self._stats["errors"] += 1
+            LOGGER.error(f"Fail to write config to {self.path} due to : {e}")
+            return
+        end = time.monotonic()
+        self._stats["writes"] += 1
+        self._stats["last_flush_latency"] = end - self._pending_since
+        self._stats["max_flush_latency"] = max(self._stats["max_flush_latency"], self._stats["last_flush_latency"])
+        self._pending_since = None
+        LOGGER.info(f"Config written to {self.path} in {(end - start) * 1000:.1f} ms")
+
+    def _write(self, content: str) -> tuple:
+        return atomic_write(self.path, content)
+
+
+_store = ConfigStore(CONFIG_PATH)
+
+atexit.register(_store.close)
+
+
+def configure(settings: dict):
+    """Apply the 'app' section of the config to the config store."""
+    _store.flush_interval = settings.get("config_flush_interval", _store.flush_interval)
+
+
+def attach_scheduler(scheduler):
+    """Write the pending config from a job of the shared scheduler."""
+    _store.attach(scheduler)
+
+
+def load() -> dict:
+    return _store.load()
+
+
+def save(config: dict):
+    _store.save(config)
+
+
+def is_pending() -> bool:
+    return _store.is_pending()
+
+
+def is_own_write(signature: tuple) -> bool:
+    return _store.is_own_write(signature)
+
+
+def flush():
+    _store.flush()
+
+
+def get_stats() -> dict:
+    return _store.get_stats()
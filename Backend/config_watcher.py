@@ -0,0 +1,118 @@
+import ctypes
+import ctypes.util
+import json
+import logging
+import os
+import select
+import threading
+
+LOGGER = logging.getLogger(__name__)
+
+# inotify(7) event masks
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+
+
+class ConfigWatcher:
+    """
+    Watch the config file and call on_change(config) with its new content.
+    The directory is watched with inotify so that editors replacing the file are seen too;
+    where inotify is not available the file is polled every poll_interval seconds.
+    In both cases a change is only reported when the file's mtime, size or inode moved
+    and its content parses, a half written file is reported once complete.
+    ignore, when set, is called with the (mtime_ns, size, inode) signature of a changed file
+    and returns True for the changes not to report, like the writes of the program itself.
+    """
+
+    def __init__(self, path: str, on_change, poll_interval: float = 5.0, ignore=None):
+        self.path = path
+        self.poll_interval = poll_interval
+        self._on_change = on_change
+        self._ignore = ignore
+        self._signature = self._stat()
+        self._stopping = threading.Event()
+        self._wake_read: int = None
+        self._wake_write: int = None
+        self._inotify_fd: int = None
+        self._thread: threading.Thread = None
+
+    def start(self):
+        self._inotify_fd = self._open_inotify()
+        self._wake_read, self._wake_write = os.pipe()
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="config-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stopping.set()
+        os.write(self._wake_write, b"\0")
+        self._thread.join(timeout=5)
+        self._thread = None
+        for fd in (self._inotify_fd, self._wake_read, self._wake_write):
+            if fd is not None:
+                os.close(fd)
+        self._inotify_fd = self._wake_read = self._wake_write = None
+
+    def uses_inotify(self) -> bool:
+        return self._inotify_fd is not None
+
+    def check(self):
+        """Report the file content if it changed since the last check."""
+        signature = self._stat()
+        if signature == self._signature:
+            return
+        if self._ignore is not None and self._ignore(signature):
+            self._signature = signature
+            return
+        try:
+            with open(self.path, "r") as f:
+                config = json.load(f)
+        except (OSError, ValueError) as e:
+            LOGGER.warning(f"Ignore unreadable config {self.path}: {e}")
+            return
+        self._signature = signature
+        self._on_change(config)
+
+    def _stat(self) -> tuple:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def _open_inotify(self) -> int:
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+            directory = os.path.dirname(os.path.abspath(self.path)).encode()
+            if libc.inotify_add_watch(fd, directory, IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE) < 0:
+                errno = ctypes.get_errno()
+                os.close(fd)
+                raise OSError(errno, "inotify_add_watch failed")
+            return fd
+        except (OSError, AttributeError) as e:
+            LOGGER.info(f"inotify not available ({e}), polling {self.path} every {self.poll_interval}s")
+            return None
+
+    def _run(self):
+        watched = [self._wake_read] + ([self._inotify_fd] if self._inotify_fd is not None else [])
+        while not self._stopping.is_set():
+            ready, _, _ = select.select(watched, [], [], self.poll_interval)
+            if self._stopping.is_set():
+                return
+            if self._inotify_fd in ready:
+                # Events only wake the loop, the file signature tells whether our file changed
+                try:
+                    while os.read(self._inotify_fd, 4096):
+                        pass
+                except BlockingIOError:
+                    pass
+            try:
+                self.check()
+            except Exception:
+                LOGGER.exception(f"Fail to apply config change from {self.path}")
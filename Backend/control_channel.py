@@ -0,0 +1,219 @@
+import json
+import logging
+import os
+import socket
+import threading
+
+try:
+    from .state_snapshot import StatePublisher, changed_sections
+except ImportError:
+    from state_snapshot import StatePublisher, changed_sections
+
+LOGGER = logging.getLogger(__name__)
+
+
+class ControlError(ConnectionError):
+    """The controller process could not be reached, or failed to answer a call."""
+
+
+def _send(sock: socket.socket, message: dict):
+    sock.sendall(json.dumps(message).encode() + b"\n")
+
+
+class ControlServer:
+    """
+    Controller side of the channel with the API process: newline delimited JSON over a Unix socket.
+    A connection either makes one call, {"op": name, "args": {...}} answered with {"result": ...} or {"error": ...},
+    or subscribes with {"op": "subscribe"}: it then gets the full state, followed by the sections changed by
+    each publication, and an empty message every heartbeat seconds while nothing changes.
+    """
+
+    def __init__(self, path: str, state: StatePublisher, handlers: dict, heartbeat: float = 15.0):
+        self.path = path
+        self.state = state
+        self.handlers = handlers
+        self.heartbeat = heartbeat
+        self._socket: socket.socket = None
+        self._thread: threading.Thread = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._connections = set()
+
+    def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # Left over by a previous run
+        self._stopping.clear()
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.bind(self.path)
+        os.chmod(self.path, 0o660)
+        self._socket.listen(16)
+        self._thread = threading.Thread(target=self._accept, name="control-server", daemon=True)
+        self._thread.start()
+        LOGGER.info(f"Control channel listening on {self.path}")
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._socket.shutdown(socket.SHUT_RDWR)  # Unblock accept()
+        self._thread.join(timeout=5)
+        self._thread = None
+        self._socket.close()
+        with self._lock:
+            for connection in self._connections:
+                try:
+                    connection.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass  # Already closed
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def _accept(self):
+        while not self._stopping.is_set():
+            try:
+                connection, _ = self._socket.accept()
+            except OSError as e:
+                if not self._stopping.is_set():
+                    LOGGER.error(f"Fail to accept a control connection due to : {e}")
+                    self._stopping.wait(0.1)
+                continue
+            threading.Thread(target=self._serve, args=(connection,), name="control-connection", daemon=True).start()
+
+    def _serve(self, connection: socket.socket):
+        with self._lock:
+            self._connections.add(connection)
+        try:
+            with connection:
+                line = connection.makefile("rb").readline()
+                if not line:
+                    return
+                request = json.loads(line)
+                if request.get("op") == "subscribe":
+                    self._stream(connection)
+                else:
+                    _send(connection, self._call(request.get("op"), request.get("args") or {}))
+        except (OSError, ValueError) as e:
+            LOGGER.debug(f"Control connection closed: {e}")
+        finally:
+            with self._lock:
+                self._connections.discard(connection)
+
+    def _call(self, op: str, args: dict) -> dict:
+        handler = self.handlers.get(op)
+        if handler is None:
+            return {"error": f"Unknown operation {op}"}
+        try:
+            return {"result": handler(**args)}
+        except Exception as e:
+            LOGGER.exception(f"Control call {op} failed")
+            return {"error": f"{op} failed: {e}"}
+
+    def _stream(self, connection: socket.socket):
+        previous = None
+        snapshot = self.state.current
+        while not self._stopping.is_set() and not self.state.closed:
+            if previous is None or snapshot.version != previous.version:
+                # The bodies cached by the snapshot are sent as they are, nothing is serialised again
+                connection.sendall(b'{"sections": ' + changed_sections(previous, snapshot).encode() + b'}\n')
+                previous = snapshot
+            else:
+                connection.sendall(b'{}\n')
+            snapshot = self.state.wait_for_change(previous.version, self.heartbeat)
+
+
+class ControlClient:
+    """
+    API side of the channel. Calls are made on a connection of their own, connecting a Unix socket costs
+    next to nothing. A thread keeps a subscription open and publishes the received sections to the local
+    state, from which the API answers without a round trip to the controller.
+    """
+
+    def __init__(self, path: str, state: StatePublisher, timeout: float = 10.0, heartbeat: float = 15.0, retry_delay: float = 1.0):
+        self.path = path
+        self.state = state
+        self.timeout = timeout
+        self.heartbeat = heartbeat
+        self.retry_delay = retry_delay
+        self.connected = False
+        self._synced = threading.Event()
+        self._stopping = threading.Event()
+        self._socket: socket.socket = None
+        self._thread: threading.Thread = None
+
+    def call(self, op: str, args: dict = None, timeout: float = None):
+        """Run a handler of the controller and return its result, raise ControlError when it cannot."""
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(timeout if timeout is not None else self.timeout)
+                sock.connect(self.path)
+                _send(sock, {"op": op, "args": args or {}})
+                line = sock.makefile("rb").readline()
+        except OSError as e:
+            raise ControlError(f"Controller unreachable: {e}") from e
+        if not line:
+            raise ControlError("Controller closed the connection")
+        try:
+            reply = json.loads(line)
+            if "error" in reply:
+                raise ControlError(reply["error"])
+            return reply["result"]
+        except (ValueError, KeyError, TypeError) as e:
+            raise ControlError(f"Invalid reply from the controller: {e}") from e
+
+    def start(self):
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="control-subscription", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stopping.set()
+        sock = self._socket
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self._thread.join(timeout=5)
+        self._thread = None
+
+    def wait_synced(self, timeout: float = None) -> bool:
+        """Wait for the first state received from the controller."""
+        return self._synced.wait(timeout)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                self._subscribe()
+            except (OSError, ValueError) as e:
+                if self._stopping.is_set():
+                    break
+                if self.connected:
+                    LOGGER.warning(f"Control subscription lost: {e}, retrying every {self.retry_delay}s")
+                else:
+                    LOGGER.debug(f"Fail to subscribe to the controller due to : {e}")
+            self.connected = False
+            self._stopping.wait(self.retry_delay)
+
+    def _subscribe(self):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+            _send(sock, {"op": "subscribe"})
+            sock.settimeout(self.heartbeat * 3)  # A silent controller is a dead one
+            self._socket = sock
+            try:
+                for line in sock.makefile("rb"):
+                    sections = json.loads(line).get("sections")
+                    if sections:
+                        self.state.publish(lambda: sections)
+                    if not self.connected:
+                        LOGGER.info(f"Control subscription established on {self.path}")
+                        self.connected = True
+                        self._synced.set()
+                    if self._stopping.is_set():
+                        return
+            finally:
+                self._socket = None
+        raise ConnectionError("Controller closed the subscription")
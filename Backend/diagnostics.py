@@ -0,0 +1,183 @@
+import contextlib
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+
+NULL_CONTEXT = contextlib.nullcontext()
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def sample_stacks(duration: float, interval: float = 0.005) -> Counter:
+    """
+    Sample the stacks of every other thread for duration seconds.
+    Returns the number of samples of each collapsed stack, 'thread;outer;...;inner'.
+    """
+    me = threading.get_ident()
+    stacks = Counter()
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            labels.append(names.get(ident, str(ident)))
+            stacks[";".join(reversed(labels))] += 1
+        time.sleep(interval)
+    return stacks
+
+
+def collapse(stacks: Counter) -> str:
+    """Collapsed stack lines, as read by flamegraph.pl or speedscope."""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def top_functions(stacks: Counter, limit: int = 30) -> list:
+    """pstats like summary: samples where a function was running (self) or on the stack (cumulative)."""
+    own = Counter()
+    cumulative = Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(";")[1:]
+        if frames:
+            own[frames[-1]] += count
+        for function in set(frames):
+            cumulative[function] += count
+    total = sum(stacks.values()) or 1
+    return [{"function": function, "self": own[function], "cumulative": samples, "cumulative_ratio": samples / total}
+            for function, samples in cumulative.most_common(limit)]
+
+
+class MemoryTracker:
+    """tracemalloc snapshots, each one is compared with the previous."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._previous: tracemalloc.Snapshot = None
+
+    def start(self, frames: int = 10):
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+            self._previous = None
+
+    def stop(self):
+        with self._lock:
+            tracemalloc.stop()
+            self._previous = None
+
+    def is_tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def snapshot(self, limit: int = 20) -> dict:
+        with self._lock:
+            snapshot = tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+            current, peak = tracemalloc.get_traced_memory()
+            result = {
+                "traced_bytes": current,
+                "peak_bytes": peak,
+                "top": [{"location": str(stat.traceback), "size": stat.size, "count": stat.count}
+                        for stat in snapshot.statistics("lineno")[:limit]],
+                "diff": None
+            }
+            if self._previous is not None:
+                result["diff"] = [{"location": str(stat.traceback), "size_diff": stat.size_diff, "count_diff": stat.count_diff, "size": stat.size}
+                                  for stat in snapshot.compare_to(self._previous, "lineno")[:limit]]
+            self._previous = snapshot
+            return result
+
+
+class TickTimings:
+    """
+    Ring buffer with the duration of each stage of the last `size` regulation ticks.
+    A tick is opened by the outermost tick() of a thread, nested ones are part of it.
+    Stage durations are exclusive: the time of a stage nested in another one is only counted once.
+    """
+
+    def __init__(self, size: int = 100):
+        self._lock = threading.Lock()
+        self._ticks = deque(maxlen=size)
+        self._local = threading.local()
+
+    @contextlib.contextmanager
+    def tick(self, kind: str):
+        if getattr(self._local, "stages", None) is not None:
+            yield
+            return
+        self._local.stages = {}
+        self._local.running = []
+        start, started_at = time.monotonic(), time.time()
+        try:
+            yield
+        finally:
+            entry = {"kind": kind, "start": started_at, "total": time.monotonic() - start, "stages": self._local.stages}
+            self._local.stages = None
+            with self._lock:
+                self._ticks.append(entry)
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        stages = getattr(self._local, "stages", None)
+        if stages is None:
+            yield
+            return
+        running = [time.monotonic(), 0.0]  # Start and time spent in nested stages
+        self._local.running.append(running)
+        try:
+            yield
+        finally:
+            self._local.running.pop()
+            elapsed = time.monotonic() - running[0]
+            stages[name] = stages.get(name, 0.0) + elapsed - running[1]
+            if self._local.running:
+                self._local.running[-1][1] += elapsed
+
+    def get_ticks(self) -> list:
+        with self._lock:
+            return list(self._ticks)
+
+
+_timings: TickTimings = None
+_memory = MemoryTracker()
+
+
+def configure(settings: dict):
+    """Apply the 'diagnostics' section of the config, everything stays off unless enabled."""
+    global _timings
+    if settings.get("enabled", False):
+        size = settings.get("tick_history", 100)
+        if _timings is None or _timings._ticks.maxlen != size:
+            _timings = TickTimings(size)
+    else:
+        _timings = None
+        if _memory.is_tracing():
+            _memory.stop()
+
+
+def is_enabled() -> bool:
+    return _timings is not None
+
+
+def tick(kind: str):
+    return _timings.tick(kind) if _timings is not None else NULL_CONTEXT
+
+
+def stage(name: str):
+    return _timings.stage(name) if _timings is not None else NULL_CONTEXT
+
+
+def get_ticks() -> list:
+    return _timings.get_ticks() if _timings is not None else []
+
+
+def get_memory() -> MemoryTracker:
+    return _memory
@@ -0,0 +1,161 @@
+import json
+import logging
+import socket
+import threading
+import time
+
+from datetime import datetime
+
+try:
+    from . import http_client
+    from .temperature import Measure
+except ImportError:
+    import http_client
+    from temperature import Measure
+
+LOGGER = logging.getLogger(__name__)
+
+
+class FhemEventListener:
+    """
+    Keep one FHEM longpoll (inform) connection open and maintain the current
+    temperature of the configured sensors from the pushed reading events.
+
+    FHEMWEB sends one JSON array per line, e.g.:
+    - ["EnO_12345678-temperature", "19.5", "19.5"]
+    - ["EnO_12345678-temperature-ts", "2024-12-10 23:53:39", "2024-12-10 23:53:39"]
+    on_change is called with the whole measurement set when a sensor temperature changes,
+    on_connection_change with True or False as soon as the stream is established or lost.
+    """
+
+    READING = "temperature"
+
+    def __init__(self, url: str, sensors: list, on_change, reconnect_delay: float = 1.0, max_reconnect_delay: float = 60.0, read_timeout: float = 900.0,
+                 on_connection_change=None):
+        self._url = url
+        self._names = {sensor['device']: sensor['name'] for sensor in sensors}
+        self._on_change = on_change
+        self._on_connection_change = on_connection_change
+        self._reconnect_delay = reconnect_delay
+        self._max_reconnect_delay = max_reconnect_delay
+        self._read_timeout = read_timeout
+        self._lock = threading.Lock()
+        self._measures = {}
+        self._pending_values = {}
+        self._response = None
+        self._thread: threading.Thread = None
+        self._stopping = threading.Event()
+        self.connected = False
+
+    def start(self):
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="fhem-events", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        response = self._response
+        if response is not None:
+            # Closing the response would wait for the blocked reader, shut the socket down instead
+            sock = getattr(getattr(response.raw, "connection", None), "sock", None)
+            if sock is not None:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def get_measures(self) -> list:
+        """Get the current measurement set, in the configured sensor order."""
+        with self._lock:
+            return [self._measures[device] for device in self._names if device in self._measures]
+
+    def seed(self, measures: list):
+        """Reconcile the event state with a polled measurement set."""
+        devices = {name: device for device, name in self._names.items()}
+        with self._lock:
+            for measure in measures:
+                device = devices.get(measure.name)
+                if device is not None:
+                    self._measures[device] = measure
+
+    def _run(self):
+        delay = self._reconnect_delay
+        while not self._stopping.is_set():
+            try:
+                self._listen()
+                delay = self._reconnect_delay
+            except Exception as e:
+                if not self._stopping.is_set():
+                    LOGGER.warning(f"FHEM event stream failed with exception : {e}")
+            if self.connected:
+                self.connected = False
+                if not self._stopping.is_set():
+                    self._notify_connection(False)
+            if self._stopping.wait(delay):
+                break
+            delay = min(delay * 2, self._max_reconnect_delay)
+
+    def _listen(self):
+        params = {
+            "XHR": "1",
+            "inform": f"type=status;filter={','.join(self._names)};fmt=JSON",
+            "timestamp": str(int(time.time() * 1000)),
+        }
+        self._response = http_client.get(self._url, params=params, stream=True, timeout=(10, self._read_timeout))
+        try:
+            if self._response.status_code != 200:
+                LOGGER.warning(f"FHEM event stream refused with status code {self._response.status_code}")
+                return
+            self.connected = True
+            LOGGER.info("FHEM event stream connected")
+            self._notify_connection(True)
+            # Events are small and rare: read byte per byte so each line is handled as soon as it arrives
+            for line in self._response.iter_lines(chunk_size=1):
+                if self._stopping.is_set():
+                    break
+                if line:
+                    self._handle_line(line)
+        finally:
+            self._response.close()
+            self._response = None
+
+    def _notify_connection(self, connected: bool):
+        if self._on_connection_change is None:
+            return
+        try:
+            self._on_connection_change(connected)
+        except Exception:
+            LOGGER.exception("FHEM event stream connection callback failed")
+
+    def _handle_line(self, line: bytes):
+        try:
+            event = json.loads(line)
+            key, value = event[0], event[1]
+        except (ValueError, IndexError, TypeError):
+            LOGGER.debug(f"Ignore FHEM event line: {line}")
+            return
+
+        if key.endswith(f"-{self.READING}-ts"):
+            device = key[:-len(f"-{self.READING}-ts")]
+            if device in self._names and device in self._pending_values:
+                self._update(device, self._pending_values.pop(device), value)
+        elif key.endswith(f"-{self.READING}"):
+            device = key[:-len(f"-{self.READING}")]
+            if device in self._names:
+                self._pending_values[device] = value
+
+    def _update(self, device: str, value: str, time_str: str):
+        try:
+            meas = Measure(temperature=float(value), name=self._names[device], timestamp=datetime.strptime(time_str, "%Y-%m-%d %H:%M:%S"))
+        except ValueError:
+            LOGGER.warning(f"Ignore malformed {device} reading: {value} at {time_str}")
+            return
+
+        with self._lock:
+            previous = self._measures.get(device)
+            self._measures[device] = meas
+        if previous is None or previous.temp != meas.temp:
+            LOGGER.info(f"FHEM event: {meas.name} now {meas.temp}°C")
+            self._on_change(self.get_measures())
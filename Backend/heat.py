@@ -1,9 +1,20 @@
 import requests
 import logging
+import random
+import threading
 import time
 
+try:
+    from . import http_client, metrics
+except ImportError:
+    import http_client
+    import metrics
+
 LOGGER = logging.getLogger(__name__)
 
+ACTUATOR_COMMAND_SECONDS = metrics.histogram("regpac_actuator_command_seconds", "Latency of the actuator commands sent to FHEM")
+ACTUATOR_COMMANDS = metrics.counter("regpac_actuator_commands", "Actuator commands sent to FHEM by outcome", ("outcome",))
+
 ellapsed_time_before_force_sent: float = 3600.0
 timestamp_on_last_sent: float = 0.0
 status_on_last_sent: bool = None
@@ -14,8 +25,6 @@ def send_heat(config: dict, enable: bool):
     global status_on_last_sent
     now = time.time()
     if status_on_last_sent != enable or (now - timestamp_on_last_sent) > ellapsed_time_before_force_sent:
-        timestamp_on_last_sent = now
-
         device = config['actuator']['device']
         if enable:
             params = {
@@ -29,19 +38,148 @@ def send_heat(config: dict, enable: bool):
             }
 
         try:
-            response = requests.post(config['fhem']['url'], params=params)
+            with ACTUATOR_COMMAND_SECONDS.time():
+                response = http_client.post(config['fhem']['url'], params=params)
             if response.status_code == 200:
+                # Only a command that went through postpones the next forced refresh
+                timestamp_on_last_sent = now
                 status_on_last_sent = enable
+                ACTUATOR_COMMANDS.inc("success")
                 LOGGER.info(f"Success to switch heat to {enable}")
                 return True
             else:
+                ACTUATOR_COMMANDS.inc("rejected")
                 LOGGER.warning(f"Request to switch heat to {enable} failed with status code {response.status_code}: {response.text}")
                 return False
         except requests.RequestException as e:
+            ACTUATOR_COMMANDS.inc("error")
             LOGGER.warning(f"Request to switch heat to {enable} failed with exception : {e}")
             return False
     else:
         return True
 
+
 def get_heat_status() -> bool:
-    return status_on_last_sent
\ No newline at end of file
+    return status_on_last_sent
+
+
+def get_state() -> dict:
+    return {"status": status_on_last_sent, "sent_at": timestamp_on_last_sent}
+
+
+def restore_state(status: bool, sent_at: float):
+    """Take over the last command of a previous run: the same command is not sent again before the refresh is due."""
+    global timestamp_on_last_sent, status_on_last_sent
+    if status is None or time.time() - sent_at > ellapsed_time_before_force_sent:
+        return
+    status_on_last_sent = status
+    timestamp_on_last_sent = sent_at
+
+
+def is_refresh_due() -> bool:
+    """Tell whether the periodic forced refresh of the actuator command is due."""
+    return status_on_last_sent is None or (time.time() - timestamp_on_last_sent) > ellapsed_time_before_force_sent
+
+
+class ActuatorDispatcher:
+    """
+    Send actuator commands from a dedicated worker thread so callers never wait on FHEM.
+    Only the latest requested state is sent: a request superseded before the worker picks it up is dropped.
+    Failed commands are retried with exponential backoff and full jitter,
+    and the worker wakes up on its own to honour the ellapsed_time_before_force_sent refresh.
+    on_sent, when set, is called from the worker after each successful command.
+    """
+
+    def __init__(self, retry_base_delay: float = 1.0, retry_max_delay: float = 300.0):
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self._condition = threading.Condition()
+        self._config: dict = None
+        self._desired: bool = None
+        self._version = 0
+        self._handled_version = 0
+        self._failures = 0
+        self._retry_at: float = None
+        self._stopping = False
+        self._thread: threading.Thread = None
+        self.on_sent = None
+
+    def start(self):
+        with self._condition:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="actuator", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+
+    def request(self, config: dict, enable: bool):
+        """Record the desired heater state, returns immediately."""
+        with self._condition:
+            self._config = config
+            if enable != self._desired:
+                self._desired = enable
+                self._version += 1
+                self._condition.notify()
+
+    def get_desired(self) -> bool:
+        return self._desired
+
+    def _next_wakeup(self) -> float:
+        if self._desired is None:
+            return None  # Nothing to send or refresh before the first request
+        now = time.monotonic()
+        if self._retry_at is not None:
+            return max(self._retry_at - now, 0.0)
+        if status_on_last_sent is not None:
+            return max(timestamp_on_last_sent + ellapsed_time_before_force_sent - time.time(), 0.0) + 1.0
+        return None
+
+    def _is_due(self) -> bool:
+        if self._desired is None:
+            return False
+        if self._version != self._handled_version:
+            return True
+        if self._retry_at is not None:
+            return time.monotonic() >= self._retry_at
+        return is_refresh_due()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._stopping and not self._is_due():
+                    self._condition.wait(self._next_wakeup())
+                if self._stopping:
+                    return
+                config, enable, version = self._config, self._desired, self._version
+
+            try:
+                success = send_heat(config=config, enable=enable)
+            except Exception:
+                # Like a bad config after a reload: retried with backoff, the worker must survive it
+                LOGGER.exception(f"Unexpected error while switching heat to {enable}")
+                success = False
+
+            with self._condition:
+                self._handled_version = version
+                if success:
+                    self._failures = 0
+                    self._retry_at = None
+                else:
+                    self._failures += 1
+                    delay = min(self.retry_max_delay, self.retry_base_delay * (2 ** (self._failures - 1)))
+                    delay = random.uniform(0, delay)
+                    self._retry_at = time.monotonic() + delay
+                    LOGGER.warning(f"Retry to switch heat to {enable} in {delay:.1f}s (attempt {self._failures + 1})")
+
+            if success and self.on_sent is not None:
+                try:
+                    self.on_sent()
+                except Exception:
+                    LOGGER.exception("Actuator on_sent callback failed")
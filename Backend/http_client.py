@@ -0,0 +1,143 @@
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+LOGGER = logging.getLogger(__name__)
+
+
+class HttpClient:
+    """
+    Shared HTTP client used for every FHEM and Tempo call.
+    It keeps one requests.Session so TCP connections are reused (keep-alive)
+    and applies the same default timeout, retry policy and per-host pool limits to every request.
+    """
+
+    def __init__(self, timeout: float = 10.0, retries: int = 0, backoff_factor: float = 0.5,
+                 pool_connections: int = 4, pool_maxsize: int = 4):
+        self.timeout = timeout
+        self._session = requests.Session()
+        retry = Retry(total=retries, backoff_factor=backoff_factor, status_forcelist=(502, 503, 504),
+                      allowed_methods=None, raise_on_status=False)
+        self._adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+        self._session.mount("http://", self._adapter)
+        self._session.mount("https://", self._adapter)
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._in_flight = 0
+        self._closing = False
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+
+        parts = urlsplit(url)
+        host = f"{parts.hostname}:{parts.port or (443 if parts.scheme == 'https' else 80)}"
+        with self._lock:
+            self._in_flight += 1
+        start = time.monotonic()
+        failed = True
+        try:
+            response = self._session.request(method, url, **kwargs)
+            failed = False
+            return response
+        finally:
+            self._record(host, time.monotonic() - start, failed)
+            with self._lock:
+                self._in_flight -= 1
+                retired = self._closing and self._in_flight == 0
+            if retired:
+                self._session.close()
+
+    def _record(self, host: str, latency: float, failed: bool):
+        with self._lock:
+            stats = self._stats.setdefault(host, {"requests": 0, "errors": 0, "latency_total": 0.0, "latency_max": 0.0})
+            stats["requests"] += 1
+            stats["latency_total"] += latency
+            stats["latency_max"] = max(stats["latency_max"], latency)
+            if failed:
+                stats["errors"] += 1
+
+    def get_stats(self) -> dict:
+        """Get per-host request count, errors, latency and connection reuse figures."""
+        connections = {}
+        pools = self._adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = f"{pool.host}:{pool.port}"
+            opened, served = connections.get(host, (0, 0))
+            connections[host] = (opened + pool.num_connections, served + pool.num_requests)
+
+        result = {}
+        with self._lock:
+            for host, stats in self._stats.items():
+                opened, served = connections.get(host, (0, 0))
+                result[host] = {
+                    "requests": stats["requests"],
+                    "errors": stats["errors"],
+                    "latency_avg": stats["latency_total"] / stats["requests"],
+                    "latency_max": stats["latency_max"],
+                    "connections_opened": opened,
+                    "connections_reused": max(served - opened, 0),
+                }
+        return result
+
+    def close(self):
+        """Close the session, once the requests in flight are done when some are."""
+        with self._lock:
+            self._closing = True
+            idle = self._in_flight == 0
+        if idle:
+            self._session.close()
+
+
+_client: HttpClient = None
+_client_lock = threading.Lock()
+
+
+def configure(settings: dict) -> HttpClient:
+    """(Re)build the shared client from the 'http' section of the config."""
+    global _client
+    client = HttpClient(timeout=settings.get("timeout", 10.0),
+                        retries=settings.get("retries", 0),
+                        backoff_factor=settings.get("backoff_factor", 0.5),
+                        pool_connections=settings.get("pool_connections", 4),
+                        pool_maxsize=settings.get("pool_maxsize", 4))
+    with _client_lock:
+        previous, _client = _client, client
+    if previous is not None:
+        # Threads may still be calling through the previous client, it closes after their last request
+        previous.close()
+    return client
+
+
+def get_client() -> HttpClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+        return _client
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return get_client().get(url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return get_client().post(url, **kwargs)
+
+
+def get_stats() -> dict:
+    return get_client().get_stats()
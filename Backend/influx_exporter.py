@@ -0,0 +1,203 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import requests
+
+try:
+    from . import http_client
+except ImportError:
+    import http_client
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _escape(value: str, characters: str) -> str:
+    for character in "\\" + characters:
+        value = value.replace(character, "\\" + character)
+    return value
+
+
+def _format_field(value) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, int):
+        return f"{value}i"
+    if isinstance(value, float):
+        return repr(value)
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def format_line(measurement: str, tags: dict, fields: dict, timestamp: float) -> str:
+    """Format one point in InfluxDB line protocol, timestamp in nanoseconds."""
+    line = _escape(measurement, ", ")
+    for key, value in sorted(tags.items()):
+        line += f",{_escape(key, ',= ')}={_escape(str(value), ',= ')}"
+    line += " " + ",".join(f"{_escape(key, ',= ')}={_format_field(value)}" for key, value in fields.items())
+    return f"{line} {int(timestamp * 1e9)}"
+
+
+class InfluxExporter:
+    """
+    Publish points to an InfluxDB v1 /write endpoint from a background worker.
+    Lines are queued in a bounded in-memory queue (the oldest are dropped when full)
+    and written in batches of batch_size lines or every flush_interval seconds.
+    While the database is unreachable batches are appended to a spool file on disk
+    (up to spool_max_bytes) and replayed once writes succeed again.
+    """
+
+    def __init__(self, url: str, database: str, batch_size: int = 500, flush_interval: float = 10.0,
+                 max_queue: int = 10000, spool_path: str = None, spool_max_bytes: int = 8 * 1024 * 1024):
+        self.write_url = f"{url.rstrip('/')}/write"
+        self.database = database
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_path = spool_path
+        self.spool_max_bytes = spool_max_bytes
+        self._queue = deque()
+        self._max_queue = max_queue
+        self._condition = threading.Condition()
+        self._send_lock = threading.Lock()
+        self._stopping = False
+        self._thread: threading.Thread = None
+        self._stats = {"queued": 0, "sent": 0, "dropped": 0, "rejected": 0, "spooled": 0, "replayed": 0, "spool_dropped": 0, "failures": 0}
+
+    def start(self):
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="influx-exporter", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+        self.flush()
+
+    def submit(self, measurement: str, tags: dict, fields: dict, timestamp: float):
+        self.submit_line(format_line(measurement, tags, fields, timestamp))
+
+    def submit_line(self, line: str):
+        """Queue one line, never blocks."""
+        with self._condition:
+            if len(self._queue) >= self._max_queue:
+                self._queue.popleft()
+                self._stats["dropped"] += 1
+            self._queue.append(line)
+            self._stats["queued"] += 1
+            if len(self._queue) >= self.batch_size:
+                self._condition.notify()
+
+    def get_stats(self) -> dict:
+        with self._condition:
+            stats = dict(self._stats)
+            stats["queue_length"] = len(self._queue)
+        stats["spool_bytes"] = self._spool_size()
+        return stats
+
+    def flush(self):
+        """Write every queued line now, spooling them if the database is unreachable."""
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return
+            self._send_or_spool(batch)
+
+    def _take_batch(self) -> list:
+        with self._condition:
+            count = min(self.batch_size, len(self._queue))
+            return [self._queue.popleft() for _ in range(count)]
+
+    def _run(self):
+        while True:
+            with self._condition:
+                deadline = time.monotonic() + self.flush_interval
+                while not self._stopping and len(self._queue) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                if self._stopping:
+                    return
+            batch = self._take_batch()
+            if batch:
+                self._send_or_spool(batch)
+            elif self._spool_size():
+                self._replay()
+
+    def _send_or_spool(self, batch: list):
+        with self._send_lock:
+            if self._write(batch):
+                self._replay_locked()
+            else:
+                self._spool(batch)
+
+    def _write(self, batch: list) -> bool:
+        """Return False only when the batch should be retried later."""
+        try:
+            response = http_client.post(self.write_url, params={"db": self.database, "precision": "ns"}, data="\n".join(batch).encode())
+        except requests.RequestException as e:
+            LOGGER.warning(f"InfluxDB write failed with exception : {e}")
+            self._count("failures")
+            return False
+        if response.status_code == 204 or response.status_code == 200:
+            self._count("sent", len(batch))
+            return True
+        if 400 <= response.status_code < 500:
+            # Malformed points are never going to be accepted, do not keep them
+            LOGGER.error(f"InfluxDB rejected {len(batch)} points with status code {response.status_code}: {response.text}")
+            self._count("rejected", len(batch))
+            return True
+        LOGGER.warning(f"InfluxDB write failed with status code {response.status_code}: {response.text}")
+        self._count("failures")
+        return False
+
+    def _count(self, key: str, value: int = 1):
+        with self._condition:
+            self._stats[key] += value
+
+    def _spool_size(self) -> int:
+        if self.spool_path is None:
+            return 0
+        try:
+            return os.path.getsize(self.spool_path)
+        except OSError:
+            return 0
+
+    def _spool(self, batch: list):
+        data = "\n".join(batch) + "\n"
+        if self.spool_path is None or self._spool_size() + len(data) > self.spool_max_bytes:
+            self._count("spool_dropped", len(batch))
+            return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.spool_path)), exist_ok=True)
+            with open(self.spool_path, "a") as spool:
+                spool.write(data)
+            self._count("spooled", len(batch))
+        except OSError as e:
+            LOGGER.error(f"Failed to spool InfluxDB points to {self.spool_path}: {e}")
+            self._count("spool_dropped", len(batch))
+
+    def _replay(self):
+        with self._send_lock:
+            self._replay_locked()
+
+    def _replay_locked(self):
+        if not self._spool_size():
+            return
+        with open(self.spool_path, "r") as spool:
+            lines = spool.read().splitlines()
+        for index in range(0, len(lines), self.batch_size):
+            batch = lines[index:index + self.batch_size]
+            if not self._write(batch):
+                remaining = lines[index:]
+                temporary = self.spool_path + ".tmp"
+                with open(temporary, "w") as spool:
+                    spool.write("\n".join(remaining) + "\n")
+                os.replace(temporary, self.spool_path)
+                return
+            self._count("replayed", len(batch))
+        os.remove(self.spool_path)
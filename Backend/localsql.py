@@ -1,46 +1,407 @@
+import atexit
+import contextlib
+import logging
 import os
+import sqlite3
+import threading
 import time
 
+try:
+    from .influx_exporter import InfluxExporter
+except ImportError:
+    from influx_exporter import InfluxExporter
+
+LOGGER = logging.getLogger(__name__)
+
+LOG_DIR = "/tmp/fhem_logs"
+
 previous_state = None
 
 
+class LogWriter:
+    """
+    Append history lines to the yearly log files tailed by Telegraf.
+    File handles are kept open per file and rolled over when the year changes.
+    Lines are batched in memory and flushed when max_pending_lines is exceeded,
+    flush_interval seconds after the first pending line, or on flush()/close().
+    The deferred flush is a job of the scheduler given to attach(), without one it happens at the next write.
+    With fsync enabled every flush is forced to the storage.
+    """
+
+    def __init__(self, max_pending_lines: int = 0, flush_interval: float = 0.0, fsync: bool = False):
+        self.max_pending_lines = max_pending_lines
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self._lock = threading.RLock()
+        self._handles = {}
+        self._pending = {}
+        self._pending_count = 0
+        self._year = None
+        self._flush_at: float = None
+        self._scheduler = None
+        self._job: str = None
+
+    def attach(self, scheduler, job: str = "logs_flush"):
+        """Run the deferred flushes as a triggered job of scheduler, None detaches it."""
+        with self._lock:
+            self._scheduler, self._job = scheduler, job
+            if scheduler is not None:
+                scheduler.add_job(job, self.flush)
+                if self._flush_at is not None:
+                    scheduler.trigger(job, at=self._flush_at)
+
+    def write(self, name: str, entry: str, now: time.struct_time):
+        log_file = f"{LOG_DIR}/{name}-{now.tm_year}.log"
+        with self._lock:
+            if self._year != now.tm_year:
+                self._rollover(now.tm_year)
+            self._pending.setdefault(log_file, []).append(entry)
+            self._pending_count += 1
+            overdue = self._flush_at is not None and time.monotonic() >= self._flush_at
+            if self._pending_count > self.max_pending_lines or self.flush_interval <= 0 or overdue:
+                self._flush()
+            elif self._flush_at is None:
+                self._flush_at = time.monotonic() + self.flush_interval
+                if self._scheduler is not None:
+                    self._scheduler.trigger(self._job, at=self._flush_at)
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            for handle in self._handles.values():
+                handle.close()
+            self._handles = {}
+            self._year = None
+
+    def _rollover(self, year: int):
+        self.close()
+        self._year = year
+
+    def _flush(self):
+        self._flush_at = None
+        for log_file, entries in self._pending.items():
+            handle = self._handles.get(log_file)
+            if handle is None:
+                os.makedirs(os.path.dirname(log_file), exist_ok=True)
+                handle = open(log_file, "a")
+                self._handles[log_file] = handle
+            handle.write("".join(entries))
+            handle.flush()
+            if self.fsync:
+                os.fsync(handle.fileno())
+        self._pending = {}
+        self._pending_count = 0
+
+
+class SqliteStore:
+    """
+    Embedded time-series store for measurements, heater transitions, setpoints and Tempo colours.
+    Rows are buffered and inserted in one transaction per tick by commit().
+    Raw measurements older than raw_retention_days are rolled into hourly min/max/avg aggregates.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS measurements (ts REAL NOT NULL, sensor TEXT NOT NULL, value REAL NOT NULL);
+        CREATE INDEX IF NOT EXISTS measurements_sensor_ts ON measurements (sensor, ts);
+        CREATE TABLE IF NOT EXISTS measurements_hourly (ts REAL NOT NULL, sensor TEXT NOT NULL, value_min REAL NOT NULL,
+                                                        value_max REAL NOT NULL, value_avg REAL NOT NULL, samples INTEGER NOT NULL,
+                                                        PRIMARY KEY (sensor, ts));
+        CREATE TABLE IF NOT EXISTS heater (ts REAL NOT NULL, power INTEGER NOT NULL);
+        CREATE INDEX IF NOT EXISTS heater_ts ON heater (ts);
+        CREATE TABLE IF NOT EXISTS setpoints (ts REAL NOT NULL, kind TEXT NOT NULL, value REAL NOT NULL);
+        CREATE INDEX IF NOT EXISTS setpoints_kind_ts ON setpoints (kind, ts);
+        CREATE TABLE IF NOT EXISTS tempo (ts REAL NOT NULL, today TEXT NOT NULL, tomorrow TEXT NOT NULL);
+        CREATE INDEX IF NOT EXISTS tempo_ts ON tempo (ts);
+    """
+
+    RETENTION_PERIOD = 3600.0
+
+    def __init__(self, path: str, raw_retention_days: float = 30.0):
+        self.path = path
+        self.raw_retention_days = raw_retention_days
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(self.SCHEMA)
+        self._pending = {"measurements": [], "heater": [], "setpoints": [], "tempo": []}
+        self._readers = threading.local()
+        self._last_measure_ts = {}
+        self._last_setpoint = {}
+        self._last_tempo = None
+        self._next_retention = time.monotonic() + self.RETENTION_PERIOD
+
+    def add_measures(self, measures: list):
+        with self._lock:
+            for measure in measures:
+                ts = measure.timestamp.timestamp()
+                # The same FHEM reading is seen on every tick until the sensor reports again
+                if self._last_measure_ts.get(measure.name) != ts:
+                    self._last_measure_ts[measure.name] = ts
+                    self._pending["measurements"].append((ts, measure.name, measure.temp))
+
+    def add_heater(self, ts: float, on: bool):
+        with self._lock:
+            self._pending["heater"].append((ts, 100 if on else 0))
+
+    def add_setpoint(self, ts: float, kind: str, value: float):
+        with self._lock:
+            if self._last_setpoint.get(kind) != value:
+                self._last_setpoint[kind] = value
+                self._pending["setpoints"].append((ts, kind, value))
+
+    def add_tempo(self, ts: float, today: str, tomorrow: str):
+        with self._lock:
+            if self._last_tempo != (today, tomorrow):
+                self._last_tempo = (today, tomorrow)
+                self._pending["tempo"].append((ts, today, tomorrow))
+
+    def commit(self):
+        """Insert every buffered row in a single transaction."""
+        with self._lock:
+            pending = self._pending
+            if not any(pending.values()):
+                return
+            self._pending = {"measurements": [], "heater": [], "setpoints": [], "tempo": []}
+            try:
+                with self._db:
+                    self._db.executemany("INSERT INTO measurements (ts, sensor, value) VALUES (?, ?, ?)", pending["measurements"])
+                    self._db.executemany("INSERT INTO heater (ts, power) VALUES (?, ?)", pending["heater"])
+                    self._db.executemany("INSERT INTO setpoints (ts, kind, value) VALUES (?, ?, ?)", pending["setpoints"])
+                    self._db.executemany("INSERT INTO tempo (ts, today, tomorrow) VALUES (?, ?, ?)", pending["tempo"])
+            except sqlite3.Error as e:
+                LOGGER.error(f"Failed to store history in {self.path}: {e}")
+        if time.monotonic() >= self._next_retention:
+            self._next_retention = time.monotonic() + self.RETENTION_PERIOD
+            self.downsample(time.time())
+
+    def downsample(self, now: float):
+        """Roll raw measurements older than the retention into hourly aggregates."""
+        # Only complete hours are rolled so an hour is never split between both tables
+        cutoff = (now - self.raw_retention_days * 86400) // 3600 * 3600
+        with self._lock:
+            try:
+                with self._db:
+                    self._db.execute("""
+                        INSERT INTO measurements_hourly (ts, sensor, value_min, value_max, value_avg, samples)
+                        SELECT CAST(ts / 3600 AS INTEGER) * 3600 AS hour, sensor, MIN(value), MAX(value), AVG(value), COUNT(*)
+                        FROM measurements WHERE ts < ? GROUP BY hour, sensor
+                        ON CONFLICT (sensor, ts) DO UPDATE SET
+                            value_min = MIN(value_min, excluded.value_min),
+                            value_max = MAX(value_max, excluded.value_max),
+                            value_avg = (value_avg * samples + excluded.value_avg * excluded.samples) / (samples + excluded.samples),
+                            samples = samples + excluded.samples
+                    """, (cutoff,))
+                    deleted = self._db.execute("DELETE FROM measurements WHERE ts < ?", (cutoff,)).rowcount
+            except sqlite3.Error as e:
+                LOGGER.error(f"Failed to downsample history in {self.path}: {e}")
+                return
+        if deleted:
+            LOGGER.info(f"Rolled {deleted} raw measurements into hourly aggregates")
+
+    @contextlib.contextmanager
+    def _reading(self):
+        # WAL lets readers run beside the writer: each thread gets its own connection
+        if self.path == ":memory:":
+            with self._lock:
+                yield self._db
+            return
+        db = getattr(self._readers, "db", None)
+        if db is None:
+            db = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            self._readers.db = db
+        yield db
+
+    def query_measurements(self, sensor: str, start: float, end: float, points: int) -> list:
+        """
+        Get the measurements of a sensor between start and end, downsampled to at most `points` buckets.
+        Each bucket is [bucket_start, min, max, avg]. Raw points and hourly aggregates are merged.
+        """
+        width = max((end - start) / points, 1.0)
+        buckets = {}
+        with self._reading() as db:
+            rows = db.execute("""
+                SELECT CAST((ts - ?) / ? AS INTEGER) AS bucket, MIN(value), MAX(value), SUM(value), COUNT(*)
+                FROM measurements WHERE sensor = ? AND ts >= ? AND ts < ? GROUP BY bucket
+                UNION ALL
+                SELECT CAST((ts - ?) / ? AS INTEGER) AS bucket, MIN(value_min), MAX(value_max), SUM(value_avg * samples), SUM(samples)
+                FROM measurements_hourly WHERE sensor = ? AND ts >= ? AND ts < ? GROUP BY bucket
+            """, (start, width, sensor, start, end, start, width, sensor, start, end)).fetchall()
+        for bucket, value_min, value_max, value_sum, samples in rows:
+            if bucket in buckets:
+                previous = buckets[bucket]
+                buckets[bucket] = (min(previous[0], value_min), max(previous[1], value_max), previous[2] + value_sum, previous[3] + samples)
+            else:
+                buckets[bucket] = (value_min, value_max, value_sum, samples)
+        return [[start + bucket * width, value_min, value_max, round(value_sum / samples, 3)]
+                for bucket, (value_min, value_max, value_sum, samples) in sorted(buckets.items())]
+
+    def query_heater(self, start: float, end: float) -> list:
+        """Get the heater transitions between start and end as [ts, power], starting with the state in force at start."""
+        with self._reading() as db:
+            initial = db.execute("SELECT ts, power FROM heater WHERE ts < ? ORDER BY ts DESC LIMIT 1", (start,)).fetchone()
+            rows = db.execute("SELECT ts, power FROM heater WHERE ts >= ? AND ts < ? ORDER BY ts", (start, end)).fetchall()
+        transitions = [[start, initial[1]]] if initial is not None else []
+        transitions.extend([ts, power] for ts, power in rows)
+        return transitions
+
+    def close(self):
+        self.commit()
+        with self._lock:
+            self._db.close()
+
+
+_writer = LogWriter()
+_store: SqliteStore = None
+_exporter: InfluxExporter = None
+_text_logs = True
+_exported_measures = {}
+_exported_tempo = None
+
+
+def _close():
+    _writer.close()
+    if _store is not None:
+        _store.close()
+    if _exporter is not None:
+        _exporter.stop()
+
+
+atexit.register(_close)
+
+
+def configure(settings: dict):
+    """Apply the 'logs' section of the config to the text writer and the SQLite store."""
+    global _store, _text_logs
+    with _writer._lock:
+        _writer.max_pending_lines = settings.get("max_pending_lines", 0)
+        _writer.flush_interval = settings.get("flush_interval", 0.0)
+        _writer.fsync = settings.get("fsync", False)
+        _writer.flush()
+    _text_logs = settings.get("text", True)
+
+    sqlite_path = settings.get("sqlite_path")
+    if _store is not None and _store.path != sqlite_path:
+        _store.close()
+        _store = None
+    if sqlite_path and _store is None:
+        _store = SqliteStore(sqlite_path, raw_retention_days=settings.get("raw_retention_days", 30.0))
+    elif _store is not None:
+        _store.raw_retention_days = settings.get("raw_retention_days", 30.0)
+
+
+def attach_scheduler(scheduler):
+    """Flush the pending log lines from a job of the shared scheduler."""
+    _writer.attach(scheduler)
+
+
+def configure_influx(settings: dict):
+    """Start, restart or stop the InfluxDB exporter from the 'influxdb' section of the config."""
+    global _exporter
+    if _exporter is not None:
+        _exporter.stop()
+        _exporter = None
+    if settings and settings.get("url"):
+        _exporter = InfluxExporter(url=settings["url"],
+                                   database=settings.get("database", "telegraph"),
+                                   batch_size=settings.get("batch_size", 500),
+                                   flush_interval=settings.get("flush_interval", 10.0),
+                                   max_queue=settings.get("max_queue", 10000),
+                                   spool_path=settings.get("spool_path"),
+                                   spool_max_bytes=settings.get("spool_max_bytes", 8 * 1024 * 1024))
+        _exporter.start()
+
+
+def get_store() -> SqliteStore:
+    return _store
+
+
+def get_exporter() -> InfluxExporter:
+    return _exporter
+
+
+def flush():
+    _writer.flush()
+
+
+def commit():
+    """End of tick: write the rows buffered for the SQLite store in one transaction."""
+    if _store is not None:
+        _store.commit()
+
+
+def log_measures(measures: list):
+    if _store is not None:
+        _store.add_measures(measures)
+    if _exporter is not None:
+        for measure in measures:
+            ts = measure.timestamp.timestamp()
+            if _exported_measures.get(measure.name) != ts:
+                _exported_measures[measure.name] = ts
+                _exporter.submit("Regpac_Temperature", {"room": measure.name}, {"temperature": float(measure.temp)}, ts)
+
+
+def log_tempo(today: str, tomorrow: str):
+    global _exported_tempo
+    epoch = time.time()
+    if _store is not None:
+        _store.add_tempo(epoch, today, tomorrow)
+        _store.commit()
+    if _exporter is not None and _exported_tempo != (today, tomorrow):
+        _exported_tempo = (today, tomorrow)
+        _exporter.submit("Regpac_Tempo", {}, {"today": today, "tomorrow": tomorrow}, epoch)
+
+
 def log_heatvalue_if_change(on: bool):
     global previous_state
-    current_year = time.strftime("%Y")
-    log_file = f"/tmp/fhem_logs/regpac_heat-{current_year}.log"
-    timestamp = time.strftime("%Y-%m-%d_%H:%M:%S")
-    status = "100" if on else "0"
-    log_entry = f"{timestamp} heater power: {status}\n"
-
     if previous_state != on:
-        os.makedirs(os.path.dirname(log_file), exist_ok=True)
-        with open(log_file, "a") as file:
-            file.write(log_entry)
+        epoch = time.time()
+        if _text_logs:
+            now = time.localtime(epoch)
+            timestamp = time.strftime("%Y-%m-%d_%H:%M:%S", now)
+            status = "100" if on else "0"
+            _writer.write("regpac_heat", f"{timestamp} heater power: {status}\n", now)
+        if _store is not None:
+            _store.add_heater(epoch, on)
+        if _exporter is not None:
+            _exporter.submit("Regpac_Heat", {"room": "heater"}, {"power": 100.0 if on else 0.0}, epoch)
         previous_state = on
 
 
 def log_setpoint(comfort_temp: float, eco_temp: float):
-    current_year = time.strftime("%Y")
-    log_file = f"/tmp/fhem_logs/regpac_setpoint-{current_year}.log"
-    timestamp = time.strftime("%Y-%m-%d_%H:%M:%S")
-    log_entry = f"{timestamp} setpoint comfort: {comfort_temp}\n{timestamp} setpoint eco: {eco_temp}\n"
-
-    os.makedirs(os.path.dirname(log_file), exist_ok=True)
-    with open(log_file, "a") as file:
-        file.write(log_entry)
+    epoch = time.time()
+    if _text_logs:
+        now = time.localtime(epoch)
+        timestamp = time.strftime("%Y-%m-%d_%H:%M:%S", now)
+        log_entry = f"{timestamp} setpoint comfort: {comfort_temp}\n{timestamp} setpoint eco: {eco_temp}\n"
+        _writer.write("regpac_setpoint", log_entry, now)
+    if _store is not None:
+        _store.add_setpoint(epoch, "comfort", comfort_temp)
+        _store.add_setpoint(epoch, "eco", eco_temp)
+        _store.commit()
+    if _exporter is not None:
+        _exporter.submit("Regpac_Setpoint", {"room": "setpoint"}, {"comfort": float(comfort_temp), "eco": float(eco_temp)}, epoch)
 
 
 def log_dbg_setpoint(value: float):
-    current_year = time.strftime("%Y")
-    log_file = f"/tmp/fhem_logs/regpac_dbg_setpoint-{current_year}.log"
-    timestamp = time.strftime("%Y-%m-%d_%H:%M:%S")
-    log_entry = f"{timestamp} debug setpoint: {value}\n"
-
-    os.makedirs(os.path.dirname(log_file), exist_ok=True)
-    with open(log_file, "a") as file:
-        file.write(log_entry)
+    epoch = time.time()
+    if _text_logs:
+        now = time.localtime(epoch)
+        timestamp = time.strftime("%Y-%m-%d_%H:%M:%S", now)
+        _writer.write("regpac_dbg_setpoint", f"{timestamp} debug setpoint: {value}\n", now)
+    if _store is not None:
+        _store.add_setpoint(epoch, "effective", value)
+    if _exporter is not None:
+        _exporter.submit("Regpac_DBG_Setpoint", {"room": "debug"}, {"setpoint": float(value)}, epoch)
 
 
 def reset_previous_state():
     global previous_state
     previous_state = None
+    _writer.close()
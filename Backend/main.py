@@ -1,15 +1,37 @@
-from flask import Flask, jsonify, request
-from threading import Timer
+from flask import Flask, Response, jsonify, request, stream_with_context
+from threading import Condition, Event, Lock, RLock
+import argparse
 import json
-
-from datetime import datetime
-
-from temperature import collect_temperatures
-from localsql import log_heatvalue_if_change, log_setpoint, log_dbg_setpoint
-from heat import send_heat, get_heat_status
+import os
+import subprocess
+import threading
+import time
+
+from datetime import date, datetime
+from functools import wraps
+
+from temperature import Measure, collect_temperatures, reset_cache, restore_last_measures
+from localsql import log_heatvalue_if_change, log_setpoint, log_dbg_setpoint, log_measures, log_tempo
+from heat import ActuatorDispatcher, get_heat_status, is_refresh_due
+from heat import get_state as get_heat_state, restore_state as restore_heat_state
 import heat
-from tempo_provider import TempoProvider, DayPrice
+from tempo_provider import DayPrice, TempoProvider
+from fhem_events import FhemEventListener
+from config_watcher import ConfigWatcher
+from scheduler import Scheduler
+from off_peak import OffPeakSchedule, parse_hour_min
+from setpoint_planner import SetpointPlanner
+from state_snapshot import StatePublisher, changed_sections
+from wsgi_server import WsgiServer
+from control_channel import ControlClient, ControlError, ControlServer
+from warm_state import WarmStateStore
+import config_store
+import diagnostics
+import http_client
+import metrics
+import localsql
 import logging
+import signal
 import sys
 
 LOGGER = logging.getLogger(__name__)
@@ -22,34 +44,242 @@ set_off_peak_temp: float = 0.0
 set_full_cost_temp: float = 0.0
 
 temperatures_sources = []
+last_poll: float = None
 tempo_provider: TempoProvider = None
+off_peak_schedule: OffPeakSchedule = None
+setpoint_planner = SetpointPlanner()
+last_weighted_setpoint: tuple = None
+
+# Inputs and outcome of the last regulation, used to skip ticks where nothing changed
+last_regulation_inputs: tuple = None
+last_heat_decision: bool = None
+regulation_lock = RLock()
+
+# Each accepted POST /setpoint bumps the revision, every regulation decision records the revision it applied
+setpoint_revision = 0
+setpoint_log_pending = False  # Setpoints changed by the API, logged by the re-evaluation off the request thread
+last_decision: dict = None
+decision_condition = Condition()
+
+events_listener: FhemEventListener = None
+config_watcher: ConfigWatcher = None
+actuator = ActuatorDispatcher()
+scheduler = Scheduler()
+state = StatePublisher()
+server: WsgiServer = None
+request_threads = 0  # Worker threads of the server kept for the requests other than event streams
+# Each event stream holds a server thread while open: a few dashboards, not a crowd, on a Pi-class host
+DEFAULT_EVENTS_MAX_SUBSCRIBERS = 4
+stopping = Event()
+
+# Split mode: the controller process serves the control channel, the API process is its client
+CONTROL_SOCKET = "/tmp/regpac-control.sock"
+control_server: ControlServer = None
+controller: ControlClient = None
+
+# State of the previous run, restored at boot
+warm_store: WarmStateStore = None
+
+PERIODIC_TASKS_SECONDS = metrics.histogram("regpac_periodic_tasks_seconds", "Duration of the regulation ticks, collection included")
+metrics.gauge("regpac_scheduler_lateness_seconds", "Lateness of the last cadenced run of the scheduled jobs", ("job",),
+              collect=lambda: {(name, ): stats['last_lateness'] for name, stats in scheduler.get_stats().items()})
+metrics.gauge("regpac_scheduler_max_lateness_seconds", "Largest lateness of the scheduled jobs", ("job",),
+              collect=lambda: {(name, ): stats['max_lateness'] for name, stats in scheduler.get_stats().items()})
+metrics.counter("regpac_scheduler_overruns", "Ticks skipped because a scheduled job overran its period", ("job",),
+                collect=lambda: {(name, ): stats['overruns'] for name, stats in scheduler.get_stats().items()})
+metrics.gauge("regpac_tempo_age_seconds", "Time since the Tempo colours were last fetched",
+              collect=lambda: time.time() - tempo_provider.last_success if tempo_provider is not None and tempo_provider.last_success else None)
+
+# Clients of the /events stream
+events_subscribers = 0
+events_subscribers_lock = Lock()
 
 
 def heat(on: bool):
-    log_heatvalue_if_change(on)
-    send_heat(config=config, enable=on)
+    with diagnostics.stage('actuate'):
+        log_heatvalue_if_change(on)
+        actuator.request(config=config, enable=on)
+
+
+def periodic_tasks(force: bool = False):
+    global temperatures_sources, last_poll
+    with PERIODIC_TASKS_SECONDS.time(), diagnostics.tick('poll'):
+        with diagnostics.stage('collect'):
+            measures = collect_temperatures(config)
+        with regulation_lock:
+            temperatures_sources = measures
+            last_poll = time.time()
+            with diagnostics.stage('log'):
+                log_measures(measures)
+            if events_listener is not None:
+                events_listener.seed(measures)
+            evaluate_regulation(force)
+
+
+def on_sensor_event(measures: list):
+    global temperatures_sources
+    with regulation_lock, diagnostics.tick('event'):
+        temperatures_sources = measures
+        with diagnostics.stage('log'):
+            log_measures(measures)
+        evaluate_regulation()
+
+
+def evaluate_regulation(force: bool = False):
+    global last_regulation_inputs, last_heat_decision
+    with regulation_lock, diagnostics.tick('evaluate'):
+        revision = setpoint_revision
+        with diagnostics.stage('weigh_setpoint'):
+            setpoint_temperature = weights_the_temp_setting()
+        with diagnostics.stage('log'):
+            log_dbg_setpoint(setpoint_temperature)
+
+        inputs = (setpoint_temperature, tuple((m.name, m.temp, m.timestamp) for m in temperatures_sources))
+        if not force and inputs == last_regulation_inputs and get_heat_status() == last_heat_decision and not is_refresh_due():
+            LOGGER.info('Skip regulation: no input changed since last tick')
+        else:
+            last_regulation_inputs = inputs
+            with diagnostics.stage('regulate'):
+                last_heat_decision = regulate_heating(setpoint_temperature, temperatures_sources)
+        record_decision(revision, setpoint_temperature)
+        with diagnostics.stage('publish'):
+            publish_state()
 
+        with diagnostics.stage('log'):
+            localsql.commit()
+
+
+def build_state() -> dict:
+    status = get_heat_status()
+    return {
+        "temperatures": {
+            "temperatures": [{
+                "name": measure.name,
+                "temperature": measure.temp,
+                "timestamp": measure.timestamp.strftime("%Y-%m-%d %H:%M:%S")
+            } for measure in temperatures_sources],
+            "count": len(temperatures_sources)
+        },
+        "heater": {
+            "heater_on": status if status is not None else False
+        },
+        "setpoint": {
+            "off_peak_temp": set_off_peak_temp,
+            "full_cost_temp": set_full_cost_temp
+        },
+        "tempo": {
+            "today": tempo_provider.get_today_price().name,
+            "tomorrow": tempo_provider.get_tomorrow_price().name
+        }
+    }
+
+
+def publish_state():
+    """Publish a new state snapshot for the API, after each tick and each change of its inputs."""
+    state.publish(build_state)
+
+
+def on_actuator_sent():
+    publish_state()
+    save_warm_state()  # The heater state is the part of the warm state that must never be stale
+
+
+def capture_warm_state() -> dict:
+    devices = {sensor['name']: sensor['device'] for sensor in config['sensors']}
+    with regulation_lock:
+        measures = [{
+            "device": devices.get(measure.name),
+            "temp": measure.temp,
+            "timestamp": measure.timestamp.strftime("%Y-%m-%d %H:%M:%S")
+        } for measure in temperatures_sources]
+        polled_at = last_poll
+    return {"polled_at": polled_at, "measures": measures, "heater": get_heat_state(), "tempo": tempo_provider.get_state()}
+
+
+def save_warm_state(force: bool = False):
+    if warm_store is not None and tempo_provider is not None:
+        warm_store.save(capture_warm_state(), force=force)
 
-def periodic_tasks():
-    global temperatures_sources
-    temperatures_sources = collect_temperatures(config)
-    setpoint_temperature = weights_the_temp_setting()
-    log_dbg_setpoint(setpoint_temperature)
-    regulate_heating(setpoint_temperature, temperatures_sources)
+
+def restore_warm_state():
+    """Start from the state saved by the previous run, so that the first ticks can skip the I/O it makes redundant."""
+    global temperatures_sources, last_poll
+    snapshot = warm_store.load() if warm_store is not None else None
+    if snapshot is None:
+        return
+    try:
+        tempo_provider.restore_state(snapshot['tempo'])
+        if not warm_store.is_fresh(snapshot):
+            LOGGER.info('Warm state too old, the measures and heater state are not restored')
+            return
+        restore_heat_state(snapshot['heater']['status'], snapshot['heater']['sent_at'])
+        names = {sensor['device']: sensor['name'] for sensor in config['sensors']}
+        measures = {entry['device']: Measure(temperature=float(entry['temp']), name=names[entry['device']],
+                                             timestamp=datetime.strptime(entry['timestamp'], "%Y-%m-%d %H:%M:%S"))
+                    for entry in snapshot['measures'] if entry['device'] in names}
+    except (KeyError, TypeError, ValueError) as e:
+        LOGGER.warning(f'Ignore invalid warm state: {e}')
+        return
+    restore_last_measures(measures)
+    temperatures_sources = list(measures.values())
+    last_poll = snapshot.get('polled_at')
+    LOGGER.info(f'Restored warm state: {len(measures)} measures, heater {get_heat_status()}')
+
+
+def seconds_until_due(last_run: float, period: float) -> float:
+    """Delay of the first run of a job keeping the cadence of the previous run, 0 when it is already due."""
+    if not last_run:
+        return 0.0
+    return min(max(last_run + period - time.time(), 0.0), period)
+
+
+def record_decision(revision: int, setpoint_temperature: float):
+    global last_decision
+    with decision_condition:
+        last_decision = {
+            "revision": revision,
+            "setpoint": setpoint_temperature,
+            "heater_on": last_heat_decision,
+            "timestamp": time.time()
+        }
+        decision_condition.notify_all()
+
+
+def request_reevaluation() -> int:
+    """Bump the setpoint revision and schedule a re-evaluation, requests made before it runs share it."""
+    global setpoint_revision
+    with decision_condition:
+        setpoint_revision += 1
+        revision = setpoint_revision
+    if scheduler.is_running():
+        scheduler.trigger('reevaluation')
+    else:
+        log_pending_setpoint()
+        periodic_tasks(force=True)  # No control loop yet, evaluate right away
+    return revision
+
+
+def log_pending_setpoint():
+    """Log the setpoints last set by the API once, however many requests changed them since."""
+    global setpoint_log_pending
+    with regulation_lock:
+        if not setpoint_log_pending:
+            return
+        setpoint_log_pending = False
+        comfort_temp, eco_temp = set_off_peak_temp, set_full_cost_temp
+    log_setpoint(comfort_temp=comfort_temp, eco_temp=eco_temp)
+
+
+def reevaluation_job():
+    log_pending_setpoint()
+    if temperatures_sources:
+        evaluate_regulation(force=True)  # The last measures are recent enough, no need to poll the sensors again
+    else:
+        periodic_tasks(force=True)
 
 
 def is_in_off_peak(current_time_str: str) -> bool:
-    current_time = datetime.strptime(current_time_str, '%H:%M').time()
-    for period in config['off_peak']:
-        start = datetime.strptime(period['start'], '%H:%M').time()
-        end = datetime.strptime(period['end'], '%H:%M').time()
-        if start < end:
-            if start <= current_time <= end:
-                return True
-        else:  # Over midnight scenario
-            if current_time >= start or current_time <= end:
-                return True
-    return False
+    return off_peak_schedule.is_off_peak(parse_hour_min(current_time_str))
 
 
 def get_current_hour_min() -> str:
@@ -58,27 +288,16 @@ def get_current_hour_min() -> str:
 
 def weights_the_temp_setting() -> float:
     # Here is the cool stuff
-    current_time_str: str = get_current_hour_min()
-
     # Rule 1 : comfort or Eco T° due to electricity price + Rule 2 : Take care of Tempo pricing
-    if is_in_off_peak(current_time_str):
-        setpoint_temperature = set_off_peak_temp
-        if tempo_provider.get_tomorrow_price() == DayPrice.HIGH:
-            increase_temp = config['tempo']['temperature_increase_prior_to_high_cost']
-            setpoint_temperature += increase_temp
-            LOGGER.info(f'Weight_Setpoint : {setpoint_temperature} (off_peak + {increase_temp}° due to Tempo tomorrow Red day)')
-        else:
-            LOGGER.info(f'Weight_Setpoint : {setpoint_temperature} (off_peak)')
-    else:
-        setpoint_temperature = set_full_cost_temp
-        if tempo_provider.get_today_price() == DayPrice.HIGH:
-            decrease_temp = config['tempo']['temperature_reduction_high_cost']
-            setpoint_temperature += decrease_temp
-            LOGGER.info(f'Weight_Setpoint : {setpoint_temperature} (full_cost + {decrease_temp}° due to Tempo today Red day)')
-        else:
-            LOGGER.info(f'Weight_Setpoint : {setpoint_temperature} (full_cost)')
+    global last_weighted_setpoint
+    setpoint_planner.update(day=date.today(), schedule=off_peak_schedule, off_peak_temp=set_off_peak_temp, full_cost_temp=set_full_cost_temp,
+                            tempo_settings=config['tempo'], today_price=tempo_provider.get_today_price(), tomorrow_price=tempo_provider.get_tomorrow_price())
+    setpoint = setpoint_planner.lookup(parse_hour_min(get_current_hour_min()))
+    if setpoint != last_weighted_setpoint:
+        last_weighted_setpoint = setpoint
+        LOGGER.info(f'Weight_Setpoint : {setpoint[0]} ({setpoint[1]})')
 
-    return setpoint_temperature
+    return setpoint[0]
 
 
 def test_inf(list_to_compute, theshold: float) -> bool:
@@ -105,101 +324,680 @@ def regulate_heating(setpoint_temperature, temperatures):
         LOGGER.info(f'Disable Heating because setpoint is set to {setpoint_temperature} and average T° is {average_temperature}')
 
     heat(enable_heat)
+    return enable_heat
+
+
+def cached_json_response(body: str, etag: str) -> Response:
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    return response
+
+
+def serve_state(name: str) -> Response:
+    section = state.current.sections.get(name)
+    if section is None:
+        return jsonify({"error": "State not received from the controller yet"}), 503, {"Retry-After": "5"}
+    return cached_json_response(section.body, section.etag)
+
+
+@app.errorhandler(ControlError)
+def handle_control_error(e):
+    return jsonify({"error": str(e)}), 503
 
 
 @app.route('/setpoint', methods=['GET'])
 def get_setpoint_temperature():
-    return jsonify({
-        "off_peak_temp": set_off_peak_temp,
-        "full_cost_temp": set_full_cost_temp
-    })
+    return serve_state('setpoint')
 
 
-@app.route('/setpoint', methods=['POST'])
-def set_setpoint_temperature() -> str:
-    global set_off_peak_temp, set_full_cost_temp
-    try:
-        set_off_peak_temp = float(request.json['off_peak_cost'])
-        set_full_cost_temp = float(request.json['full_cost'])
+def apply_setpoint(off_peak_cost: float, full_cost: float) -> int:
+    """Apply and save new setpoints, returns the revision of the regulation decision that will apply them."""
+    global set_off_peak_temp, set_full_cost_temp, setpoint_log_pending
+    # Under the lock, a reload cannot swap the config between the update and the save
+    with regulation_lock:
+        set_off_peak_temp = off_peak_cost
+        set_full_cost_temp = full_cost
         # Update config file
         config['set_temperature']['off_peak_cost'] = set_off_peak_temp
         config['set_temperature']['full_cost'] = set_full_cost_temp
-        with open('/container/config/config.json', 'w') as f:
-            json.dump(config, f, indent=4)
-        log_setpoint(comfort_temp=set_off_peak_temp, eco_temp=set_full_cost_temp)
-        periodic_tasks()
-        return jsonify({"message": "setpoint temperature updated"}), 200
+        config_store.save(config)
+        # The text log and SQLite writes are left to the re-evaluation, the request returns without disk I/O
+        setpoint_log_pending = True
+    publish_state()
+    return request_reevaluation()
+
+
+@app.route('/setpoint', methods=['POST'])
+def set_setpoint_temperature() -> str:
+    try:
+        off_peak_cost = float(request.json['off_peak_cost'])
+        full_cost = float(request.json['full_cost'])
+        if controller is not None:
+            revision = controller.call('set_setpoint', {"off_peak_cost": off_peak_cost, "full_cost": full_cost})
+        else:
+            revision = apply_setpoint(off_peak_cost, full_cost)
+        return jsonify({"message": "setpoint temperature updated", "revision": revision}), 200
     except (KeyError, ValueError):
         return jsonify({"error": "Invalid setpoint temperature value"}), 400
+    except ControlError:
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+def wait_for_decision(revision: int, timeout: float) -> dict:
+    """Wait up to timeout seconds for a decision applying revision, return the last decision either way."""
+    with decision_condition:
+        decision_condition.wait_for(lambda: last_decision is not None and last_decision['revision'] >= revision, timeout=timeout)
+        return last_decision
+
+
+@app.route('/setpoint/decision', methods=['GET'])
+def get_setpoint_decision():
+    """Get the last regulation decision, optionally waiting up to `timeout` seconds for the one applying `revision`."""
+    try:
+        revision = int(request.args.get('revision', 0))
+        timeout = min(max(float(request.args.get('timeout', 0)), 0.0), 30.0)
+    except ValueError:
+        return jsonify({"error": "Invalid revision or timeout"}), 400
+    if controller is not None:
+        decision = controller.call('decision', {"revision": revision, "timeout": timeout}, timeout=timeout + controller.timeout)
+    else:
+        decision = wait_for_decision(revision, timeout)
+    if decision is None or decision['revision'] < revision:
+        return jsonify({"pending": True, "revision": revision, "last_decision": decision}), 202
+    return jsonify(decision)
+
+
+def plan_setpoint() -> dict:
+    setpoint_planner.update(day=date.today(), schedule=off_peak_schedule, off_peak_temp=set_off_peak_temp, full_cost_temp=set_full_cost_temp,
+                            tempo_settings=config['tempo'], today_price=tempo_provider.get_today_price(), tomorrow_price=tempo_provider.get_tomorrow_price())
+    body, etag = setpoint_planner.get_plan()
+    return {"body": body, "etag": etag}
+
+
+@app.route('/setpoint/plan', methods=['GET'])
+def get_setpoint_plan():
+    """Get the planned effective setpoint for today and tomorrow."""
+    plan = controller.call('plan') if controller is not None else plan_setpoint()
+    return cached_json_response(plan['body'], plan['etag'])
+
+
 @app.route('/temperatures', methods=['GET'])
 def get_temperatures():
     """Get all collected temperatures from sensors."""
-    temperatures_data = []
-    for measure in temperatures_sources:
-        temperatures_data.append({
-            "name": measure.name,
-            "temperature": measure.temp,
-            "timestamp": measure.timestamp.strftime("%Y-%m-%d %H:%M:%S")
-        })
-    return jsonify({
-        "temperatures": temperatures_data,
-        "count": len(temperatures_data)
-    })
+    return serve_state('temperatures')
 
 
 @app.route('/heater/status', methods=['GET'])
 def get_heater_status():
     """Get the current status of the heater."""
-    status = get_heat_status()
-    return jsonify({
-        "heater_on": status if status is not None else False
-    })
+    return serve_state('heater')
 
 
 @app.route('/tempo', methods=['GET'])
 def get_tempo():
     """Get Tempo electricity pricing information for today and tomorrow."""
-    return jsonify({
-        "today": tempo_provider.get_today_price().name,
-        "tomorrow": tempo_provider.get_tomorrow_price().name
-    })
+    return serve_state('tempo')
+
+
+def parse_history_time(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def parse_event_id(value: str) -> int:
+    """Get the snapshot version of an event id of this process, None for anything else."""
+    try:
+        epoch, version = value.split('-')
+        return int(version) if int(epoch) == state.epoch else None
+    except (AttributeError, ValueError):
+        return None
+
+
+def events_subscribers_limit() -> int:
+    limit = config['app'].get('events_max_subscribers', DEFAULT_EVENTS_MAX_SUBSCRIBERS)
+    if server is not None:
+        # The pool is sized at startup, a cap raised since by a reload must still leave the request threads free
+        limit = min(limit, server.threads - request_threads)
+    return limit
+
+
+def acquire_events_subscriber() -> bool:
+    global events_subscribers
+    with events_subscribers_lock:
+        if events_subscribers >= events_subscribers_limit():
+            return False
+        events_subscribers += 1
+        return True
+
+
+def release_events_subscriber():
+    global events_subscribers
+    with events_subscribers_lock:
+        events_subscribers -= 1
+
+
+@app.route('/events', methods=['GET'])
+def get_events():
+    """Stream the state sections as Server-Sent Events, each event only carries the sections changed since the previous one."""
+    if not acquire_events_subscriber():
+        return jsonify({"error": "Too many subscribers"}), 503, {"Retry-After": "30"}
+    # On reconnection, resume from the last event received when it is still known, otherwise start over with the full state
+    version = parse_event_id(request.headers.get('Last-Event-ID', request.args.get('last_event_id')))
+    previous = state.get_snapshot(version) if version is not None else None
+    heartbeat = config['app'].get('events_heartbeat', 15.0)
+
+    def generate(previous):
+        snapshot = state.current
+        while not state.closed:
+            if previous is None or snapshot.version != previous.version:
+                yield f"id: {state.epoch}-{snapshot.version}\nevent: state\ndata: {changed_sections(previous, snapshot)}\n\n"
+                previous = snapshot
+            else:
+                yield ": heartbeat\n\n"
+            snapshot = state.wait_for_change(previous.version, heartbeat)
+
+    response = Response(generate(previous), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Called by the WSGI server when the client goes away, even before the first event
+    response.call_on_close(release_events_subscriber)
+    return response
+
+
+def query_history(start: float, end: float, points: int, sensors: list, with_heater: bool):
+    """Chunks of the history JSON document, None when the history store is not enabled."""
+    store = localsql.get_store()
+    if store is None:
+        return None
+
+    def generate():
+        # Series are queried one by one and streamed as soon as they are ready
+        yield json.dumps({"start": start, "end": end, "bucket": max((end - start) / points, 1.0)})[:-1]
+        yield ', "sensors": ['
+        for index, sensor in enumerate(sensors):
+            yield (', ' if index else '') + json.dumps({"name": sensor, "points": store.query_measurements(sensor, start, end, points)})
+        yield ']'
+        if with_heater:
+            yield ', "heater": ' + json.dumps(store.query_heater(start, end))
+        yield '}'
+
+    return generate()
+
+
+def query_history_document(**kwargs) -> str:
+    chunks = query_history(**kwargs)
+    return "".join(chunks) if chunks is not None else None
+
+
+@app.route('/history', methods=['GET'])
+def get_history():
+    """Get the downsampled sensor and heater history over a time range."""
+    if controller is None and localsql.get_store() is None:
+        return jsonify({"error": "History store is not enabled"}), 404
+    try:
+        end = parse_history_time(request.args['end']) if 'end' in request.args else time.time()
+        start = parse_history_time(request.args['start']) if 'start' in request.args else end - 86400
+        points = min(max(int(request.args.get('points', 500)), 1), 5000)
+        if start >= end:
+            raise ValueError("start must be before end")
+    except ValueError as e:
+        return jsonify({"error": f"Invalid history range: {e}"}), 400
+    sensors = request.args.getlist('sensor') or [sensor['name'] for sensor in config['sensors']]
+    with_heater = request.args.get('heater', '1') != '0'
+
+    query = {"start": start, "end": end, "points": points, "sensors": sensors, "with_heater": with_heater}
+    if controller is not None:
+        document = controller.call('history', query)
+        if document is None:
+            return jsonify({"error": "History store is not enabled"}), 404
+        return Response(document, mimetype='application/json')
+    return Response(stream_with_context(query_history(**query)), mimetype='application/json')
+
+
+def runtime_stats() -> dict:
+    exporter = localsql.get_exporter()
+    return {
+        "http": http_client.get_stats(),
+        "scheduler": scheduler.get_stats(),
+        "config": config_store.get_stats(),
+        "influxdb": exporter.get_stats() if exporter is not None else None
+    }
+
+
+@app.route('/stats', methods=['GET'])
+def get_stats():
+    """Get internal runtime statistics (HTTP client, scheduler, config store, InfluxDB exporter)."""
+    return jsonify(controller.call('stats') if controller is not None else runtime_stats())
+
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Get the runtime metrics in the Prometheus text format, or OpenMetrics when asked for.
+    In split mode these are the metrics of the controller process, where the regulation runs.
+    """
+    openmetrics = 'application/openmetrics-text' in request.headers.get('Accept', '')
+    text = controller.call('metrics', {"openmetrics": openmetrics}) if controller is not None else metrics.render(openmetrics)
+    return Response(text, content_type=metrics.content_type(openmetrics))
+
+
+def diagnostics_route(func):
+    """Answer 404 for the diagnostics endpoints unless diagnostics are enabled in the config."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not diagnostics.is_enabled():
+            return jsonify({"error": "Diagnostics are not enabled"}), 404
+        return func(*args, **kwargs)
+    return wrapper
+
+
+@app.route('/debug/profile', methods=['GET'])
+@diagnostics_route
+def get_profile():
+    """Sample the stacks of all the threads for `seconds` and return them collapsed, or as a `top` functions summary."""
+    try:
+        seconds = min(max(float(request.args.get('seconds', 5)), 0.1), 60.0)
+        interval = min(max(float(request.args.get('interval', 0.005)), 0.001), 1.0)
+    except ValueError:
+        return jsonify({"error": "Invalid seconds or interval"}), 400
+    stacks = diagnostics.sample_stacks(seconds, interval)
+    if request.args.get('format', 'collapsed') == 'top':
+        return jsonify({"samples": sum(stacks.values()), "functions": diagnostics.top_functions(stacks)})
+    return Response(diagnostics.collapse(stacks), mimetype='text/plain')
+
+
+@app.route('/debug/memory/start', methods=['POST'])
+@diagnostics_route
+def start_memory_tracing():
+    diagnostics.get_memory().start(config.get('diagnostics', {}).get('tracemalloc_frames', 10))
+    return jsonify({"tracing": True})
+
+
+@app.route('/debug/memory/stop', methods=['POST'])
+@diagnostics_route
+def stop_memory_tracing():
+    diagnostics.get_memory().stop()
+    return jsonify({"tracing": False})
+
+
+@app.route('/debug/memory', methods=['GET'])
+@diagnostics_route
+def get_memory_snapshot():
+    """Take a tracemalloc snapshot: top allocations and the difference with the previous snapshot."""
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), 200)
+    except ValueError:
+        return jsonify({"error": "Invalid limit"}), 400
+    memory = diagnostics.get_memory()
+    if not memory.is_tracing():
+        return jsonify({"error": "Memory tracing is not started, POST /debug/memory/start first"}), 409
+    return jsonify(memory.snapshot(limit=limit))
+
+
+@app.route('/debug/ticks', methods=['GET'])
+@diagnostics_route
+def get_tick_timings():
+    """Get the per-stage timings of the last regulation ticks."""
+    return jsonify({"ticks": diagnostics.get_ticks()})
 
 
 def load_config() -> dict:
     try:
-        with open('/container/config/config.json', 'r') as f:
-            return json.load(f)
+        return config_store.load()
     except Exception as e:
         LOGGER.critical(f'Fail to load program config due to : {e}')
         sys.exit(1)
 
 
 def init_app():
-    global config, set_off_peak_temp, set_full_cost_temp, tempo_provider
+    global config, set_off_peak_temp, set_full_cost_temp, tempo_provider, last_regulation_inputs, last_heat_decision, off_peak_schedule, warm_store
     config = load_config()
+    off_peak_schedule = OffPeakSchedule(config['off_peak'])
+    config_store.configure(config['app'])
+    diagnostics.configure(config.get('diagnostics', {}))
+    reset_cache()
+    last_regulation_inputs = None
+    last_heat_decision = None
+    http_client.configure(config.get('http', {}))
+    logs = dict(config.get('logs', {}))
+    # The text logs feed telegraf, with the InfluxDB exporter they would store every point twice
+    logs.setdefault('text', not config.get('influxdb', {}).get('url'))
+    localsql.configure(logs)
+    localsql.configure_influx(config.get('influxdb', {}))
+    actuator.retry_base_delay = config.get('actuator', {}).get('retry_base_delay', actuator.retry_base_delay)
+    actuator.retry_max_delay = config.get('actuator', {}).get('retry_max_delay', actuator.retry_max_delay)
+    actuator.on_sent = on_actuator_sent
+    actuator.start()
     set_off_peak_temp = config['set_temperature']['off_peak_cost']
     set_full_cost_temp = config['set_temperature']['full_cost']
     log_setpoint(comfort_temp=set_off_peak_temp, eco_temp=set_full_cost_temp)
     tempo_provider = TempoProvider()
+    warm_settings = config.get('warm_state', {})
+    warm_store = WarmStateStore(warm_settings['path'], max_age=warm_settings.get('max_age', 900.0)) if warm_settings.get('path') else None
+    restore_warm_state()
+    publish_state()
+
+
+def validate_config(new_config: dict):
+    """Raise KeyError, TypeError or ValueError if the config cannot be applied."""
+    for key in ('pooling_frequency', 'pooling_provider_frequency'):
+        if float(new_config['app'][key]) <= 0:
+            raise ValueError(f"app.{key} must be positive")
+    float(new_config['set_temperature']['off_peak_cost'])
+    float(new_config['set_temperature']['full_cost'])
+    float(new_config['tempo']['temperature_reduction_high_cost'])
+    float(new_config['tempo']['temperature_increase_prior_to_high_cost'])
+    if not new_config['fhem']['url']:
+        raise ValueError("fhem.url is empty")
+    if not new_config['actuator']['device']:
+        raise ValueError("actuator.device is empty")
+    if not new_config['sensors'] or any(not sensor['name'] or not sensor['device'] for sensor in new_config['sensors']):
+        raise ValueError("sensors must list a name and a device for each sensor")
+
+
+def apply_http_section():
+    http_client.configure(config.get('http', {}))
+
+
+def apply_sensing_sections():
+    global events_listener
+    reset_cache()
+    if events_listener is not None:
+        events_listener.stop()
+        events_listener = None
+    if config['fhem'].get('events', False):
+        start_event_listener()
+
+
+def apply_actuator_section():
+    actuator.retry_base_delay = config.get('actuator', {}).get('retry_base_delay', actuator.retry_base_delay)
+    actuator.retry_max_delay = config.get('actuator', {}).get('retry_max_delay', actuator.retry_max_delay)
+
+
+def apply_app_section():
+    config_store.configure(config['app'])
+    subscribers = config['app'].get('events_max_subscribers', DEFAULT_EVENTS_MAX_SUBSCRIBERS)
+    if server is not None and events_subscribers_limit() < subscribers:
+        LOGGER.warning(f'Event streams limited to {events_subscribers_limit()} until a restart sizes the server threads')
+    if scheduler.is_running():
+        scheduler.set_period('tempo', config['app']['pooling_provider_frequency'])
+        scheduler.set_period('regulation', config['app']['pooling_frequency'])
+
+
+def apply_diagnostics_section():
+    diagnostics.configure(config.get('diagnostics', {}))
+
+
+def warn_applied_at_restart():
+    LOGGER.warning('Changes of the logs, influxdb and warm_state sections are applied at the next restart')
+
+
+# How a reload applies the changes of each config section, in this order.
+# off_peak and set_temperature are swapped with the config itself.
+SECTION_APPLIERS = (
+    (('http',), apply_http_section),
+    (('sensors', 'fhem'), apply_sensing_sections),
+    (('actuator',), apply_actuator_section),
+    (('app',), apply_app_section),
+    (('diagnostics',), apply_diagnostics_section),
+    (('logs', 'influxdb', 'warm_state'), warn_applied_at_restart),
+)
+
+
+def changed_config_sections(old_config: dict, new_config: dict) -> list:
+    sections = set(old_config) | set(new_config)
+    return sorted(section for section in sections if old_config.get(section) != new_config.get(section))
+
+
+def reload_config(new_config: dict):
+    """Apply a changed config file without restarting, only the derived state of the changed sections is rebuilt."""
+    global config, off_peak_schedule, set_off_peak_temp, set_full_cost_temp
+    try:
+        validate_config(new_config)
+        schedule = OffPeakSchedule(new_config['off_peak'])
+    except (KeyError, TypeError, ValueError) as e:
+        LOGGER.error(f'Ignore invalid config change: {e}')
+        return
+
+    with regulation_lock:
+        # Setpoints are saved under this lock: a save still pending holds changes newer than the file
+        if config_store.is_pending():
+            LOGGER.warning('Ignore config change made while a setpoint change is being saved, the save overwrites it')
+            return
+        changed = changed_config_sections(config, new_config)
+        if not changed:
+            return
+        config = new_config
+        if 'off_peak' in changed:
+            off_peak_schedule = schedule
+        set_off_peak_temp = float(config['set_temperature']['off_peak_cost'])
+        set_full_cost_temp = float(config['set_temperature']['full_cost'])
+        publish_state()
+    LOGGER.info(f'Reload config, changed sections: {changed}')
+
+    for sections, apply in SECTION_APPLIERS:
+        if not set(sections).isdisjoint(changed):
+            apply()
+
+    if 'set_temperature' in changed:
+        log_setpoint(comfort_temp=set_off_peak_temp, eco_temp=set_full_cost_temp)
+        request_reevaluation()
+    elif scheduler.is_running():
+        scheduler.trigger('regulation')
+
+
+def start_config_watcher():
+    global config_watcher
+    # The writes of the config store are not changes to reload
+    config_watcher = ConfigWatcher(path=config_store.CONFIG_PATH, on_change=reload_config,
+                                   poll_interval=config['app'].get('config_poll_interval', 5.0),
+                                   ignore=config_store.is_own_write)
+    config_watcher.start()
+
+
+def start_event_listener():
+    global events_listener
+    events_listener = FhemEventListener(url=config['fhem']['url'], sensors=config['sensors'], on_change=on_sensor_event,
+                                        on_connection_change=on_events_connection)
+    events_listener.start()
 
 
-def periodic_timer_handler():
+def on_events_connection(connected: bool):
+    """Switch the polling cadence as soon as the event stream is established or lost."""
+    if not scheduler.is_running():
+        return
+    if connected:
+        scheduler.set_period('regulation', config['fhem'].get('reconciliation_frequency', config['app']['pooling_frequency']))
+    else:
+        LOGGER.warning('FHEM event stream lost, back to polling')
+        scheduler.set_period('regulation', config['app']['pooling_frequency'])
+        scheduler.trigger('regulation')  # The readings missed since the disconnection
+
+
+def regulation_job():
     periodic_tasks()
-    Timer(config['app']['pooling_frequency'], periodic_timer_handler).start()
+    frequency = config['app']['pooling_frequency']
+    if events_listener is not None and events_listener.connected:
+        # Readings are pushed, polling is only a reconciliation sweep
+        frequency = config['fhem'].get('reconciliation_frequency', frequency)
+    scheduler.set_period('regulation', frequency)
 
+    # Wake up right at the next tariff change instead of up to one period late
+    delay = off_peak_schedule.seconds_until_transition(datetime.now())
+    if delay is not None:
+        scheduler.trigger('regulation', at=time.monotonic() + delay + 0.5)
 
-def provider_timer_handler():
+
+def provider_job():
     tempo_provider.update()
-    Timer(config['app']['pooling_provider_frequency'], provider_timer_handler).start()
+    publish_state()
+    log_tempo(today=tempo_provider.get_today_price().name, tomorrow=tempo_provider.get_tomorrow_price().name)
+
+
+def start_scheduler():
+    # Tempo first so that the first regulation already knows the day colours.
+    # Colours and measures restored from the warm state are only fetched again when they would have been.
+    provider_frequency = config['app']['pooling_provider_frequency']
+    colours_known = DayPrice.UNKNOWN not in (tempo_provider.get_today_price(), tempo_provider.get_tomorrow_price())
+    scheduler.add_job('tempo', provider_job, period=provider_frequency,
+                      delay=seconds_until_due(tempo_provider.last_success, provider_frequency) if colours_known else 0.0)
+    scheduler.add_job('regulation', regulation_job, period=config['app']['pooling_frequency'],
+                      delay=seconds_until_due(last_poll, config['app']['pooling_frequency']))
+    scheduler.add_job('reevaluation', reevaluation_job)  # Only run on setpoint changes
+    localsql.attach_scheduler(scheduler)
+    config_store.attach_scheduler(scheduler)
+    if warm_store is not None:
+        interval = config['warm_state'].get('interval', 300.0)
+        scheduler.add_job('warm_state', save_warm_state, period=interval, delay=interval)
+    scheduler.start()
+    if temperatures_sources:
+        scheduler.trigger('reevaluation')  # Regulate at once on the restored measures
+
+
+def stop_serving(signum=None, frame=None):
+    """Signal handler: end the event streams and let the server drain the requests in progress."""
+    LOGGER.info(f'Stop requested{f" by signal {signum}" if signum is not None else ""}')
+    stopping.set()
+    state.close()
+    if server is not None:
+        server.stop()
+
+
+def shutdown():
+    """Stop the background threads then write everything still pending, once the server has drained."""
+    global events_listener, config_watcher, control_server, controller
+    if control_server is not None:
+        control_server.stop()
+        control_server = None
+    if controller is not None:
+        controller.stop()
+        controller = None
+    if config_watcher is not None:
+        config_watcher.stop()
+        config_watcher = None
+    if events_listener is not None:
+        events_listener.stop()
+        events_listener = None
+    scheduler.stop()  # Waits for a tick in progress
+    actuator.stop()
+    save_warm_state(force=True)
+    config_store.flush()
+    log_pending_setpoint()  # A change the stopped control loop had no time to log
+    localsql.flush()
+    localsql.commit()
+    LOGGER.info('Shutdown complete')
+
+
+def serve():
+    """Serve the API until SIGTERM or SIGINT, with waitress unless the debug server is asked for."""
+    global server, request_threads
+    settings = config.get('server', {})
+    if settings.get('debug', False):
+        # Werkzeug debugger, without the reloader that would run the background threads twice
+        app.run(host=settings.get('host', '0.0.0.0'), port=settings.get('port', 80), debug=True, use_reloader=False, threaded=True)
+        return
+    # Each event stream holds a worker thread for its whole life, on top of the threads serving the requests
+    request_threads = settings.get('threads', 8)
+    subscribers = config['app'].get('events_max_subscribers', DEFAULT_EVENTS_MAX_SUBSCRIBERS)
+    server = WsgiServer(app, dict(settings, threads=request_threads + subscribers))
+    signal.signal(signal.SIGTERM, stop_serving)
+    signal.signal(signal.SIGINT, stop_serving)
+    server.serve()
+
+
+def control_handlers() -> dict:
+    """Calls the API process forwards to the controller process."""
+    return {
+        "set_setpoint": apply_setpoint,
+        "decision": wait_for_decision,
+        "plan": plan_setpoint,
+        "history": query_history_document,
+        "stats": runtime_stats,
+        "metrics": metrics.render,
+    }
+
+
+def start_controller():
+    """Start sensing, weighting and actuation."""
+    init_app()
+    if config['fhem'].get('events', False):
+        start_event_listener()  # Start the FHEM push ingestion
+    start_scheduler()  # Start the regulation and Tempo provider periodic tasks
+    if config['app'].get('config_watch', True):
+        start_config_watcher()  # Apply config.json changes without restart
+
+
+def start_control_server():
+    global control_server
+    control_server = ControlServer(path=config['app'].get('control_socket', CONTROL_SOCKET), state=state, handlers=control_handlers(),
+                                   heartbeat=config['app'].get('control_heartbeat', 15.0))
+    control_server.start()
+
+
+def run_controller():
+    """Controller process of the split mode: no HTTP server, the API process drives it over the control socket."""
+    start_controller()
+    start_control_server()
+    signal.signal(signal.SIGTERM, stop_serving)
+    signal.signal(signal.SIGINT, stop_serving)
+    stopping.wait()
+
+
+def run_api():
+    """API process of the split mode: serve the state received from the controller and forward the commands to it."""
+    global config, controller
+    config = load_config()
+    diagnostics.configure(config.get('diagnostics', {}))
+    controller = ControlClient(path=config['app'].get('control_socket', CONTROL_SOCKET), state=state,
+                               heartbeat=config['app'].get('control_heartbeat', 15.0))
+    controller.start()
+    if not controller.wait_synced(timeout=10):
+        LOGGER.warning('No state received from the controller yet, the state endpoints answer 503 until then')
+    serve()
+
+
+def spawn_controller() -> subprocess.Popen:
+    """Start the controller process of the split mode, the API process stops if the controller dies."""
+    child = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--role', 'controller'])
+
+    def watch():
+        code = child.wait()
+        if not stopping.is_set():
+            LOGGER.critical(f'Controller process exited with code {code}, stopping')
+            stop_serving()
+
+    threading.Thread(target=watch, name="controller-watch", daemon=True).start()
+    return child
 
 
 if __name__ == '__main__':
     logging.basicConfig(format='%(asctime)s %(levelname)s:%(message)s', level=logging.INFO)
-    init_app()
-    periodic_timer_handler()  # Start the periodic task
-    provider_timer_handler()  # Start the Tempo provider periodic task
-    app.run(host='0.0.0.0', port=80, debug=True)
+    parser = argparse.ArgumentParser(description='RegPaC heating controller')
+    parser.add_argument('--role', choices=('single', 'split', 'controller', 'api'),
+                        help='single: control loop and API in one process. split: start the controller process then serve '
+                             'the API from this one. controller or api: one side of the split mode. Defaults to app.process_mode')
+    role = parser.parse_args().role or load_config()['app'].get('process_mode', 'single')
+    child = None
+    try:
+        if role == 'controller':
+            run_controller()
+        elif role in ('api', 'split'):
+            if role == 'split':
+                child = spawn_controller()
+            run_api()
+        else:
+            start_controller()
+            serve()
+    finally:
+        shutdown()
+        if child is not None and child.poll() is None:
+            child.terminate()  # Graceful shutdown of the controller, as for SIGTERM
+            try:
+                child.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                child.kill()
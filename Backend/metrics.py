@@ -0,0 +1,186 @@
+import bisect
+import math
+import os
+import resource
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+
+def _format_value(value) -> str:
+    if isinstance(value, int):
+        return str(value)
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    labels = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+class Metric:
+    """
+    Base of the metric types: one value per label values tuple.
+    With collect set, the values are not recorded but asked to collect() at render time,
+    it returns a value, or a dict of label values tuple to value for a labelled metric.
+    """
+
+    TYPE = "untyped"
+    SUFFIX = ""
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), collect=None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def samples(self) -> list:
+        """List of (suffix, label values, extra label, value) to render."""
+        if self.collect is not None:
+            values = self.collect()
+            if not isinstance(values, dict):
+                values = {(): values} if values is not None else {}
+        else:
+            with self._lock:
+                values = dict(self._values)
+        return [(self.SUFFIX, labels, "", value) for labels, value in sorted(values.items())]
+
+    def render(self, openmetrics: bool) -> str:
+        name = self.name if openmetrics else self.name + self.SUFFIX
+        lines = [f"# HELP {name} {self.help}", f"# TYPE {name} {self.TYPE}"]
+        for suffix, labels, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, labels, extra)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    TYPE = "counter"
+    SUFFIX = "_total"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    TYPE = "gauge"
+
+    def set(self, value: float, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(Metric):
+    """Cumulative histogram, an observation is one bisection in the bucket bounds."""
+
+    TYPE = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def samples(self) -> list:
+        with self._lock:
+            values = {labels: (list(counts), total) for labels, (counts, total) in self._values.items()}
+        samples = []
+        for labels, (counts, total) in sorted(values.items()):
+            cumulated = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulated += count
+                samples.append(("_bucket", labels, f'le="{_format_value(float(bound))}"', cumulated))
+            samples.append(("_sum", labels, "", total))
+            samples.append(("_count", labels, "", cumulated))
+        return samples
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: tuple):
+        self._histogram = histogram
+        self._labels = labels
+
+    def __enter__(self):
+        self._start = time.monotonic()
+        return self
+
+    def __exit__(self, *exc):
+        self._histogram.observe(time.monotonic() - self._start, *self._labels)
+        return False
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def register(self, metric: Metric) -> Metric:
+        """Register a metric, a metric already registered under the same name is returned instead."""
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self, openmetrics: bool = False) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        text = "\n".join(metric.render(openmetrics) for metric in metrics) + "\n"
+        return text + "# EOF\n" if openmetrics else text
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, help: str, labelnames: tuple = (), collect=None) -> Counter:
+    return REGISTRY.register(Counter(name, help, labelnames, collect))
+
+
+def gauge(name: str, help: str, labelnames: tuple = (), collect=None) -> Gauge:
+    return REGISTRY.register(Gauge(name, help, labelnames, collect))
+
+
+def histogram(name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, help, labelnames, buckets))
+
+
+def render(openmetrics: bool = False) -> str:
+    return REGISTRY.render(openmetrics)
+
+
+def content_type(openmetrics: bool = False) -> str:
+    return OPENMETRICS_CONTENT_TYPE if openmetrics else PROMETHEUS_CONTENT_TYPE
+
+
+def _resident_memory() -> int:
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # Peak only, in kB on Linux
+
+
+gauge("process_resident_memory_bytes", "Resident memory size in bytes", collect=_resident_memory)
+gauge("regpac_threads", "Number of live Python threads", collect=threading.active_count)
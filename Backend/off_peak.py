@@ -0,0 +1,55 @@
+from datetime import datetime
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def parse_hour_min(value: str) -> int:
+    """Convert 'HH:MM' to a minute of the day."""
+    hour, minute = value.split(':')
+    hour, minute = int(hour), int(minute)
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        raise ValueError(f"Invalid time of day: {value}")
+    return hour * 60 + minute
+
+
+class OffPeakSchedule:
+    """
+    Off-peak periods of the config compiled into a minute-of-day bitmap.
+    Like the config, both 'start' and 'end' minutes are off-peak and a period whose end is not after its start crosses midnight.
+    Lookups and the time until the next tariff transition are O(1).
+    """
+
+    def __init__(self, periods: list):
+        self._off_peak = bytearray(MINUTES_PER_DAY)
+        for period in periods:
+            start = parse_hour_min(period['start'])
+            end = parse_hour_min(period['end'])
+            if start < end:
+                minutes = range(start, end + 1)
+            else:  # Over midnight scenario
+                minutes = list(range(start, MINUTES_PER_DAY)) + list(range(0, end + 1))
+            for minute in minutes:
+                self._off_peak[minute] = 1
+
+        # Minutes left before the tariff changes, walking the day backwards twice to wrap around midnight
+        self._until_transition = [None] * MINUTES_PER_DAY
+        if 0 < sum(self._off_peak) < MINUTES_PER_DAY:
+            until = None
+            for index in range(2 * MINUTES_PER_DAY - 1, -1, -1):
+                minute = index % MINUTES_PER_DAY
+                following = (minute + 1) % MINUTES_PER_DAY
+                until = 1 if self._off_peak[minute] != self._off_peak[following] else (until + 1 if until is not None else None)
+                self._until_transition[minute] = until
+
+    def is_off_peak(self, minute: int) -> bool:
+        return self._off_peak[minute] == 1
+
+    def minutes_until_transition(self, minute: int) -> int:
+        """Number of minutes from the start of `minute` to the next tariff change, None if the tariff never changes."""
+        return self._until_transition[minute]
+
+    def seconds_until_transition(self, now: datetime) -> float:
+        minutes = self.minutes_until_transition(now.hour * 60 + now.minute)
+        if minutes is None:
+            return None
+        return minutes * 60 - now.second - now.microsecond / 1e6
@@ -0,0 +1,145 @@
+import logging
+import math
+import threading
+import time
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Job:
+    def __init__(self, name: str, func, period: float, next_run: float):
+        self.name = name
+        self.func = func
+        self.period = period
+        self.next_run = next_run
+        self.wake_at: float = None
+        self.runs = 0
+        self.errors = 0
+        self.overruns = 0
+        self.last_lateness = 0.0
+        self.max_lateness = 0.0
+        self.last_duration = 0.0
+        self.max_duration = 0.0
+
+    def due_at(self) -> float:
+        if self.wake_at is not None and self.wake_at < self.next_run:
+            return self.wake_at
+        return self.next_run
+
+    def get_stats(self) -> dict:
+        return {
+            "period": self.period,
+            "runs": self.runs,
+            "errors": self.errors,
+            "overruns": self.overruns,
+            "last_lateness": self.last_lateness,
+            "max_lateness": self.max_lateness,
+            "last_duration": self.last_duration,
+            "max_duration": self.max_duration,
+        }
+
+
+class Scheduler:
+    """
+    Run periodic jobs from a single thread on fixed cadences measured with the monotonic clock.
+    A job's next run is planned from its previous planned time, not from the end of its run, so the period never drifts.
+    Ticks missed because a run took too long are skipped (and counted as overruns) instead of being caught up.
+    An exception raised by a job is logged and does not stop it nor the other jobs.
+    """
+
+    def __init__(self):
+        self._jobs = {}
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._thread: threading.Thread = None
+
+    def add_job(self, name: str, func, period: float = None, delay: float = 0.0):
+        """Register a job, a job without period only runs when triggered."""
+        with self._condition:
+            next_run = time.monotonic() + delay if period is not None else math.inf
+            self._jobs[name] = Job(name, func, period, next_run)
+            self._condition.notify()
+
+    def set_period(self, name: str, period: float):
+        """Change the cadence of a job, the next run is re-planned from now."""
+        with self._condition:
+            job = self._jobs[name]
+            if job.period is not None and job.period != period:
+                job.period = period
+                job.next_run = min(job.next_run, time.monotonic() + period)
+                self._condition.notify()
+
+    def trigger(self, name: str, at: float = None):
+        """Run a job once as soon as possible, or at the given monotonic time, on top of its cadence."""
+        with self._condition:
+            job = self._jobs[name]
+            at = time.monotonic() if at is None else at
+            if job.wake_at is None or at < job.wake_at:
+                job.wake_at = at
+                self._condition.notify()
+
+    def start(self):
+        with self._condition:
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=timeout)
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and not self._stopping
+
+    def get_stats(self) -> dict:
+        with self._condition:
+            return {name: job.get_stats() for name, job in self._jobs.items()}
+
+    def _next_job(self) -> Job:
+        with self._condition:
+            while not self._stopping:
+                job = min(self._jobs.values(), key=Job.due_at, default=None)
+                delay = job.due_at() - time.monotonic() if job is not None else math.inf
+                if delay <= 0:
+                    return job
+                self._condition.wait(delay if delay != math.inf else None)
+            return None
+
+    def _run(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+
+            start = time.monotonic()
+            with self._condition:
+                triggered = job.wake_at is not None and job.wake_at <= start and job.wake_at < job.next_run
+                if triggered:
+                    job.wake_at = None
+                else:
+                    job.last_lateness = start - job.next_run
+                    job.max_lateness = max(job.max_lateness, job.last_lateness)
+                    if job.wake_at is not None and job.wake_at <= start:
+                        job.wake_at = None
+
+            try:
+                job.func()
+            except Exception:
+                job.errors += 1
+                LOGGER.exception(f"Scheduled job {job.name} failed")
+            end = time.monotonic()
+
+            with self._condition:
+                job.runs += 1
+                job.last_duration = end - start
+                job.max_duration = max(job.max_duration, job.last_duration)
+                if not triggered and job.period is not None:
+                    job.next_run += job.period
+                    if job.next_run <= end:
+                        missed = int((end - job.next_run) // job.period) + 1
+                        job.overruns += missed
+                        job.next_run += missed * job.period
+                        LOGGER.warning(f"Scheduled job {job.name} overran its period, {missed} tick(s) skipped")
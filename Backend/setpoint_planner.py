@@ -0,0 +1,98 @@
+import hashlib
+import json
+import logging
+import threading
+from datetime import date, datetime, timedelta
+
+try:
+    from .off_peak import MINUTES_PER_DAY, OffPeakSchedule
+    from .tempo_provider import DayPrice
+except ImportError:
+    from off_peak import MINUTES_PER_DAY, OffPeakSchedule
+    from tempo_provider import DayPrice
+
+LOGGER = logging.getLogger(__name__)
+
+
+class SetpointPlanner:
+    """
+    Effective setpoint timeline for today and tomorrow.
+    The timeline is rebuilt only when one of its inputs changes (day, off-peak schedule,
+    setpoints, Tempo settings or colours); in between the current setpoint is an O(1) lookup
+    and the serialised plan with its ETag is served from cache.
+    Rebuilds are serialised and build new tables that are swapped in at once, readers never see a partial one.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inputs: tuple = None
+        self._today_setpoints: list = None
+        self.segments: list = []
+        self.revision = 0
+        self._plan = ("{}", "")
+
+    def update(self, day: date, schedule: OffPeakSchedule, off_peak_temp: float, full_cost_temp: float,
+               tempo_settings: dict, today_price: DayPrice, tomorrow_price: DayPrice) -> bool:
+        """Rebuild the timeline if an input changed, return True when it was rebuilt."""
+        inputs = (day, schedule, off_peak_temp, full_cost_temp,
+                  tempo_settings['temperature_increase_prior_to_high_cost'], tempo_settings['temperature_reduction_high_cost'],
+                  today_price, tomorrow_price)
+        with self._lock:
+            if inputs == self._inputs:
+                return False
+            today_setpoints, segments = self._build(day, schedule, off_peak_temp, full_cost_temp, tempo_settings, today_price, tomorrow_price)
+            revision = self.revision + 1
+            body = json.dumps({"revision": revision, "segments": segments})
+            # Readers take no lock: the minute table is swapped first, body and ETag together as one tuple
+            self._today_setpoints = today_setpoints
+            self.segments = segments
+            self._plan = (body, hashlib.sha1(body.encode()).hexdigest())
+            self.revision = revision
+            self._inputs = inputs
+        LOGGER.info(f"Setpoint plan rebuilt (revision {revision}, {len(segments)} segments)")
+        return True
+
+    def _build(self, day: date, schedule: OffPeakSchedule, off_peak_temp: float, full_cost_temp: float,
+               tempo_settings: dict, today_price: DayPrice, tomorrow_price: DayPrice) -> tuple:
+        increase = tempo_settings['temperature_increase_prior_to_high_cost']
+        reduction = tempo_settings['temperature_reduction_high_cost']
+        today_setpoints = []
+        segments = []
+        # Tomorrow, the colour of the day after is not published yet
+        for offset, day_price, next_day_price in ((0, today_price, tomorrow_price), (1, tomorrow_price, DayPrice.UNKNOWN)):
+            midnight = datetime.combine(day + timedelta(days=offset), datetime.min.time())
+            off_peak = self._weight(off_peak_temp, 'off_peak', increase if next_day_price == DayPrice.HIGH else None, 'tomorrow')
+            full_cost = self._weight(full_cost_temp, 'full_cost', reduction if day_price == DayPrice.HIGH else None, 'today')
+            for minute in range(MINUTES_PER_DAY):
+                setpoint = off_peak if schedule.is_off_peak(minute) else full_cost
+                if offset == 0:
+                    today_setpoints.append(setpoint)
+                start = midnight + timedelta(minutes=minute)
+                if segments and (segments[-1]['setpoint'], segments[-1]['reason']) == setpoint:
+                    segments[-1]['end'] = (start + timedelta(minutes=1)).isoformat()
+                else:
+                    segments.append({"start": start.isoformat(), "end": (start + timedelta(minutes=1)).isoformat(),
+                                     "setpoint": setpoint[0], "reason": setpoint[1]})
+        return today_setpoints, segments
+
+    @staticmethod
+    def _weight(base: float, period: str, offset: float, tempo_day: str) -> tuple:
+        if offset is None:
+            return (base, period)
+        return (base + offset, f'{period} + {offset}° due to Tempo {tempo_day} Red day')
+
+    @property
+    def body(self) -> str:
+        return self._plan[0]
+
+    @property
+    def etag(self) -> str:
+        return self._plan[1]
+
+    def get_plan(self) -> tuple:
+        """Get the serialised plan and its ETag, always from the same rebuild."""
+        return self._plan
+
+    def lookup(self, minute: int) -> tuple:
+        """Get the (setpoint, reason) planned for a minute of today."""
+        return self._today_setpoints[minute]
@@ -0,0 +1,98 @@
+import hashlib
+import json
+import threading
+import time
+from collections import deque
+from types import MappingProxyType
+
+
+class Section:
+    """One part of the controller state with its serialised JSON and ETag."""
+
+    __slots__ = ("data", "body", "etag")
+
+    def __init__(self, data: dict, body: str):
+        object.__setattr__(self, "data", data)
+        object.__setattr__(self, "body", body)
+        object.__setattr__(self, "etag", hashlib.sha1(body.encode()).hexdigest())
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Section is immutable")
+
+
+class StateSnapshot:
+    """
+    Immutable, versioned view of the controller state served by the API.
+    A handler reads the current snapshot once and serves its pre-serialised sections as is,
+    it never sees a state half updated by the control loop.
+    """
+
+    __slots__ = ("version", "sections")
+
+    def __init__(self, version: int, sections: dict):
+        object.__setattr__(self, "version", version)
+        object.__setattr__(self, "sections", MappingProxyType(sections))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("StateSnapshot is immutable")
+
+
+def changed_sections(previous: StateSnapshot, snapshot: StateSnapshot) -> str:
+    """JSON object of the sections of snapshot that differ from previous (all of them without previous), built from the cached bodies."""
+    names = [name for name, section in snapshot.sections.items()
+             if previous is None or name not in previous.sections or previous.sections[name].etag != section.etag]
+    return "{" + ", ".join(f"{json.dumps(name)}: {snapshot.sections[name].body}" for name in names) + "}"
+
+
+class StatePublisher:
+    """
+    Build and publish state snapshots.
+    Publishing replaces the current snapshot with a single reference assignment, readers take no lock.
+    The version only moves when a section actually changed; unchanged sections keep their body and ETag.
+    The last `history` snapshots are kept so that stream subscribers can resume with a delta,
+    `epoch` tells versions of this process from those of a previous run.
+    """
+
+    def __init__(self, history: int = 64):
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self.epoch = int(time.time())
+        self.current = StateSnapshot(0, {})
+        self.closed = False
+        self._history = deque([self.current], maxlen=history)
+
+    def publish(self, build) -> StateSnapshot:
+        """Publish the sections returned by build(), called under the publisher lock so publications never interleave."""
+        with self._lock:
+            sections = dict(self.current.sections)
+            changed = False
+            for name, data in build().items():
+                body = json.dumps(data)
+                if name not in sections or sections[name].body != body:
+                    sections[name] = Section(data, body)
+                    changed = True
+            if changed:
+                self.current = StateSnapshot(self.current.version + 1, sections)
+                self._history.append(self.current)
+                self._changed.notify_all()
+            return self.current
+
+    def get_snapshot(self, version: int) -> StateSnapshot:
+        """Get a recent snapshot by version, None when it is too old."""
+        with self._lock:
+            for snapshot in self._history:
+                if snapshot.version == version:
+                    return snapshot
+            return None
+
+    def wait_for_change(self, version: int, timeout: float) -> StateSnapshot:
+        """Wait up to timeout seconds for a snapshot newer than version, return the current one."""
+        with self._changed:
+            self._changed.wait_for(lambda: self.current.version != version or self.closed, timeout=timeout)
+            return self.current
+
+    def close(self):
+        """Wake every waiter up for good, used at shutdown to end the streams."""
+        with self._changed:
+            self.closed = True
+            self._changed.notify_all()
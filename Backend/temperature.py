@@ -1,53 +1,219 @@
-import requests
 import logging
 
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
+from time import monotonic
+
+import requests
+
+try:
+    from . import http_client, metrics
+except ImportError:
+    import http_client
+    import metrics
 
 LOGGER = logging.getLogger(__name__)
 
+# The batch collect mode reports its single request under the device "batch"
+FHEM_REQUEST_SECONDS = metrics.histogram("regpac_fhem_request_seconds", "Latency of the FHEM jsonlist2 requests", ("device",))
+FHEM_REQUEST_ERRORS = metrics.counter("regpac_fhem_request_errors", "FHEM jsonlist2 requests that failed or returned no reading", ("device",))
+COLLECT_SECONDS = metrics.histogram("regpac_collect_temperatures_seconds", "Duration of the collection of all the sensors", ("mode",))
+
+DEFAULT_MAX_WORKERS = 4
+
+_executor: ThreadPoolExecutor = None
+_executor_workers: int = 0
+_in_flight = {}
+_last_measures = {}
+_reading_cache = {}
+
 
 class Measure:
-    def __init__(self, temperature: float, name: str, timestamp: datetime):
+    def __init__(self, temperature: float, name: str, timestamp: datetime, late: bool = False):
         self.temp = temperature
         self.name = name
         self.timestamp = timestamp
+        self.late = late
 
 
 def collect_temperatures(config: dict):
+    start = monotonic()
     temperatures_sources = []
+    late_devices = set()
+    # Serial and batch modes: bounds the connection and each socket read, not the whole request.
+    # Only the concurrent mode enforces a wall-clock deadline, fhem.tick_timeout
+    timeout = config['fhem'].get('sensor_timeout')
+
+    collect_mode = config['fhem'].get('collect_mode', 'serial')
+    if collect_mode == 'batch':
+        readings = send_batch_request(url=config['fhem']['url'], devices=[sensor['device'] for sensor in config['sensors']], timeout=timeout)
+    elif collect_mode == 'concurrent':
+        readings, late_devices = poll_concurrently(config)
+    else:
+        readings = {}
+        for sensor in config['sensors']:
+            readings[sensor['device']] = send_request(url=config['fhem']['url'], device=sensor['device'], timeout=timeout)
 
     for sensor in config['sensors']:
-        temp, time = send_request(url=config['fhem']['url'], device=sensor['device'])
+        if sensor['device'] in late_devices:
+            # Keep regulating on the last known value, flagged so callers know it missed the deadline
+            last = _last_measures.get(sensor['device'])
+            if last is not None:
+                temperatures_sources.append(Measure(temperature=last.temp, name=last.name, timestamp=last.timestamp, late=True))
+            continue
+
+        temp, time = readings.get(sensor['device'], (None, None))
         if temp is not None and time is not None:
-            meas = Measure(temperature=float(temp), name=sensor['name'], timestamp=datetime.strptime(time, "%Y-%m-%d %H:%M:%S"))
-            temperatures_sources.append(meas)
+            temperatures_sources.append(_get_measure(sensor, temp, time))
 
     # Print all sensor values in one line
     if temperatures_sources:
-        sensor_values = " | ".join([f"{m.name}: {m.temp}°C" for m in temperatures_sources])
+        sensor_values = " | ".join([f"{m.name}: {m.temp}°C" + (" (late)" if m.late else "") for m in temperatures_sources])
         LOGGER.info(f"Temperatures: {sensor_values}")
 
+    COLLECT_SECONDS.observe(monotonic() - start, collect_mode)
     return temperatures_sources
 
 
-def send_request(url: str, device: str):
+def _get_measure(sensor: dict, temp: str, time: str) -> Measure:
+    # FHEM only updates a reading Time when the sensor reports, reuse the Measure until then
+    cached = _reading_cache.get(sensor['device'])
+    if cached is not None and cached[0] == (sensor['name'], temp, time):
+        return cached[1]
+
+    meas = Measure(temperature=float(temp), name=sensor['name'], timestamp=datetime.strptime(time, "%Y-%m-%d %H:%M:%S"))
+    _reading_cache[sensor['device']] = ((sensor['name'], temp, time), meas)
+    _last_measures[sensor['device']] = meas
+    return meas
+
+
+def reset_cache():
+    _reading_cache.clear()
+    _last_measures.clear()
+
+
+def restore_last_measures(measures: dict):
+    """Seed the last known measure of each device, as fallback for the sensors missing the first tick deadline."""
+    for device, measure in measures.items():
+        _last_measures.setdefault(device, measure)
+
+
+def _get_executor(max_workers: int) -> ThreadPoolExecutor:
+    global _executor, _executor_workers
+    if _executor is None or _executor_workers != max_workers:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+        _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sensor")
+        _executor_workers = max_workers
+    return _executor
+
+
+def poll_concurrently(config: dict):
+    """Poll every sensor in parallel on a bounded worker pool.
+
+    Each request is bounded by fhem.sensor_timeout and the whole tick by fhem.tick_timeout.
+    Returns the readings that arrived in time and the set of devices that missed the deadline.
+    A device whose previous request is still pending is not polled again and counts as late.
+    """
+    url = config['fhem']['url']
+    timeout = config['fhem'].get('sensor_timeout', 5.0)
+    tick_timeout = config['fhem'].get('tick_timeout', timeout)
+    executor = _get_executor(config['fhem'].get('max_workers', DEFAULT_MAX_WORKERS))
+
+    futures = {}
+    for sensor in config['sensors']:
+        device = sensor['device']
+        future = _in_flight.get(device)
+        if future is None or future.done():
+            future = executor.submit(send_request, url=url, device=device, timeout=timeout)
+            _in_flight[device] = future
+        futures[future] = device
+
+    done, not_done = wait(futures, timeout=tick_timeout)
+
+    readings = {}
+    for future in done:
+        device = futures[future]
+        try:
+            readings[device] = future.result()
+        except Exception as e:
+            LOGGER.warning(f"Request to {device} failed with exception : {e}")
+
+    late_devices = set(futures[future] for future in not_done)
+    if late_devices:
+        LOGGER.warning(f"Sensors missed the {tick_timeout}s tick deadline: {', '.join(sorted(late_devices))}")
+
+    return readings, late_devices
+
+
+def send_request(url: str, device: str, timeout: float = None):
     params = {
         "cmd": f"jsonlist2 {device}",
         "XHR": "1",
     }
 
-    response = requests.post(url, params=params)
+    try:
+        response = _timed_post(url, params, timeout, device)
+    except requests.RequestException as e:
+        # One unreachable sensor must not abort the collection of the others
+        LOGGER.warning(f"Request to {device} failed with exception : {e}")
+        return None, None
     if response.status_code == 200:
         data = response.json()
         if isinstance(data.get("Results"), list) and data["Results"]:
             temperature = data["Results"][0]["Readings"]["temperature"]["Value"]
             time = data["Results"][0]["Readings"]["temperature"]["Time"]
         else:
+            FHEM_REQUEST_ERRORS.inc(device)
             temperature = None
             time = None
 
         return temperature, time
 
     else:
+        FHEM_REQUEST_ERRORS.inc(device)
         LOGGER.warning(f"Request failed with status code {response.status_code}: {response.text}")
         return None, None
+
+
+def send_batch_request(url: str, devices: list, timeout: float = None) -> dict:
+    """Fetch the temperature reading of every device in a single jsonlist2 round trip.
+
+    Returns a dict mapping each device name found in the answer to a (value, time) tuple.
+    """
+    if not devices:
+        return {}
+
+    params = {
+        "cmd": f"jsonlist2 {','.join(devices)} temperature",
+        "XHR": "1",
+    }
+
+    try:
+        response = _timed_post(url, params, timeout, "batch")
+    except requests.RequestException as e:
+        LOGGER.warning(f"Batch request failed with exception : {e}")
+        return {}
+    if response.status_code != 200:
+        FHEM_REQUEST_ERRORS.inc("batch")
+        LOGGER.warning(f"Batch request failed with status code {response.status_code}: {response.text}")
+        return {}
+
+    readings = {}
+    results = response.json().get("Results")
+    if isinstance(results, list):
+        for result in results:
+            reading = result.get("Readings", {}).get("temperature")
+            if reading is not None and result.get("Name") not in readings:
+                readings[result.get("Name")] = (reading.get("Value"), reading.get("Time"))
+
+    return readings
+
+
+def _timed_post(url: str, params: dict, timeout: float, device: str):
+    try:
+        with FHEM_REQUEST_SECONDS.time(device):
+            return http_client.post(url, params=params, timeout=timeout)
+    except Exception:
+        FHEM_REQUEST_ERRORS.inc(device)
+        raise
@@ -1,10 +1,21 @@
 import requests
 import logging
+import time
+from datetime import datetime
 from enum import Enum
 from typing import Optional
 
+try:
+    from . import http_client, metrics
+except ImportError:
+    import http_client
+    import metrics
+
 LOGGER = logging.getLogger(__name__)
 
+TEMPO_FETCH_SECONDS = metrics.histogram("regpac_tempo_fetch_seconds", "Latency of the Tempo API requests", ("day",))
+TEMPO_FETCH_ERRORS = metrics.counter("regpac_tempo_fetch_errors", "Tempo API requests that failed", ("day",))
+
 
 class DayPrice(Enum):
     UNKNOWN = 0
@@ -29,6 +40,7 @@ class TempoProvider:
         self._tomorrow_price: DayPrice = DayPrice.UNKNOWN
         self._today_data: Optional[dict] = None
         self._tomorrow_data: Optional[dict] = None
+        self.last_success: Optional[float] = None
 
     def _map_code_to_price(self, code_day: int) -> DayPrice:
         if code_day == 1:
@@ -45,18 +57,22 @@ class TempoProvider:
         try:
             url = f"{self.BASE_URL}/{endpoint}"
             LOGGER.info(f"Fetching Tempo data from: {url}")
-            response = requests.get(url, timeout=10)
+            with TEMPO_FETCH_SECONDS.time(endpoint):
+                response = http_client.get(url)  # Timeout from the http section of the config
             response.raise_for_status()
             data = response.json()
             LOGGER.info(f"Successfully fetched {endpoint} Tempo data: {data}")
             return data
         except requests.exceptions.RequestException as e:
+            TEMPO_FETCH_ERRORS.inc(endpoint)
             LOGGER.error(f"Failed to fetch Tempo {endpoint} data: {e}")
             return None
         except ValueError as e:
+            TEMPO_FETCH_ERRORS.inc(endpoint)
             LOGGER.error(f"Failed to parse Tempo {endpoint} JSON response: {e}")
             return None
         except Exception as e:
+            TEMPO_FETCH_ERRORS.inc(endpoint)
             LOGGER.error(f"Unexpected error fetching Tempo {endpoint} data: {e}")
             return None
 
@@ -67,6 +83,7 @@ class TempoProvider:
         today_data = self._fetch_tempo_day("today")
         if today_data:
             self._today_data = today_data
+            self.last_success = time.time()
             self._today_price = self._map_code_to_price(today_data.get("codeJour", 0))
             LOGGER.info(f"Today's Tempo price: {self._today_price.name}")
         else:
@@ -82,6 +99,38 @@ class TempoProvider:
             self._tomorrow_price = DayPrice.UNKNOWN
             LOGGER.warning("Failed to update tomorrow's Tempo price")
 
+    def get_state(self) -> dict:
+        return {
+            "today": self._today_price.name,
+            "tomorrow": self._tomorrow_price.name,
+            "today_data": self._today_data,
+            "tomorrow_data": self._tomorrow_data,
+            "fetched_at": self.last_success
+        }
+
+    def restore_state(self, state: dict, now: datetime = None) -> bool:
+        """
+        Take over the colours fetched by a previous run, returns whether they could be used.
+        Colours fetched yesterday are shifted: yesterday's tomorrow is today, tomorrow is unknown.
+        """
+        fetched_at = state.get("fetched_at")
+        if not fetched_at:
+            return False
+        days = ((now or datetime.now()).date() - datetime.fromtimestamp(fetched_at).date()).days
+        try:
+            if days == 0:
+                prices = (DayPrice[state["today"]], state.get("today_data"), DayPrice[state["tomorrow"]], state.get("tomorrow_data"))
+            elif days == 1:
+                prices = (DayPrice[state["tomorrow"]], state.get("tomorrow_data"), DayPrice.UNKNOWN, None)
+            else:
+                return False
+        except KeyError:
+            return False
+        self._today_price, self._today_data, self._tomorrow_price, self._tomorrow_data = prices
+        self.last_success = fetched_at
+        LOGGER.info(f"Restored Tempo prices: today {self._today_price.name}, tomorrow {self._tomorrow_price.name}")
+        return True
+
     def get_today_price(self) -> DayPrice:
         """Get today's electricity price level."""
         return self._today_price
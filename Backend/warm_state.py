@@ -0,0 +1,73 @@
+import json
+import logging
+import threading
+import time
+
+try:
+    from .config_store import atomic_write
+except ImportError:
+    from config_store import atomic_write
+
+LOGGER = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+# Refreshed on every snapshot, a snapshot differing only by these is not worth a write
+VOLATILE_KEYS = ("saved_at", "polled_at")
+
+
+class WarmStateStore:
+    """
+    Snapshot of the controller state that is slow or noisy to rebuild after a restart: last measures,
+    last actuator command, Tempo colours. Written periodically and at shutdown, read back at boot.
+    A periodic save identical to the last written snapshot, timestamps aside, does not touch the disk.
+    """
+
+    def __init__(self, path: str, max_age: float = 900.0):
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._last_written: dict = None
+        self._stats = {"writes": 0, "skipped": 0, "errors": 0}
+
+    def load(self) -> dict:
+        """Get the snapshot of the previous run, None when there is none that can be used."""
+        try:
+            with open(self.path, "r") as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            LOGGER.warning(f"Ignore unreadable warm state {self.path}: {e}")
+            return None
+        if not isinstance(snapshot, dict) or snapshot.get("version") != FORMAT_VERSION:
+            LOGGER.warning(f"Ignore warm state {self.path} of another format")
+            return None
+        return snapshot
+
+    def is_fresh(self, snapshot: dict, now: float = None) -> bool:
+        """Tell whether the measures and actuator state of a snapshot are recent enough to be trusted."""
+        age = (now if now is not None else time.time()) - snapshot.get("saved_at", 0.0)
+        return 0.0 <= age <= self.max_age
+
+    def save(self, snapshot: dict, force: bool = False) -> bool:
+        """Write the snapshot unless it matches the last one written, returns whether it was written."""
+        with self._lock:
+            stable = {key: value for key, value in snapshot.items() if key not in VOLATILE_KEYS}
+            if not force and stable == self._last_written:
+                self._stats["skipped"] += 1
+                return False
+            content = dict(snapshot, version=FORMAT_VERSION, saved_at=time.time())
+            try:
+                atomic_write(self.path, json.dumps(content, separators=(",", ":")))
+            except OSError as e:
+                self._stats["errors"] += 1
+                LOGGER.error(f"Fail to write warm state to {self.path} due to : {e}")
+                return False
+            self._last_written = stable
+            self._stats["writes"] += 1
+            return True
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
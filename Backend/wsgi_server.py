@@ -0,0 +1,73 @@
+import logging
+import threading
+import time
+
+import waitress
+from waitress import wasyncore
+
+LOGGER = logging.getLogger(__name__)
+
+
+class WsgiServer:
+    """
+    Production serving of a WSGI app with waitress: a fixed pool of worker threads, HTTP/1.1 keep-alive
+    and idle connections closed after channel_timeout seconds.
+    stop() may be called from a signal handler or any thread. serve() then stops accepting connections,
+    lets the requests in progress finish for up to drain_timeout seconds and returns.
+    """
+
+    def __init__(self, app, settings: dict):
+        self.app = app
+        self.host = settings.get("host", "0.0.0.0")
+        self.port = settings.get("port", 80)
+        self.threads = settings.get("threads", 8)
+        self.connection_limit = settings.get("connection_limit", 100)
+        self.channel_timeout = settings.get("channel_timeout", 30)
+        self.backlog = settings.get("backlog", 64)
+        self.max_request_body_size = settings.get("max_request_body_size", 1048576)
+        self.drain_timeout = settings.get("drain_timeout", 10.0)
+        self._stopping = threading.Event()
+        self._ready = threading.Event()
+        self._server = None
+
+    @property
+    def effective_port(self) -> int:
+        """Port actually listened on, useful with port 0."""
+        return self._server.effective_port
+
+    def wait_ready(self, timeout: float = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def serve(self):
+        self._server = waitress.create_server(self.app, host=self.host, port=self.port, threads=self.threads,
+                                              connection_limit=self.connection_limit, channel_timeout=self.channel_timeout,
+                                              cleanup_interval=max(1, self.channel_timeout // 2), backlog=self.backlog,
+                                              max_request_body_size=self.max_request_body_size, ident="RegPaC")
+        LOGGER.info(f"Serving on http://{self._server.effective_host}:{self._server.effective_port} with {self.threads} threads")
+        self._ready.set()
+        while not self._stopping.is_set():
+            wasyncore.loop(timeout=1.0, map=self._server._map, count=1)
+        self._drain()
+
+    def stop(self):
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        if self._server is not None:
+            self._server.pull_trigger()  # Wake the loop up
+
+    def _busy(self) -> bool:
+        dispatcher = self._server.task_dispatcher
+        return bool(dispatcher.queue) or dispatcher.active_count > 0 or any(channel.writable() for channel in list(self._server._map.values()))
+
+    def _drain(self):
+        self._server.accepting = False
+        start = time.monotonic()
+        while self._busy() and time.monotonic() - start < self.drain_timeout:
+            wasyncore.loop(timeout=0.1, map=self._server._map, count=1)
+        if self._busy():
+            LOGGER.warning(f"Requests still in progress after {self.drain_timeout}s, closing their connections")
+        else:
+            LOGGER.info(f"Requests drained in {(time.monotonic() - start) * 1000:.0f} ms")
+        self._server.task_dispatcher.shutdown(timeout=1.0)
+        wasyncore.close_all(self._server._map)
@@ -0,0 +1,202 @@
+"""
+Control-loop benchmarks against a simulated FHEM server.
+
+Run from the repository root, for example:
+    python -m Benchmarks.benchmark_control_loop --sensors 4 50 500 --latency 0.005 --output results.json
+    python -m Benchmarks.benchmark_control_loop --compare baseline.json results.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+current_directory = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(current_directory, "../Backend"))
+
+import heat  # noqa: E402
+import localsql  # noqa: E402
+import main  # noqa: E402
+from off_peak import OffPeakSchedule  # noqa: E402
+from temperature import collect_temperatures, reset_cache  # noqa: E402
+from tempo_provider import TempoProvider  # noqa: E402
+
+from Benchmarks.fake_fhem import FakeFhem  # noqa: E402
+
+COLLECT_MODES = ("serial", "batch", "concurrent")
+
+
+def percentile(values: list, ratio: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(ratio * len(ordered)), len(ordered) - 1)]
+
+
+def measure(func, iterations: int, warmup: int = 1) -> dict:
+    """Run func iterations times: wall latency percentiles, throughput, CPU time per call and peak traced memory."""
+    for _ in range(warmup):
+        func()
+
+    latencies = []
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    # Separate pass, tracemalloc would skew the timings
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "iterations": iterations,
+        "latency": {
+            "mean": statistics.fmean(latencies),
+            "p50": percentile(latencies, 0.50),
+            "p95": percentile(latencies, 0.95),
+            "max": max(latencies),
+        },
+        "throughput_per_s": iterations / wall if wall > 0 else None,
+        "cpu_seconds_per_call": cpu / iterations,
+        "peak_memory_bytes": peak,
+    }
+
+
+def make_config(fhem: FakeFhem, sensors: list, mode: str) -> dict:
+    return {
+        "app": {"pooling_frequency": 60, "pooling_provider_frequency": 10800},
+        "fhem": {"url": fhem.url, "collect_mode": mode, "sensor_timeout": 5, "tick_timeout": 10, "max_workers": 4},
+        "sensors": sensors,
+        "actuator": {"device": "EnO_AAAAAAAA"},
+        "set_temperature": {"off_peak_cost": 20.5, "full_cost": 19.0},
+        "off_peak": [{"start": "00:30", "end": "07:30"}, {"start": "12:30", "end": "14:00"}],
+        "tempo": {"temperature_reduction_high_cost": -2.0, "temperature_increase_prior_to_high_cost": 2.0},
+    }
+
+
+def setup_controller(config: dict):
+    """Wire the controller globals as init_app does, without reading the container config."""
+    main.config = config
+    main.off_peak_schedule = OffPeakSchedule(config['off_peak'])
+    main.set_off_peak_temp = config['set_temperature']['off_peak_cost']
+    main.set_full_cost_temp = config['set_temperature']['full_cost']
+    main.tempo_provider = TempoProvider()
+    main.last_regulation_inputs = None
+    main.last_heat_decision = None
+    reset_cache()
+
+
+def run_scenario(sensor_count: int, args) -> list:
+    fhem = FakeFhem(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, payload_size=args.payload_size, seed=args.seed).start()
+    results = []
+    try:
+        sensors = fhem.add_sensors(sensor_count)
+        parameters = {"sensors": sensor_count, "fhem_latency": args.latency, "fhem_jitter": args.jitter,
+                      "fhem_error_rate": args.error_rate, "fhem_payload_size": args.payload_size}
+
+        for mode in COLLECT_MODES:
+            if mode == "serial" and sensor_count * args.latency * args.iterations > args.max_serial_seconds:
+                continue  # Would take too long to be useful
+            config = make_config(fhem, sensors, mode)
+            reset_cache()
+            results.append(dict(parameters, benchmark="collect_temperatures", mode=mode,
+                                **measure(lambda: collect_temperatures(config), args.iterations)))
+
+        config = make_config(fhem, sensors, "batch")
+        setup_controller(config)
+        measures = collect_temperatures(config)
+        results.append(dict(parameters, benchmark="weights_the_temp_setting",
+                            **measure(main.weights_the_temp_setting, args.iterations * 100)))
+        if measures:
+            results.append(dict(parameters, benchmark="regulate_heating",
+                                **measure(lambda: main.regulate_heating(19.0, measures), args.iterations * 100)))
+
+        states = iter([True, False] * (args.iterations + 2))
+        results.append(dict(parameters, benchmark="send_heat",
+                            **measure(lambda: heat.send_heat(config=config, enable=next(states)), args.iterations)))
+
+        for mode in ("batch", "concurrent"):
+            setup_controller(make_config(fhem, sensors, mode))
+            results.append(dict(parameters, benchmark="periodic_tasks", mode=mode,
+                                **measure(lambda: main.periodic_tasks(force=True), args.iterations)))
+    finally:
+        fhem.stop()
+    return results
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=current_directory, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline_path: str, results_path: str):
+    """Print the p50 latency ratio of each benchmark present in both result files."""
+    with open(baseline_path) as f:
+        baseline = {(r["benchmark"], r.get("mode"), r["sensors"]): r for r in json.load(f)["results"]}
+    with open(results_path) as f:
+        results = json.load(f)["results"]
+    for result in results:
+        key = (result["benchmark"], result.get("mode"), result["sensors"])
+        if key in baseline:
+            before, after = baseline[key]["latency"]["p50"], result["latency"]["p50"]
+            ratio = after / before if before else float("inf")
+            print(f"{key[0]:<26} {key[1] or '-':<11} {key[2]:>4} sensors  p50 {before * 1000:9.3f} ms -> {after * 1000:9.3f} ms  x{ratio:.2f}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sensors", type=int, nargs="+", default=[4, 50, 500], help="Sensor counts to simulate")
+    parser.add_argument("--latency", type=float, default=0.002, help="FHEM answer latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.001, help="Extra random latency, up to this many seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Ratio of FHEM requests answered with a 500")
+    parser.add_argument("--payload-size", type=int, default=512, help="Bytes of extra internals per device in jsonlist2 answers")
+    parser.add_argument("--iterations", type=int, default=20, help="Measured iterations of each benchmark")
+    parser.add_argument("--max-serial-seconds", type=float, default=60.0, help="Skip the serial mode when it would take longer")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the simulated jitter and errors")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "RESULTS"), help="Compare two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    localsql.LOG_DIR = tempfile.mkdtemp(prefix="regpac_bench_")
+    results = []
+    for sensor_count in args.sensors:
+        for result in run_scenario(sensor_count, args):
+            results.append(result)
+            print(f"{result['benchmark']:<26} {result.get('mode') or '-':<11} {result['sensors']:>4} sensors  "
+                  f"p50 {result['latency']['p50'] * 1000:9.3f} ms  p95 {result['latency']['p95'] * 1000:9.3f} ms  "
+                  f"cpu {result['cpu_seconds_per_call'] * 1000:8.3f} ms  peak {result['peak_memory_bytes'] / 1024:8.1f} KiB")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=4)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,134 @@
+import json
+import queue
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+
+class FakeFhem:
+    """
+    Local stand-in for a FHEMWEB instance.
+    - POST /fhem?cmd=jsonlist2 <devspec> [temperature] answers from self.readings
+    - GET /fhem?inform=... streams the events pushed with push_reading() (chunked, one JSON array per line)
+    POST answers can be slowed down by latency plus up to jitter seconds, fail with a 500 at error_rate,
+    and carry payload_size bytes of extra internals per device like a real jsonlist2 does.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, payload_size: int = 0, seed: int = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.payload_size = payload_size
+        self._random = random.Random(seed)
+        self.readings = {}
+        self.commands = []
+        self._events = queue.Queue()
+        self._stopping = threading.Event()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}/fhem"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopping.set()
+        self.close_streams()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def push_reading(self, device: str, value: str, time: str):
+        self.readings[device] = (value, time)
+        self._events.put(json.dumps([f"{device}-temperature", value, value]))
+        self._events.put(json.dumps([f"{device}-temperature-ts", time, time]))
+
+    def add_sensors(self, count: int, value: str = "19.5", time: str = "2024-12-10 23:53:39") -> list:
+        """Create count sensors with a reading, returns their 'sensors' config section."""
+        sensors = []
+        for index in range(count):
+            device = f"EnO_{index:08X}"
+            self.readings[device] = (value, time)
+            sensors.append({"name": f"Room {index}", "device": device})
+        return sensors
+
+    def push_raw(self, line: str):
+        self._events.put(line)
+
+    def close_streams(self):
+        """Terminate the current inform stream, as FHEM does on restart."""
+        self._events.put(None)
+
+    def jsonlist2(self, devspec: str) -> dict:
+        results = []
+        for device in devspec.split(","):
+            if device in self.readings:
+                value, time = self.readings[device]
+                result = {"Name": device, "Readings": {"temperature": {"Value": value, "Time": time}}}
+                if self.payload_size:
+                    result["Internals"] = {"DEF": "x" * self.payload_size}
+                results.append(result)
+        return {"Arg": devspec, "Results": results, "totalResultsReturned": len(results)}
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # Headers and body are sent apart, avoid the delayed ACK stall
+
+            def do_GET(self):
+                query = parse_qs(urlsplit(self.path).query)
+                if "inform" not in query:
+                    self._answer(400, b"")
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                while not fake._stopping.is_set():
+                    try:
+                        line = fake._events.get(timeout=0.05)
+                    except queue.Empty:
+                        continue
+                    if line is None:
+                        break
+                    data = (line + "\n").encode()
+                    self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+                self.close_connection = True
+
+            def do_POST(self):
+                query = parse_qs(urlsplit(self.path).query)
+                cmd = query.get("cmd", [""])[0]
+                fake.commands.append(cmd)
+                delay = fake.latency + (fake._random.uniform(0, fake.jitter) if fake.jitter else 0.0)
+                if delay > 0:
+                    time.sleep(delay)
+                if fake.error_rate and fake._random.random() < fake.error_rate:
+                    self._answer(500, b"")
+                    return
+                if cmd.startswith("jsonlist2 "):
+                    self._answer(200, json.dumps(fake.jsonlist2(cmd.split(" ")[1])).encode())
+                else:
+                    self._answer(200, b"")
+
+            def _answer(self, status: int, body: bytes):
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
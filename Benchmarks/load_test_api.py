@@ -0,0 +1,205 @@
+"""
+HTTP API load test of a locally started controller wired to a simulated FHEM server.
+
+The controller runs its regulation loop while client threads fire mixed GET and POST traffic.
+Latency percentiles, error rates and throughput are reported per endpoint, and the regulation
+ticks of an idle phase are compared with those under load.
+
+Run from the repository root, for example:
+    python -m Benchmarks.load_test_api --clients 8 --duration 20 --output load.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import requests
+
+current_directory = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(current_directory, "../Backend"))
+
+# The controller reads its config from here, set before it is imported
+CONFIG_PATH = os.path.join(tempfile.mkdtemp(prefix="regpac_load_"), "config.json")
+os.environ["REGPAC_CONFIG"] = CONFIG_PATH
+
+import main  # noqa: E402
+from wsgi_server import WsgiServer  # noqa: E402
+from Benchmarks.benchmark_control_loop import git_revision, make_config, percentile  # noqa: E402
+from Benchmarks.fake_fhem import FakeFhem  # noqa: E402
+
+# (method, path, weight)
+TRAFFIC = (
+    ("GET", "/temperatures", 35),
+    ("GET", "/heater/status", 20),
+    ("GET", "/tempo", 15),
+    ("GET", "/setpoint", 15),
+    ("GET", "/setpoint/plan", 5),
+    ("POST", "/setpoint", 10),
+)
+
+
+def latency_summary(values: list) -> dict:
+    if not values:
+        return None
+    return {"p50": percentile(values, 0.50), "p95": percentile(values, 0.95), "p99": percentile(values, 0.99), "max": max(values)}
+
+
+class TickRecorder:
+    """Wrap the regulation job to record when each tick starts and how long it runs."""
+
+    def __init__(self, job):
+        self._job = job
+        self._lock = threading.Lock()
+        self.ticks = []
+
+    def __call__(self):
+        start = time.monotonic()
+        try:
+            self._job()
+        finally:
+            with self._lock:
+                self.ticks.append((start, time.monotonic() - start))
+
+    def summary(self, since: float, until: float, period: float) -> dict:
+        with self._lock:
+            ticks = [tick for tick in self.ticks if since <= tick[0] < until]
+        delays = [max(current[0] - previous[0] - period, 0.0) for previous, current in zip(ticks, ticks[1:])]
+        return {
+            "ticks": len(ticks),
+            "start_delay": latency_summary(delays),
+            "duration": latency_summary([duration for _, duration in ticks]),
+        }
+
+
+def client(base_url: str, deadline: float, seed: int, samples: dict, lock: threading.Lock):
+    rng = random.Random(seed)
+    session = requests.Session()
+    choices = [(method, path) for method, path, weight in TRAFFIC for _ in range(weight)]
+    while time.monotonic() < deadline:
+        method, path = rng.choice(choices)
+        start = time.perf_counter()
+        try:
+            if method == "POST":
+                body = {"off_peak_cost": round(rng.uniform(19.0, 22.0), 1), "full_cost": round(rng.uniform(17.0, 19.0), 1)}
+                response = session.post(base_url + path, json=body, timeout=10)
+            else:
+                response = session.get(base_url + path, timeout=10)
+            error = response.status_code >= 400
+        except requests.RequestException:
+            error = True
+        elapsed = time.perf_counter() - start
+        with lock:
+            entry = samples.setdefault(f"{method} {path}", {"latencies": [], "errors": 0})
+            entry["latencies"].append(elapsed)
+            entry["errors"] += error
+
+
+def run(args) -> dict:
+    fhem = FakeFhem(latency=args.fhem_latency, jitter=args.fhem_latency / 2, seed=args.seed).start()
+    config = make_config(fhem, fhem.add_sensors(args.sensors), "batch")
+    config["app"]["pooling_frequency"] = args.period
+    config["logs"] = {"text": False}
+    with open(CONFIG_PATH, "w") as f:
+        json.dump(config, f)
+
+    main.init_app()
+    recorder = TickRecorder(main.regulation_job)
+    # The Tempo job is left out, it would query the real Tempo API
+    main.scheduler.add_job('regulation', recorder, period=args.period)
+    main.scheduler.add_job('reevaluation', main.reevaluation_job)
+    main.scheduler.start()
+
+    # Served as in production
+    server = WsgiServer(main.app, {"host": "127.0.0.1", "port": 0, "threads": args.threads})
+    server_thread = threading.Thread(target=server.serve, daemon=True)
+    server_thread.start()
+    server.wait_ready()
+    base_url = f"http://127.0.0.1:{server.effective_port}"
+
+    try:
+        idle_start = time.monotonic()
+        time.sleep(args.idle)
+        load_start = time.monotonic()
+
+        samples, lock = {}, threading.Lock()
+        deadline = load_start + args.duration
+        clients = [threading.Thread(target=client, args=(base_url, deadline, args.seed + index, samples, lock)) for index in range(args.clients)]
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+        load_end = time.monotonic()
+    finally:
+        server.stop()
+        server_thread.join()
+        main.scheduler.stop()
+        main.actuator.stop()
+        fhem.stop()
+
+    endpoints = {}
+    for name, entry in sorted(samples.items()):
+        count = len(entry["latencies"])
+        endpoints[name] = {
+            "requests": count,
+            "errors": entry["errors"],
+            "error_rate": entry["errors"] / count,
+            "throughput_per_s": count / (load_end - load_start),
+            "latency": latency_summary(entry["latencies"]),
+        }
+    return {
+        "meta": {"timestamp": datetime.now().isoformat(), "revision": git_revision()},
+        "parameters": {"clients": args.clients, "threads": args.threads, "duration": args.duration, "sensors": args.sensors,
+                       "fhem_latency": args.fhem_latency, "period": args.period},
+        "endpoints": endpoints,
+        "total_throughput_per_s": sum(len(entry["latencies"]) for entry in samples.values()) / (load_end - load_start),
+        "regulation": {
+            "idle": recorder.summary(idle_start, load_start, args.period),
+            "load": recorder.summary(load_start, load_end, args.period),
+        },
+    }
+
+
+def print_report(report: dict):
+    print(f"{'endpoint':<22} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for name, endpoint in report["endpoints"].items():
+        latency = endpoint["latency"]
+        print(f"{name:<22} {endpoint['requests']:>9} {endpoint['errors']:>7} {endpoint['throughput_per_s']:>8.1f} "
+              f"{latency['p50'] * 1000:>9.2f} {latency['p95'] * 1000:>9.2f} {latency['p99'] * 1000:>9.2f} {latency['max'] * 1000:>9.2f}")
+    print(f"Total throughput: {report['total_throughput_per_s']:.1f} req/s")
+    for phase, ticks in report["regulation"].items():
+        delay, duration = ticks["start_delay"], ticks["duration"]
+        line = f"Regulation ({phase}): {ticks['ticks']} ticks"
+        if delay:
+            line += f", start delay p95 {delay['p95'] * 1000:.2f} ms max {delay['max'] * 1000:.2f} ms"
+        if duration:
+            line += f", duration p95 {duration['p95'] * 1000:.2f} ms max {duration['max'] * 1000:.2f} ms"
+        print(line)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent client threads")
+    parser.add_argument("--threads", type=int, default=8, help="Worker threads of the server")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of load")
+    parser.add_argument("--idle", type=float, default=5.0, help="Seconds without load measured first, as the regulation reference")
+    parser.add_argument("--period", type=float, default=0.5, help="Regulation period in seconds")
+    parser.add_argument("--sensors", type=int, default=8, help="Simulated sensors")
+    parser.add_argument("--fhem-latency", type=float, default=0.005, help="FHEM answer latency in seconds")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the traffic mix")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    report = run(args)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=4)
+
+
+if __name__ == "__main__":
+    main_cli()
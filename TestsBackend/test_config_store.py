@@ -0,0 +1,96 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from Backend.config_store import ConfigStore
+from Backend.scheduler import Scheduler
+
+
+class ConfigStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "config.json")
+        with open(self.path, "w") as f:
+            json.dump({"set_temperature": {"off_peak_cost": 20.0, "full_cost": 18.0}}, f)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_burst_coalesced_into_one_write(self):
+        store = ConfigStore(self.path, flush_interval=0.05)
+        scheduler = Scheduler()
+        store.attach(scheduler)
+        scheduler.start()
+        self.addCleanup(scheduler.stop)
+        config = store.load()
+        for value in (19.0, 19.5, 20.0):
+            config["set_temperature"]["full_cost"] = value
+            store.save(config)
+        self.assertTrue(store.get_stats()["pending"])
+        self.assertEqual(store.load()["set_temperature"]["full_cost"], 18.0)
+
+        time.sleep(0.2)
+        stats = store.get_stats()
+        self.assertEqual((stats["saves"], stats["writes"], stats["pending"]), (3, 1, False))
+        self.assertGreaterEqual(stats["last_flush_latency"], 0.05)
+        self.assertEqual(store.load()["set_temperature"]["full_cost"], 20.0)
+        self.assertEqual(os.listdir(self.directory.name), ["config.json"])
+        self.assertEqual(scheduler.get_stats()["config_flush"]["runs"], 1)
+
+    def test_overdue_write_without_scheduler(self):
+        store = ConfigStore(self.path, flush_interval=0.05)
+        config = store.load()
+        config["set_temperature"]["full_cost"] = 19.0
+        store.save(config)
+        time.sleep(0.1)
+        self.assertEqual(store.load()["set_temperature"]["full_cost"], 18.0)
+        config["set_temperature"]["full_cost"] = 19.5
+        store.save(config)
+        self.assertEqual(store.load()["set_temperature"]["full_cost"], 19.5)
+        self.assertEqual(store.get_stats()["writes"], 1)
+
+    def test_close_flushes_pending_changes(self):
+        store = ConfigStore(self.path, flush_interval=60)
+        config = store.load()
+        config["set_temperature"]["off_peak_cost"] = 21.0
+        store.save(config)
+        store.close()
+        self.assertEqual(store.load()["set_temperature"]["off_peak_cost"], 21.0)
+
+    def test_failed_write_keeps_previous_file(self):
+        store = ConfigStore(self.path, flush_interval=0)
+        config = store.load()
+        config["set_temperature"]["off_peak_cost"] = 21.0
+        with patch("Backend.config_store.os.replace", side_effect=OSError("disk full")):
+            store.save(config)
+        stats = store.get_stats()
+        self.assertEqual((stats["errors"], stats["pending"]), (1, True))
+        self.assertEqual(store.load()["set_temperature"]["off_peak_cost"], 20.0)
+
+        store.flush()
+        self.assertEqual(store.load()["set_temperature"]["off_peak_cost"], 21.0)
+
+    def test_own_write_recognised(self):
+        store = ConfigStore(self.path, flush_interval=60)
+        config = store.load()
+        config["set_temperature"]["off_peak_cost"] = 21.0
+        store.save(config)
+        self.assertTrue(store.is_pending())
+        store.flush()
+        self.assertFalse(store.is_pending())
+        stat = os.stat(self.path)
+        self.assertTrue(store.is_own_write((stat.st_mtime_ns, stat.st_size, stat.st_ino)))
+
+        # Edited by someone else
+        with open(self.path + ".new", "w") as f:
+            json.dump({"set_temperature": {"off_peak_cost": 19.0, "full_cost": 18.0}}, f)
+        os.replace(self.path + ".new", self.path)
+        stat = os.stat(self.path)
+        self.assertFalse(store.is_own_write((stat.st_mtime_ns, stat.st_size, stat.st_ino)))
+
+
+if __name__ == '__main__':
+    unittest.main()
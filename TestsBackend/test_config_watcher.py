@@ -0,0 +1,77 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+from Backend.config_watcher import ConfigWatcher
+
+
+class ConfigWatcherTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "config.json")
+        self.write({"app": {"pooling_frequency": 60}})
+        self.changes = []
+        self.changed = threading.Event()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, content):
+        # Like an editor: write a new file then rename it over the config
+        with open(self.path + ".new", "w") as f:
+            f.write(content if isinstance(content, str) else json.dumps(content))
+        os.replace(self.path + ".new", self.path)
+
+    def on_change(self, config):
+        self.changes.append(config)
+        self.changed.set()
+
+    def test_change_detected_with_inotify(self):
+        watcher = ConfigWatcher(self.path, self.on_change, poll_interval=60)
+        watcher.start()
+        try:
+            if not watcher.uses_inotify():
+                self.skipTest("inotify not available")
+            self.write({"app": {"pooling_frequency": 30}})
+            self.assertTrue(self.changed.wait(5))
+        finally:
+            watcher.stop()
+        self.assertEqual(self.changes, [{"app": {"pooling_frequency": 30}}])
+
+    def test_change_detected_by_polling(self):
+        with patch.object(ConfigWatcher, "_open_inotify", return_value=None):
+            watcher = ConfigWatcher(self.path, self.on_change, poll_interval=0.05)
+            watcher.start()
+        try:
+            self.write({"app": {"pooling_frequency": 30}})
+            self.assertTrue(self.changed.wait(5))
+        finally:
+            watcher.stop()
+        self.assertEqual(self.changes, [{"app": {"pooling_frequency": 30}}])
+
+    def test_unreadable_content_ignored_until_complete(self):
+        watcher = ConfigWatcher(self.path, self.on_change)
+        self.write('{"app": {"pooling_fre')
+        watcher.check()
+        self.assertEqual(self.changes, [])
+        self.write({"app": {"pooling_frequency": 30}})
+        watcher.check()
+        watcher.check()
+        self.assertEqual(self.changes, [{"app": {"pooling_frequency": 30}}])
+
+    def test_ignored_change_not_reported(self):
+        ignored = []
+        watcher = ConfigWatcher(self.path, self.on_change, ignore=lambda signature: not ignored.append(signature))
+        self.write({"app": {"pooling_frequency": 30}})
+        watcher.check()
+        watcher.check()
+        self.assertEqual(self.changes, [])
+        stat = os.stat(self.path)
+        self.assertEqual(ignored, [(stat.st_mtime_ns, stat.st_size, stat.st_ino)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+from Backend.control_channel import ControlClient, ControlError, ControlServer
+from Backend.state_snapshot import StatePublisher
+
+
+class ControlChannelTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "control.sock")
+        self.controller_state = StatePublisher()
+        self.controller_state.publish(lambda: {"heater": {"heater_on": False}, "tempo": {"today": "BLUE"}})
+        self.server = ControlServer(self.path, self.controller_state, {"add": lambda a, b: a + b, "fail": lambda: 1 / 0}, heartbeat=0.1)
+        self.server.start()
+        self.api_state = StatePublisher()
+        self.client = ControlClient(self.path, self.api_state, timeout=2, heartbeat=0.1, retry_delay=0.05)
+
+    def tearDown(self):
+        self.client.stop()
+        self.controller_state.close()  # Ends the streams, as at shutdown
+        self.server.stop()
+        self.directory.cleanup()
+
+    def wait_for(self, predicate):
+        deadline = time.monotonic() + 5
+        while not predicate() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(predicate())
+
+    def test_calls(self):
+        self.assertEqual(self.client.call("add", {"a": 1, "b": 2}), 3)
+        with self.assertRaisesRegex(ControlError, "fail failed"):
+            self.client.call("fail")
+        with self.assertRaisesRegex(ControlError, "Unknown operation"):
+            self.client.call("missing")
+
+    def test_controller_unreachable(self):
+        self.server.stop()
+        self.assertFalse(os.path.exists(self.path))
+        with self.assertRaisesRegex(ControlError, "unreachable"):
+            self.client.call("add", {"a": 1, "b": 2})
+
+    def test_invalid_replies(self):
+        self.server.stop()
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self.path)
+        listener.listen(2)
+        self.addCleanup(listener.close)
+
+        def reply(*lines):
+            for line in lines:
+                connection, _ = listener.accept()
+                with connection:
+                    connection.makefile("rb").readline()
+                    connection.sendall(line)
+
+        thread = threading.Thread(target=reply, args=(b'{"resu\n', b'{"answer": 3}\n'), daemon=True)
+        thread.start()
+        for _ in range(2):
+            with self.assertRaisesRegex(ControlError, "Invalid reply"):
+                self.client.call("add", {"a": 1, "b": 2})
+        thread.join(5)
+
+    def test_state_mirrored(self):
+        self.client.start()
+        self.assertTrue(self.client.wait_synced(5))
+        self.assertTrue(self.client.connected)
+        self.assertEqual(self.api_state.current.sections["tempo"].body, self.controller_state.current.sections["tempo"].body)
+
+        # Only the changed sections are sent
+        version = self.api_state.current.version
+        self.controller_state.publish(lambda: {"heater": {"heater_on": True}})
+        self.wait_for(lambda: self.api_state.current.version != version)
+        self.assertEqual(self.api_state.current.sections["heater"].data, {"heater_on": True})
+        self.assertEqual(self.api_state.current.sections["tempo"].data, {"today": "BLUE"})
+
+    def test_subscription_resumes_after_controller_restart(self):
+        self.client.start()
+        self.assertTrue(self.client.wait_synced(5))
+        self.server.stop()
+        self.wait_for(lambda: not self.client.connected)
+
+        self.controller_state = StatePublisher()
+        self.controller_state.publish(lambda: {"heater": {"heater_on": True}, "tempo": {"today": "RED"}})
+        self.server = ControlServer(self.path, self.controller_state, {}, heartbeat=0.1)
+        self.server.start()
+        self.wait_for(lambda: self.api_state.current.sections["tempo"].data == {"today": "RED"})
+        self.assertTrue(self.client.connected)
+
+
+if __name__ == '__main__':
+    unittest.main()
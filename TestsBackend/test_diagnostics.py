@@ -0,0 +1,84 @@
+import threading
+import time
+import unittest
+
+from Backend import diagnostics
+from Backend.diagnostics import MemoryTracker, TickTimings, collapse, sample_stacks, top_functions
+
+
+def busy_loop(stop: threading.Event):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+class DiagnosticsTestCase(unittest.TestCase):
+    def tearDown(self):
+        diagnostics.configure({})
+
+    def test_tick_stages_exclusive(self):
+        timings = TickTimings(size=2)
+        for _ in range(3):
+            with timings.tick('poll'):
+                with timings.stage('regulate'):
+                    time.sleep(0.02)
+                    with timings.stage('actuate'):
+                        time.sleep(0.03)
+                with timings.tick('evaluate'):  # Nested tick, part of the outer one
+                    with timings.stage('log'):
+                        pass
+
+        ticks = timings.get_ticks()
+        self.assertEqual(len(ticks), 2)
+        self.assertEqual(ticks[-1]['kind'], 'poll')
+        stages = ticks[-1]['stages']
+        self.assertEqual(set(stages), {'regulate', 'actuate', 'log'})
+        self.assertAlmostEqual(stages['regulate'], 0.02, delta=0.015)
+        self.assertAlmostEqual(stages['actuate'], 0.03, delta=0.015)
+        self.assertLessEqual(sum(stages.values()), ticks[-1]['total'])
+
+    def test_disabled_by_default(self):
+        diagnostics.configure({})
+        self.assertFalse(diagnostics.is_enabled())
+        self.assertIs(diagnostics.tick('poll'), diagnostics.NULL_CONTEXT)
+        with diagnostics.tick('poll'), diagnostics.stage('collect'):
+            pass
+        self.assertEqual(diagnostics.get_ticks(), [])
+
+        diagnostics.configure({"enabled": True, "tick_history": 5})
+        with diagnostics.tick('poll'), diagnostics.stage('collect'):
+            pass
+        self.assertEqual(list(diagnostics.get_ticks()[0]['stages']), ['collect'])
+
+    def test_sampling_profiler(self):
+        stop = threading.Event()
+        thread = threading.Thread(target=busy_loop, args=(stop,), name="busy")
+        thread.start()
+        try:
+            stacks = sample_stacks(duration=0.1, interval=0.002)
+        finally:
+            stop.set()
+            thread.join()
+
+        busy = [stack for stack in stacks if stack.startswith("busy;")]
+        self.assertTrue(busy)
+        self.assertIn(";busy_loop (test_diagnostics.py:", busy[0])
+        self.assertRegex(collapse(stacks), r"(?m)^busy;.* \d+$")
+        functions = {entry['function'].split(' ')[0]: entry for entry in top_functions(stacks)}
+        self.assertEqual(functions['busy_loop']['cumulative'], sum(stacks[stack] for stack in busy))
+
+    def test_memory_snapshot_diff(self):
+        memory = MemoryTracker()
+        memory.start(frames=1)
+        try:
+            first = memory.snapshot()
+            self.assertIsNone(first['diff'])
+            retained = [bytearray(1024) for _ in range(100)]  # noqa: F841
+            second = memory.snapshot()
+        finally:
+            memory.stop()
+        self.assertGreater(second['traced_bytes'], 0)
+        self.assertTrue(any('test_diagnostics.py' in entry['location'] and entry['size_diff'] >= 100 * 1024 for entry in second['diff']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import unittest
+import threading
+import time
+import datetime
+
+from Backend.fhem_events import FhemEventListener
+from Backend.temperature import Measure
+from Benchmarks.fake_fhem import FakeFhem
+
+
+class FhemEventListenerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.fhem = FakeFhem().start()
+        self.sensors = [
+            {'name': 'Room Alice', 'device': 'EnO_12345678'},
+            {'name': 'Room Bob', 'device': 'EnO_854321'}
+        ]
+        self.changes = []
+        self.changed = threading.Event()
+        self.listener = FhemEventListener(url=self.fhem.url, sensors=self.sensors, on_change=self._on_change, reconnect_delay=0.05)
+
+    def tearDown(self):
+        self.listener.stop()
+        self.fhem.stop()
+
+    def _on_change(self, measures):
+        self.changes.append(measures)
+        self.changed.set()
+
+    def _wait_change(self):
+        self.assertTrue(self.changed.wait(timeout=5))
+        self.changed.clear()
+
+    def test_reading_event_updates_measures(self):
+        self.listener.start()
+        self.fhem.push_reading('EnO_854321', '18.5', '2024-12-10 23:53:39')
+        self._wait_change()
+
+        measures = self.listener.get_measures()
+        self.assertEqual(len(measures), 1)
+        self.assertEqual(measures[0].name, 'Room Bob')
+        self.assertEqual(measures[0].temp, 18.5)
+        self.assertEqual(measures[0].timestamp, datetime.datetime(2024, 12, 10, 23, 53, 39))
+
+        self.fhem.push_reading('EnO_12345678', '20.0', '2024-12-10 23:54:00')
+        self._wait_change()
+        self.assertEqual([m.name for m in self.changes[-1]], ['Room Alice', 'Room Bob'])
+
+    def test_unrelated_and_unchanged_events_ignored(self):
+        self.listener.start()
+        self.fhem.push_reading('EnO_OTHER', '25.0', '2024-12-10 23:50:00')
+        self.fhem.push_raw('not json')
+        self.fhem.push_reading('EnO_854321', '18.5', '2024-12-10 23:53:39')
+        self._wait_change()
+        self.fhem.push_reading('EnO_854321', '18.5', '2024-12-10 23:58:39')
+        self.fhem.push_reading('EnO_854321', '18.7', '2024-12-10 23:59:39')
+        self._wait_change()
+
+        self.assertEqual(len(self.changes), 2)
+        self.assertEqual(self.changes[-1][0].temp, 18.7)
+
+    def test_reconnect_after_stream_closed(self):
+        self.listener.start()
+        self.fhem.push_reading('EnO_854321', '18.5', '2024-12-10 23:53:39')
+        self._wait_change()
+
+        self.fhem.close_streams()
+        self.fhem.push_reading('EnO_854321', '19.0', '2024-12-10 23:58:39')
+        self._wait_change()
+        self.assertEqual(self.listener.get_measures()[0].temp, 19.0)
+
+    def test_connection_changes_notified(self):
+        connections = []
+        notified = threading.Event()
+
+        def on_connection_change(connected):
+            connections.append((connected, time.monotonic()))
+            notified.set()
+
+        self.listener = FhemEventListener(url=self.fhem.url, sensors=self.sensors, on_change=self._on_change, reconnect_delay=0.5,
+                                          on_connection_change=on_connection_change)
+        self.listener.start()
+        self.assertTrue(notified.wait(5))
+        notified.clear()
+
+        closed_at = time.monotonic()
+        self.fhem.close_streams()
+        self.assertTrue(notified.wait(5))
+        # The loss is reported right away, not after the reconnection delay
+        self.assertEqual(connections[-1][0], False)
+        self.assertLess(connections[-1][1] - closed_at, 0.4)
+        notified.clear()
+        self.assertTrue(notified.wait(5))
+        self.assertEqual([connected for connected, _ in connections], [True, False, True])
+
+    def test_seed_from_polling(self):
+        self.listener.seed([Measure(21.0, 'Room Alice', datetime.datetime(2024, 12, 10, 23, 0, 0)), Measure(5.0, 'Unknown', datetime.datetime(2024, 12, 10, 23, 0, 0))])
+        measures = self.listener.get_measures()
+        self.assertEqual(len(measures), 1)
+        self.assertEqual(measures[0].temp, 21.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,18 +1,28 @@
 import unittest
 import datetime
+import time
+import requests
 from unittest.mock import patch, MagicMock
-from Backend.temperature import collect_temperatures
+from Backend.temperature import FHEM_REQUEST_ERRORS, FHEM_REQUEST_SECONDS, collect_temperatures, reset_cache
+
+
+def rendered_sample(metric, sample: str) -> float:
+    """Value of a sample in the exposition of a metric, 0 when it has none yet."""
+    for line in metric.render(openmetrics=False).splitlines():
+        if line.startswith(f"{sample} "):
+            return float(line.split(" ")[-1])
+    return 0
 
 
 class SendCmd_Sensors(unittest.TestCase):
 
     def setUp(self):
-        pass
+        reset_cache()
 
     def tearDown(self):
         pass
 
-    @patch('requests.post')
+    @patch('Backend.temperature.http_client.post')
     def test_gettemp_server_emptyanswer(self, mock_post):
         config = {
             'sensors': [
@@ -35,7 +45,7 @@ class SendCmd_Sensors(unittest.TestCase):
         measures = collect_temperatures(config=config)
         self.assertEqual(len(measures), 0)
 
-    @patch('requests.post')
+    @patch('Backend.temperature.http_client.post')
     def test_gettemp_server_400answer(self, mock_post):
         config = {
             'sensors': [
@@ -58,7 +68,28 @@ class SendCmd_Sensors(unittest.TestCase):
         measures = collect_temperatures(config=config)
         self.assertEqual(len(measures), 0)
 
-    @patch('requests.post')
+    @patch('Backend.temperature.http_client.post')
+    def test_gettemp_failures_in_metrics(self, mock_post):
+        config = {
+            'sensors': [
+                {'name': 'Room Alice', 'device': 'EnO_12345678'},
+                {'name': 'Room Bob', 'device': 'EnO_854321'}
+            ],
+            'fhem': {'url': 'http://example.com'}
+        }
+        mock_post.return_value = MagicMock(status_code=400)
+        devices = ('EnO_12345678', 'EnO_854321')
+        errors = {device: rendered_sample(FHEM_REQUEST_ERRORS, f'regpac_fhem_request_errors_total{{device="{device}"}}') for device in devices}
+        timed = {device: rendered_sample(FHEM_REQUEST_SECONDS, f'regpac_fhem_request_seconds_count{{device="{device}"}}') for device in devices}
+
+        collect_temperatures(config=config)
+
+        # Every failed request is counted and timed per device
+        for device in devices:
+            self.assertEqual(rendered_sample(FHEM_REQUEST_ERRORS, f'regpac_fhem_request_errors_total{{device="{device}"}}'), errors[device] + 1)
+            self.assertEqual(rendered_sample(FHEM_REQUEST_SECONDS, f'regpac_fhem_request_seconds_count{{device="{device}"}}'), timed[device] + 1)
+
+    @patch('Backend.temperature.http_client.post')
     def test_gettemp_server_ok_1fullres(self, mock_post):
         config = {
             'sensors': [
@@ -128,7 +159,7 @@ class SendCmd_Sensors(unittest.TestCase):
         self.assertEqual(measures[0].name, "Room Alice")
         self.assertEqual(measures[0].timestamp, datetime.datetime(year=2024, month=1, day=30, hour=11, minute=45, second=20))
 
-    @patch('requests.post')
+    @patch('Backend.temperature.http_client.post')
     def test_gettemp_server_ok_1device2responses(self, mock_post):
         config = {
             'sensors': [
@@ -164,3 +195,176 @@ class SendCmd_Sensors(unittest.TestCase):
         self.assertEqual(measures[0].temp, float(19.5))
         self.assertEqual(measures[0].name, "Room Alice")
         self.assertEqual(measures[0].timestamp, datetime.datetime(year=2024, month=12, day=10, hour=23, minute=53, second=39))
+
+    @patch('Backend.temperature.http_client.post')
+    def test_gettemp_batch_one_request(self, mock_post):
+        config = {
+            'sensors': [
+                {
+                    'name': 'Room Alice',
+                    'device': 'EnO_12345678'
+                },
+                {
+                    'name': 'Room Bob',
+                    'device': 'EnO_854321'
+                },
+                {
+                    'name': 'Room Charlie',
+                    'device': 'EnO_ABCDEF'
+                }
+            ],
+            'fhem': {'url': 'http://example.com', 'collect_mode': 'batch'}
+        }
+
+        response = {
+            'Arg': 'EnO_12345678,EnO_854321,EnO_ABCDEF temperature',
+            'Results': [{
+                'Name': 'EnO_854321',
+                'Readings': {
+                    'temperature': {'Value': '21.3', 'Time': '2024-12-10 20:00:30'}
+                },
+            }, {
+                'Name': 'EnO_12345678',
+                'Readings': {
+                    'temperature': {'Value': '19.5', 'Time': '2024-12-10 23:53:39'}
+                },
+            }, {
+                'Name': 'EnO_ABCDEF',
+                'Readings': {},
+            }],
+            'totalResultsReturned': 3
+        }
+
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = response
+        mock_post.return_value = mock_response
+
+        measures = collect_temperatures(config=config)
+        mock_post.assert_called_once_with(
+            'http://example.com',
+            params={"cmd": "jsonlist2 EnO_12345678,EnO_854321,EnO_ABCDEF temperature", "XHR": "1"},
+            timeout=None
+        )
+        self.assertEqual(len(measures), 2)
+        self.assertEqual(measures[0].name, "Room Alice")
+        self.assertEqual(measures[0].temp, float(19.5))
+        self.assertEqual(measures[0].timestamp, datetime.datetime(year=2024, month=12, day=10, hour=23, minute=53, second=39))
+        self.assertEqual(measures[1].name, "Room Bob")
+        self.assertEqual(measures[1].temp, float(21.3))
+
+    @patch('Backend.temperature.http_client.post')
+    def test_gettemp_batch_server_400answer(self, mock_post):
+        config = {
+            'sensors': [
+                {
+                    'name': 'Room Alice',
+                    'device': 'EnO_12345678'
+                }
+            ],
+            'fhem': {'url': 'http://example.com', 'collect_mode': 'batch'}
+        }
+
+        mock_response = MagicMock()
+        mock_response.status_code = 400
+        mock_post.return_value = mock_response
+
+        measures = collect_temperatures(config=config)
+        self.assertEqual(mock_post.call_count, 1)
+        self.assertEqual(len(measures), 0)
+
+    @patch('Backend.temperature.http_client.post')
+    def test_gettemp_request_error_skips_sensor(self, mock_post):
+        config = {
+            'sensors': [
+                {'name': 'Room Alice', 'device': 'EnO_12345678'},
+                {'name': 'Room Bob', 'device': 'EnO_854321'}
+            ],
+            'fhem': {'url': 'http://example.com'}
+        }
+        mock_response = MagicMock(status_code=200)
+        mock_response.json.return_value = {"Results": [{"Readings": {"temperature": {"Value": "21.3", "Time": "2024-12-10 23:53:39"}}}]}
+        mock_post.side_effect = [requests.Timeout("read timed out"), mock_response]
+
+        measures = collect_temperatures(config=config)
+        self.assertEqual([(m.name, m.temp) for m in measures], [("Room Bob", 21.3)])
+
+        # Same in batch mode, the tick goes on without readings
+        config['fhem']['collect_mode'] = 'batch'
+        mock_post.side_effect = requests.ConnectionError("refused")
+        self.assertEqual(collect_temperatures(config=config), [])
+
+    @patch('Backend.temperature.http_client.post')
+    def test_gettemp_concurrent_late_sensor(self, mock_post):
+        config = {
+            'sensors': [
+                {
+                    'name': 'Room Fast',
+                    'device': 'EnO_FAST'
+                },
+                {
+                    'name': 'Room Slow',
+                    'device': 'EnO_SLOW'
+                }
+            ],
+            'fhem': {'url': 'http://example.com', 'collect_mode': 'concurrent', 'sensor_timeout': 1.0, 'tick_timeout': 0.2}
+        }
+        slow_device = {'delay': 0.0}
+
+        def answer(url, params, timeout):
+            device = params['cmd'].split(' ')[1]
+            if device == 'EnO_SLOW':
+                time.sleep(slow_device['delay'])
+            mock_response = MagicMock()
+            mock_response.status_code = 200
+            mock_response.json.return_value = {
+                'Results': [{
+                    'Readings': {
+                        'temperature': {'Value': '19.5' if device == 'EnO_FAST' else '18.0', 'Time': '2024-12-10 23:53:39'}
+                    }
+                }]
+            }
+            return mock_response
+
+        mock_post.side_effect = answer
+
+        measures = collect_temperatures(config=config)
+        self.assertEqual([(m.name, m.temp, m.late) for m in measures], [("Room Fast", 19.5, False), ("Room Slow", 18.0, False)])
+
+        slow_device['delay'] = 0.5
+        start = time.monotonic()
+        measures = collect_temperatures(config=config)
+        self.assertLess(time.monotonic() - start, 0.45)
+        self.assertEqual([(m.name, m.temp, m.late) for m in measures], [("Room Fast", 19.5, False), ("Room Slow", 18.0, True)])
+
+    @patch('Backend.temperature.datetime')
+    @patch('Backend.temperature.http_client.post')
+    def test_gettemp_unchanged_reading_reused(self, mock_post, mock_datetime):
+        config = {
+            'sensors': [
+                {
+                    'name': 'Room Alice',
+                    'device': 'EnO_12345678'
+                }
+            ],
+            'fhem': {'url': 'http://example.com'}
+        }
+        reading = {'Value': '19.5', 'Time': '2024-12-10 23:53:39'}
+
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.side_effect = lambda: {'Results': [{'Readings': {'temperature': dict(reading)}}]}
+        mock_post.return_value = mock_response
+        mock_datetime.strptime.side_effect = datetime.datetime.strptime
+
+        first = collect_temperatures(config=config)
+        second = collect_temperatures(config=config)
+        self.assertIs(first[0], second[0])
+        self.assertEqual(mock_datetime.strptime.call_count, 1)
+
+        reading['Value'] = '19.7'
+        reading['Time'] = '2024-12-10 23:58:39'
+        third = collect_temperatures(config=config)
+        self.assertIsNot(first[0], third[0])
+        self.assertEqual(third[0].temp, 19.7)
+        self.assertEqual(mock_datetime.strptime.call_count, 2)
@@ -1,4 +1,7 @@
 from datetime import datetime
+import tempfile
+import threading
+import time
 import unittest
 import json
 import sys
@@ -8,25 +11,39 @@ current_directory = os.path.dirname(os.path.abspath(__file__))
 backend_path = os.path.join(current_directory, "../Backend")
 sys.path.insert(0, backend_path)
 
-from unittest.mock import patch, mock_open, MagicMock
-from Backend.main import app, init_app
+from unittest.mock import patch, MagicMock
+import Backend.main as main
+from Backend.main import app, init_app, periodic_tasks, reevaluation_job, reload_config
+from Backend.localsql import SqliteStore
 from Backend.temperature import Measure
 from Backend.tempo_provider import DayPrice
+import heat as heat_module  # The flat module used by main
+
+
+def make_config(**sections) -> dict:
+    """A fresh minimal config, with the given sections added or replaced."""
+    config = {"set_temperature": {"off_peak_cost": 22.0, "full_cost": 18.0}, "off_peak": [{"start": "00:30", "end": "07:30"}],
+              "tempo": {"temperature_reduction_high_cost": -2.0, "temperature_increase_prior_to_high_cost": 2.0},
+              "app": {"pooling_frequency": 60, "pooling_provider_frequency": 10800}}
+    config.update(json.loads(json.dumps(sections)))
+    return config
+
+
+MEASURES = [Measure(20.0, "1", datetime(2024, 12, 10, 23, 53, 39)), Measure(18.2, "2", datetime(2024, 12, 10, 23, 50, 0))]
 
 
 class HeatingControllerTestCase(unittest.TestCase):
     def setUp(self):
         self.app = app.test_client()
 
-    @patch('Backend.main.open', new_callable=mock_open)
+    @patch('Backend.main.config_store')
     @patch('Backend.main.collect_temperatures', return_value=[Measure(20.0, "1", datetime.now()), Measure(18.2, "2", datetime.now()), Measure(20.7, "3", datetime.now()), Measure(21.1, "4", datetime.now())])  # Avg = 20°
     @patch('Backend.main.load_config', return_value={"set_temperature": {"off_peak_cost": 22.0, "full_cost": 18.0}, "off_peak": [{"start": "00:30", "end": "07:30"}, {"start": "12:30", "end": "14:00"}, {"start": "23:00", "end": "00:10"}], "tempo": {"temperature_reduction_high_cost": -2.0, "temperature_increase_prior_to_high_cost": 2.0}, "app": {"pooling_frequency": 60, "pooling_provider_frequency": 10800}})
-    @patch('Backend.main.json.dump')
     @patch('Backend.main.heat')
     @patch('Backend.main.log_setpoint')
     @patch('Backend.main.log_dbg_setpoint')
     @patch('Backend.tempo_provider.TempoProvider')
-    def run_generic_test_set_temperature(self, mock_tempo_class, mock_dbg, mock_set, mock_heat, mock_json_dump, mock_config_load, mock_collect_temperatures, mock_open, temp_full_cost: float, temp_off_peak: float, expected_heating_result: bool, today_price=DayPrice.NORMAL, tomorrow_price=DayPrice.NORMAL):
+    def run_generic_test_set_temperature(self, mock_tempo_class, mock_dbg, mock_set, mock_heat, mock_config_load, mock_collect_temperatures, mock_config_store, temp_full_cost: float, temp_off_peak: float, expected_heating_result: bool, today_price=DayPrice.NORMAL, tomorrow_price=DayPrice.NORMAL):
         mock_tempo_instance = MagicMock()
         mock_tempo_instance.get_today_price.return_value = today_price
         mock_tempo_instance.get_tomorrow_price.return_value = tomorrow_price
@@ -35,6 +52,7 @@ class HeatingControllerTestCase(unittest.TestCase):
         response = self.app.post('/setpoint', data=json.dumps({'off_peak_cost': temp_off_peak, 'full_cost': temp_full_cost}), content_type='application/json')
         self.assertEqual(response.status_code, 200)
         mock_heat.assert_called_once_with(expected_heating_result)
+        mock_config_store.save.assert_called_once()
 
     @patch('Backend.main.get_current_hour_min', return_value="13:30")
     def test_settemp_comfort_heat_on(self, mock_get_current_hour_min):
@@ -56,16 +74,15 @@ class HeatingControllerTestCase(unittest.TestCase):
     def test_settemp_offpeak_overlap_midnight(self, mock_get_current_hour_min):
         self.run_generic_test_set_temperature(temp_full_cost=18.0, temp_off_peak=22.0, expected_heating_result=True)
 
-    @patch('Backend.main.open', new_callable=mock_open)
+    @patch('Backend.main.config_store')
     @patch('Backend.main.collect_temperatures', return_value=[Measure(50.0, "1", datetime.now()), Measure(18.4, "2", datetime.now()), Measure(60.7, "3", datetime.now()), Measure(87.1, "4", datetime.now())])  # Avg = 54.05°
     @patch('Backend.main.load_config', return_value={"set_temperature": {"off_peak_cost": 22.0, "full_cost": 18.0}, "off_peak": [{"start": "00:30", "end": "07:30"}, {"start": "12:30", "end": "14:00"}, {"start": "23:00", "end": "00:10"}], "tempo": {"temperature_reduction_high_cost": -2.0, "temperature_increase_prior_to_high_cost": 2.0}, "app": {"pooling_frequency": 60, "pooling_provider_frequency": 10800}})
-    @patch('Backend.main.json.dump')
     @patch('Backend.main.heat')
     @patch('Backend.main.get_current_hour_min', return_value="13:30")
     @patch('Backend.main.log_setpoint')
     @patch('Backend.main.log_dbg_setpoint')
     @patch('Backend.tempo_provider.TempoProvider')
-    def test_heat_on_if_one_room_below(self, mock_tempo_class, mock_dbg, mock_set, mock_get_current_hour_min, mock_heat, mock_json_dump, mock_config_load, mock_collect_temperatures, mock_open):
+    def test_heat_on_if_one_room_below(self, mock_tempo_class, mock_dbg, mock_set, mock_get_current_hour_min, mock_heat, mock_config_load, mock_collect_temperatures, mock_config_store):
         mock_tempo_instance = MagicMock()
         mock_tempo_instance.get_today_price.return_value = DayPrice.NORMAL
         mock_tempo_instance.get_tomorrow_price.return_value = DayPrice.NORMAL
@@ -77,6 +94,534 @@ class HeatingControllerTestCase(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         mock_heat.assert_called_once_with(True)
 
+    @patch('Backend.main.collect_temperatures', return_value=MEASURES)
+    @patch('Backend.main.load_config', return_value=make_config())
+    @patch('Backend.main.get_current_hour_min', return_value="13:30")
+    @patch('Backend.main.is_refresh_due', return_value=False)
+    @patch('Backend.main.get_heat_status', return_value=False)
+    @patch('Backend.main.heat')
+    @patch('Backend.main.log_setpoint')
+    @patch('Backend.main.log_dbg_setpoint')
+    def test_skip_regulation_when_inputs_unchanged(self, mock_dbg, mock_set, mock_heat, mock_status, mock_refresh, mock_get_current_hour_min,
+                                                   mock_config_load, mock_collect_temperatures):
+        init_app()
+        periodic_tasks()
+        periodic_tasks()
+        mock_heat.assert_called_once_with(False)
+
+        # A new reading triggers a new regulation
+        mock_collect_temperatures.return_value = [MEASURES[0], Measure(18.4, "2", datetime(2024, 12, 10, 23, 55, 0))]
+        periodic_tasks()
+        self.assertEqual(mock_heat.call_count, 2)
+
+        # The forced refresh is honoured even without changes
+        mock_refresh.return_value = True
+        periodic_tasks()
+        self.assertEqual(mock_heat.call_count, 3)
+
+    @patch('Backend.main.config_store')
+    @patch('Backend.main.collect_temperatures', return_value=[Measure(20.0, "1", datetime.now()), Measure(18.2, "2", datetime.now())])  # Avg = 19.1°
+    @patch('Backend.main.load_config', return_value=make_config())
+    @patch('Backend.main.get_current_hour_min', return_value="13:30")
+    @patch('Backend.main.heat')
+    @patch('Backend.main.log_setpoint')
+    @patch('Backend.main.log_dbg_setpoint')
+    def test_setpoint_changes_coalesced_on_control_loop(self, mock_dbg, mock_set, mock_heat, mock_get_current_hour_min, mock_config_load,
+                                                        mock_collect_temperatures, mock_config_store):
+        init_app()
+        periodic_tasks()
+        mock_heat.reset_mock()
+        mock_set.reset_mock()
+        mock_collect_temperatures.reset_mock()
+
+        # Keep the control loop busy while the user moves the slider
+        busy, release = threading.Event(), threading.Event()
+        scheduler = main.Scheduler()
+        scheduler.add_job('busy', lambda: (busy.set(), release.wait(5)))
+        scheduler.add_job('reevaluation', reevaluation_job)
+        patcher = patch('Backend.main.scheduler', scheduler)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        scheduler.start()
+        try:
+            scheduler.trigger('busy')
+            self.assertTrue(busy.wait(5))
+            revisions = []
+            for full_cost in (19.0, 19.5, 20.0):
+                response = self.app.post('/setpoint', json={'off_peak_cost': 22.0, 'full_cost': full_cost})
+                self.assertEqual(response.status_code, 200)
+                revisions.append(json.loads(response.data)['revision'])
+            self.assertEqual(revisions, [revisions[0], revisions[0] + 1, revisions[0] + 2])
+            mock_heat.assert_not_called()
+            mock_set.assert_not_called()  # No disk I/O in the request threads
+
+            response = self.app.get(f'/setpoint/decision?revision={revisions[-1]}')
+            self.assertEqual(response.status_code, 202)
+
+            release.set()
+            response = self.app.get(f'/setpoint/decision?revision={revisions[-1]}&timeout=5')
+            self.assertEqual(response.status_code, 200)
+            decision = json.loads(response.data)
+            self.assertEqual((decision['revision'], decision['setpoint'], decision['heater_on']),
+                             (revisions[-1], 20.0, True))
+        finally:
+            release.set()
+            scheduler.stop()
+
+        # A single evaluation and log entry for the three changes, on the last measures
+        mock_heat.assert_called_once_with(True)
+        mock_set.assert_called_once_with(comfort_temp=22.0, eco_temp=20.0)
+        mock_collect_temperatures.assert_not_called()
+
+    @patch('Backend.main.collect_temperatures', return_value=[Measure(20.0, "1", datetime.now()), Measure(18.2, "2", datetime.now())])  # Avg = 19.1°
+    @patch('Backend.main.load_config', return_value=make_config(fhem={"url": "http://fhem"}, actuator={"device": "EnO_A"},
+                                                                sensors=[{"name": "1", "device": "EnO_1"}, {"name": "2", "device": "EnO_2"}]))
+    @patch('Backend.main.get_current_hour_min', return_value="13:30")
+    @patch('Backend.main.config_store')
+    @patch('Backend.main.http_client.configure')
+    @patch('Backend.main.heat')
+    @patch('Backend.main.log_setpoint')
+    @patch('Backend.main.log_dbg_setpoint')
+    def test_reload_config_rebuilds_changed_state(self, mock_dbg, mock_set, mock_heat, mock_http_configure, mock_config_store,
+                                                  mock_get_current_hour_min, mock_config_load, mock_collect_temperatures):
+        mock_config_store.is_pending.return_value = False
+        init_app()
+        mock_http_configure.reset_mock()
+        schedule = main.off_peak_schedule
+        new_config = json.loads(json.dumps(main.config))
+        new_config['off_peak'] = [{"start": "12:00", "end": "14:00"}]
+        new_config['set_temperature']['off_peak_cost'] = 21.0
+        reload_config(new_config)
+
+        self.assertIsNot(main.off_peak_schedule, schedule)
+        self.assertTrue(main.is_in_off_peak("13:30"))
+        self.assertEqual(main.set_off_peak_temp, 21.0)
+        mock_set.assert_called_with(comfort_temp=21.0, eco_temp=18.0)
+        mock_heat.assert_called_once_with(True)
+        mock_http_configure.assert_not_called()
+
+        # Invalid or unchanged configs are not applied
+        schedule = main.off_peak_schedule
+        invalid_config = json.loads(json.dumps(new_config))
+        invalid_config['off_peak'] = [{"start": "25:00", "end": "14:00"}]
+        reload_config(invalid_config)
+        invalid_config = json.loads(json.dumps(new_config))
+        invalid_config['actuator']['device'] = ""
+        reload_config(invalid_config)
+        reload_config(json.loads(json.dumps(new_config)))
+        self.assertIs(main.off_peak_schedule, schedule)
+        self.assertEqual(main.config, new_config)
+        mock_heat.assert_called_once()
+
+        # A setpoint set while the file was being edited is still to be saved: it wins over the stale file
+        main.apply_setpoint(off_peak_cost=23.0, full_cost=18.5)
+        mock_config_store.is_pending.return_value = True
+        reload_config(json.loads(json.dumps(new_config)) | {"http": {"timeout": 3}})
+        self.assertEqual((main.set_off_peak_temp, main.set_full_cost_temp), (23.0, 18.5))
+        self.assertEqual(main.config['set_temperature'], {"off_peak_cost": 23.0, "full_cost": 18.5})
+        mock_http_configure.assert_not_called()
+
+
+class LogsConfigTestCase(unittest.TestCase):
+    @patch('Backend.main.localsql')
+    @patch('Backend.main.log_setpoint')
+    def test_text_logs_off_with_influx_exporter(self, mock_set, mock_localsql):
+        with patch('Backend.main.load_config', return_value=make_config(influxdb={"url": "http://influx:8086"})):
+            init_app()
+        self.assertIs(mock_localsql.configure.call_args[0][0]['text'], False)
+
+        with patch('Backend.main.load_config', return_value=make_config(logs={"text": True}, influxdb={"url": "http://influx:8086"})):
+            init_app()
+        self.assertIs(mock_localsql.configure.call_args[0][0]['text'], True)
+
+        with patch('Backend.main.load_config', return_value=make_config()):
+            init_app()
+        self.assertIs(mock_localsql.configure.call_args[0][0]['text'], True)
+
+
+class StateApiTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = app.test_client()
+
+    @patch('Backend.main.config_store')
+    @patch('Backend.main.collect_temperatures', return_value=MEASURES)
+    @patch('Backend.main.load_config', return_value=make_config())
+    @patch('Backend.main.get_current_hour_min', return_value="13:30")
+    @patch('Backend.main.heat')
+    @patch('Backend.main.log_setpoint')
+    @patch('Backend.main.log_dbg_setpoint')
+    def test_state_served_from_snapshot(self, mock_dbg, mock_set, mock_heat, mock_get_current_hour_min, mock_config_load,
+                                        mock_collect_temperatures, mock_config_store):
+        init_app()
+        periodic_tasks()
+        response = self.app.get('/temperatures')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data), {"temperatures": [
+            {"name": "1", "temperature": 20.0, "timestamp": "2024-12-10 23:53:39"},
+            {"name": "2", "temperature": 18.2, "timestamp": "2024-12-10 23:50:00"}], "count": 2})
+        etag = response.headers['ETag']
+        self.assertEqual(json.loads(self.app.get('/tempo').data), {"today": "UNKNOWN", "tomorrow": "UNKNOWN"})
+
+        # Nothing changed: same snapshot, same ETag
+        periodic_tasks()
+        self.assertEqual(self.app.get('/temperatures', headers={'If-None-Match': etag}).status_code, 304)
+
+        # A setpoint change is visible right away, the untouched sections keep their ETag
+        version = main.state.current.version
+        self.app.post('/setpoint', json={'off_peak_cost': 21.0, 'full_cost': 19.0})
+        self.assertEqual(json.loads(self.app.get('/setpoint').data), {"off_peak_temp": 21.0, "full_cost_temp": 19.0})
+        self.assertGreater(main.state.current.version, version)
+        self.assertEqual(self.app.get('/temperatures', headers={'If-None-Match': etag}).status_code, 304)
+
+
+class MetricsApiTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = app.test_client()
+
+    def test_metrics_formats(self):
+        response = self.app.get('/metrics')
+        self.assertEqual(response.content_type, 'text/plain; version=0.0.4; charset=utf-8')
+        text = response.data.decode()
+        self.assertIn('# TYPE regpac_periodic_tasks_seconds histogram', text)
+        self.assertIn('# TYPE regpac_fhem_request_errors_total counter', text)
+
+        response = self.app.get('/metrics', headers={'Accept': 'application/openmetrics-text; version=1.0.0'})
+        self.assertTrue(response.content_type.startswith('application/openmetrics-text'))
+        self.assertIn('# TYPE regpac_fhem_request_errors counter', response.data.decode())
+        self.assertTrue(response.data.endswith(b'# EOF\n'))
+
+
+class DiagnosticsApiTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = app.test_client()
+
+    def tearDown(self):
+        main.diagnostics.configure({})
+
+    @patch('Backend.main.collect_temperatures', return_value=[Measure(20.0, "1", datetime(2024, 12, 10, 23, 53, 39))])
+    @patch('Backend.main.load_config', return_value=make_config(diagnostics={'enabled': True}))
+    @patch('Backend.main.get_current_hour_min', return_value="13:30")
+    @patch('Backend.main.heat')
+    @patch('Backend.main.log_setpoint')
+    @patch('Backend.main.log_dbg_setpoint')
+    def test_tick_timings(self, mock_dbg, mock_set, mock_heat, mock_get_current_hour_min, mock_config_load,
+                          mock_collect_temperatures):
+        init_app()
+        periodic_tasks(force=True)
+        ticks = json.loads(self.app.get('/debug/ticks').data)['ticks']
+        self.assertEqual(ticks[-1]['kind'], 'poll')
+        self.assertEqual(set(ticks[-1]['stages']), {'collect', 'log', 'weigh_setpoint', 'regulate', 'publish'})
+        self.assertEqual(self.app.get('/debug/memory').status_code, 409)
+
+    def test_memory_snapshot_limit(self):
+        main.diagnostics.configure({"enabled": True})
+        memory = main.diagnostics.get_memory()
+        memory.start(frames=1)
+        self.addCleanup(memory.stop)
+        self.assertEqual(self.app.get('/debug/memory?limit=abc').status_code, 400)
+        response = self.app.get('/debug/memory?limit=5')
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(json.loads(response.data)['top']), 5)
+
+    def test_disabled(self):
+        main.diagnostics.configure({})
+        for path in ('/debug/ticks', '/debug/profile', '/debug/memory'):
+            self.assertEqual(self.app.get(path).status_code, 404)
+
+
+@patch('Backend.main.config', {"app": {"events_heartbeat": 0.05, "events_max_subscribers": 1}})
+class EventsApiTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = app.test_client()
+        self.heater_on = False
+        main.state.publish(lambda: {"heater": {"heater_on": self.heater_on},
+                                    "tempo": {"today": "BLUE", "tomorrow": "WHITE"}})
+
+    def read_event(self, events) -> dict:
+        lines = next(events).decode().strip().splitlines()
+        return dict(line.split(": ", 1) for line in lines)
+
+    def test_deltas_heartbeats_and_resume(self):
+        response = self.app.get('/events', buffered=False)
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        events = iter(response.response)
+        first = self.read_event(events)
+        self.assertEqual(json.loads(first["data"])["tempo"], {"today": "BLUE", "tomorrow": "WHITE"})
+        self.assertEqual(next(events), b": heartbeat\n\n")
+
+        # Only the changed section is pushed
+        self.heater_on = True
+        main.state.publish(lambda: {"heater": {"heater_on": self.heater_on}})
+        self.assertEqual(json.loads(self.read_event(events)["data"]), {"heater": {"heater_on": True}})
+        response.close()
+
+        # Resume from the first event: the delta covers everything missed
+        self.heater_on = False
+        main.state.publish(lambda: {"heater": {"heater_on": self.heater_on}, "tempo": {"today": "RED", "tomorrow": "WHITE"}})
+        response = self.app.get('/events', headers={'Last-Event-ID': first["id"]}, buffered=False)
+        self.assertEqual(json.loads(self.read_event(iter(response.response))["data"]),
+                         {"tempo": {"today": "RED", "tomorrow": "WHITE"}})
+        response.close()
+
+        # An unknown id, like one of a previous run, gets the full state
+        response = self.app.get('/events', headers={'Last-Event-ID': '1-1'}, buffered=False)
+        self.assertIn("heater", json.loads(self.read_event(iter(response.response))["data"]))
+        response.close()
+
+    def test_subscribers_capped(self):
+        response = self.app.get('/events', buffered=False)
+        self.assertEqual(self.app.get('/events').status_code, 503)
+        response.close()
+        response = self.app.get('/events', buffered=False)
+        self.assertEqual(response.status_code, 200)
+        response.close()
+
+    @patch('Backend.main.server', MagicMock(threads=9))
+    @patch('Backend.main.request_threads', 8)
+    def test_subscribers_leave_server_threads(self):
+        with patch.dict(main.config["app"], {"events_max_subscribers": 32}):
+            response = self.app.get('/events', buffered=False)
+            self.assertEqual(self.app.get('/events').status_code, 503)
+            response.close()
+
+    @patch('Backend.main.signal')
+    @patch('Backend.main.WsgiServer')
+    def test_server_threads_sized_for_subscribers(self, mock_server, mock_signal):
+        self.addCleanup(setattr, main, 'server', None)
+        with patch.dict(main.config, {"server": {"threads": 8}}), \
+                patch.dict(main.config["app"], {"events_max_subscribers": 32}):
+            main.serve()
+        self.assertEqual(mock_server.call_args[0][1]["threads"], 40)
+        mock_server.return_value.serve.assert_called_once()
+
+    @patch('Backend.main.server', MagicMock(threads=40))
+    @patch('Backend.main.request_threads', 8)
+    @patch('Backend.main.state')
+    def test_stream_ends_on_stop(self, mock_state):
+        mock_state.closed = False
+        mock_state.current = main.StatePublisher().publish(lambda: {"heater": {"heater_on": False}})
+        mock_state.wait_for_change.return_value = mock_state.current
+        response = self.app.get('/events', buffered=False)
+        events = iter(response.response)
+        self.read_event(events)
+
+        main.stop_serving()
+        main.server.stop.assert_called_once()
+        mock_state.close.assert_called_once()
+        mock_state.closed = True
+        self.assertIsNone(next(events, None))
+        response.close()
+
+
+class SplitApiTestCase(unittest.TestCase):
+    """API process of the split mode: commands are forwarded to the controller process."""
+
+    def setUp(self):
+        self.app = app.test_client()
+        patcher = patch('Backend.main.controller', MagicMock(timeout=10))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @patch('Backend.main.config_store')
+    def test_setpoint_forwarded(self, mock_config_store):
+        main.controller.call.return_value = 7
+        response = self.app.post('/setpoint', json={"off_peak_cost": "21.5", "full_cost": 18})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["revision"], 7)
+        main.controller.call.assert_called_once_with('set_setpoint', {"off_peak_cost": 21.5, "full_cost": 18.0})
+        mock_config_store.save.assert_not_called()  # The controller owns the config
+
+        self.assertEqual(self.app.post('/setpoint', json={"off_peak_cost": "warm"}).status_code, 400)
+        self.assertEqual(main.controller.call.call_count, 1)
+
+    def test_decision_forwarded(self):
+        main.controller.call.return_value = {"revision": 3, "setpoint": 21.5, "heater_on": True, "timestamp": 0}
+        response = self.app.get('/setpoint/decision?revision=3&timeout=5')
+        self.assertEqual(response.status_code, 200)
+        main.controller.call.assert_called_once_with('decision', {"revision": 3, "timeout": 5.0}, timeout=15.0)
+        self.assertEqual(self.app.get('/setpoint/decision?revision=4').status_code, 202)
+
+    def test_controller_unreachable(self):
+        main.controller.call.side_effect = main.ControlError("Controller unreachable: no such file")
+        response = self.app.post('/setpoint', json={"off_peak_cost": 21.5, "full_cost": 18})
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("unreachable", response.json["error"])
+        self.assertEqual(self.app.get('/stats').status_code, 503)
+
+    def test_metrics_of_the_controller(self):
+        main.controller.call.return_value = "# HELP regpac_periodic_tasks_seconds x\n"
+        response = self.app.get('/metrics')
+        self.assertEqual(response.data, b"# HELP regpac_periodic_tasks_seconds x\n")
+        main.controller.call.assert_called_once_with('metrics', {"openmetrics": False})
+
+
+class WarmStateTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.config = make_config(fhem={"url": "http://fhem"},
+                                  sensors=[{"name": "1", "device": "EnO_1"}, {"name": "2", "device": "EnO_2"}],
+                                  warm_state={"path": os.path.join(self.directory.name, "warm_state.json"), "max_age": 900})
+
+    def tearDown(self):
+        main.temperatures_sources = []
+        main.last_poll = None
+        main.warm_store = None
+        heat_module.status_on_last_sent = None
+        heat_module.timestamp_on_last_sent = 0.0
+        self.directory.cleanup()
+
+    @patch('Backend.main.actuator')
+    @patch('Backend.main.http_client.configure')
+    @patch('Backend.main.log_setpoint')
+    def test_restored_at_boot(self, mock_set, mock_http_configure, mock_actuator):
+        with patch('Backend.main.load_config', return_value=self.config):
+            init_app()
+        main.temperatures_sources = [MEASURES[0], Measure(18.5, "2", datetime(2024, 12, 10, 23, 50, 0))]
+        main.last_poll = time.time() - 20
+        heat_module.restore_state(status=True, sent_at=time.time() - 30)
+        main.tempo_provider.restore_state({"today": "LOW", "tomorrow": "HIGH", "fetched_at": time.time() - 600})
+        main.save_warm_state(force=True)
+
+        # A new run
+        main.temperatures_sources = []
+        main.last_poll = None
+        heat_module.status_on_last_sent = None
+        with patch('Backend.main.load_config', return_value=self.config):
+            init_app()
+
+        self.assertEqual([(m.name, m.temp, m.timestamp) for m in main.temperatures_sources],
+                         [("1", 20.0, datetime(2024, 12, 10, 23, 53, 39)), ("2", 18.5, datetime(2024, 12, 10, 23, 50, 0))])
+        self.assertTrue(main.get_heat_status())
+        self.assertFalse(main.is_refresh_due())
+        self.assertEqual(main.tempo_provider.get_tomorrow_price(), main.DayPrice.HIGH)
+        self.assertAlmostEqual(main.seconds_until_due(main.last_poll, 60), 40, delta=2)
+        self.assertAlmostEqual(main.seconds_until_due(main.tempo_provider.last_success, 10800), 10200, delta=2)
+        self.assertEqual(json.loads(self.app_get('/heater/status')), {"heater_on": True})
+
+    @patch('Backend.main.actuator')
+    @patch('Backend.main.http_client.configure')
+    @patch('Backend.main.log_setpoint')
+    def test_stale_state_only_restores_tempo(self, mock_set, mock_http_configure, mock_actuator):
+        with open(self.config["warm_state"]["path"], "w") as f:
+            json.dump({"version": 1, "saved_at": time.time() - 3600, "polled_at": time.time() - 3600,
+                       "measures": [{"device": "EnO_1", "temp": 20.0, "timestamp": "2024-12-10 23:53:39"}],
+                       "heater": {"status": True, "sent_at": time.time() - 3600},
+                       "tempo": {"today": "NORMAL", "tomorrow": "LOW", "fetched_at": time.time()}}, f)
+        with patch('Backend.main.load_config', return_value=self.config):
+            init_app()
+        self.assertEqual(main.temperatures_sources, [])
+        self.assertIsNone(main.get_heat_status())
+        self.assertEqual(main.tempo_provider.get_today_price(), main.DayPrice.NORMAL)
+
+    def app_get(self, path: str) -> bytes:
+        return app.test_client().get(path).data
+
+
+class EventsFallbackTestCase(unittest.TestCase):
+    @patch('Backend.main.config', {"app": {"pooling_frequency": 60}, "fhem": {"reconciliation_frequency": 3600}})
+    def test_poll_right_after_disconnection(self):
+        polled = threading.Event()
+        local_scheduler = main.Scheduler()
+        local_scheduler.add_job('regulation', polled.set, period=3600, delay=3600)
+        with patch('Backend.main.scheduler', local_scheduler):
+            local_scheduler.start()
+            try:
+                main.on_events_connection(True)
+                self.assertFalse(polled.wait(0.2))
+
+                lost_at = time.monotonic()
+                main.on_events_connection(False)
+                self.assertTrue(polled.wait(5))
+                self.assertLess(time.monotonic() - lost_at, 0.5)
+                self.assertEqual(local_scheduler.get_stats()['regulation']['period'], 60)
+            finally:
+                local_scheduler.stop()
+
+
+class ShutdownTestCase(unittest.TestCase):
+    @patch('Backend.main.localsql')
+    @patch('Backend.main.config_store')
+    @patch('Backend.main.actuator')
+    @patch('Backend.main.scheduler')
+    @patch('Backend.main.events_listener')
+    @patch('Backend.main.config_watcher')
+    def test_stops_threads_then_flushes(self, mock_watcher, mock_listener, mock_scheduler, mock_actuator, mock_config_store,
+                                        mock_localsql):
+        calls = MagicMock()
+        for name, mock in (("watcher", mock_watcher), ("listener", mock_listener), ("scheduler", mock_scheduler),
+                           ("actuator", mock_actuator), ("config", mock_config_store), ("logs", mock_localsql)):
+            calls.attach_mock(mock, name)
+
+        main.shutdown()
+
+        self.assertEqual([call[0] for call in calls.mock_calls],
+                         ["watcher.stop", "listener.stop", "scheduler.stop", "actuator.stop",
+                          "config.flush", "logs.flush", "logs.commit"])
+        self.assertIsNone(main.config_watcher)
+        self.assertIsNone(main.events_listener)
+
+
+class HistoryApiTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = app.test_client()
+        self.store = SqliteStore(":memory:")
+        start = datetime(2024, 12, 10, 0, 0, 0)
+        for minute in range(0, 60, 10):
+            self.store.add_measures([Measure(19.0 + minute / 10, "Room 1", start.replace(minute=minute))])
+        self.store.add_heater(start.timestamp() + 60, True)
+        self.store.commit()
+        self.start = start.timestamp()
+
+    def tearDown(self):
+        self.store.close()
+
+    @patch('Backend.main.config', {"sensors": [{"name": "Room 1", "device": "EnO_1"}]})
+    def test_history_downsampled(self):
+        with patch('Backend.main.localsql.get_store', return_value=self.store):
+            response = self.app.get(f'/history?start={self.start}&end={self.start + 3600}&points=3')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data["bucket"], 1200.0)
+        self.assertEqual(data["sensors"][0]["name"], "Room 1")
+        self.assertEqual([point[1:] for point in data["sensors"][0]["points"]],
+                         [[19.0, 20.0, 19.5], [21.0, 22.0, 21.5], [23.0, 24.0, 23.5]])
+        self.assertEqual(data["heater"], [[self.start + 60, 100]])
+
+    def test_history_iso_range_and_filters(self):
+        with patch('Backend.main.localsql.get_store', return_value=self.store):
+            response = self.app.get('/history?start=2024-12-10T00:00:00&end=2024-12-10T00:30:00&sensor=Room 1&heater=0')
+        data = json.loads(response.data)
+        self.assertEqual(len(data["sensors"][0]["points"]), 3)
+        self.assertNotIn("heater", data)
+
+    def test_history_invalid_range(self):
+        with patch('Backend.main.localsql.get_store', return_value=self.store):
+            response = self.app.get('/history?start=2024-12-10T01:00:00&end=2024-12-10T00:00:00')
+        self.assertEqual(response.status_code, 400)
+
+    def test_history_disabled(self):
+        with patch('Backend.main.localsql.get_store', return_value=None):
+            response = self.app.get('/history')
+        self.assertEqual(response.status_code, 404)
+
+
+class SetpointPlanApiTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = app.test_client()
+
+    @patch('Backend.main.load_config', return_value=make_config())
+    @patch('Backend.main.log_setpoint')
+    def test_plan_served_with_etag(self, mock_set, mock_config_load):
+        init_app()
+        response = self.app.get('/setpoint/plan')
+        self.assertEqual(response.status_code, 200)
+        plan = json.loads(response.data)
+        self.assertEqual([segment["setpoint"] for segment in plan["segments"]], [18.0, 22.0, 18.0, 22.0, 18.0])
+        etag = response.headers['ETag']
+
+        response = self.app.get('/setpoint/plan', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
 
 if __name__ == '__main__':
     unittest.main()
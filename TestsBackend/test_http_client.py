@@ -0,0 +1,94 @@
+import unittest
+import socket
+import threading
+import requests
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch, MagicMock
+
+from Backend.http_client import HttpClient
+
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = b'{"Results": []}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class HttpClientTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _KeepAliveHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+        self.thread.start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/fhem"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connection_is_reused(self):
+        client = HttpClient(timeout=2.0)
+        for _ in range(5):
+            response = client.post(self.url, params={"cmd": "jsonlist2 EnO_1", "XHR": "1"})
+            self.assertEqual(response.status_code, 200)
+
+        stats = client.get_stats()[f"127.0.0.1:{self.server.server_port}"]
+        self.assertEqual(stats["requests"], 5)
+        self.assertEqual(stats["errors"], 0)
+        self.assertEqual(stats["connections_opened"], 1)
+        self.assertEqual(stats["connections_reused"], 4)
+        client.close()
+
+    def test_default_timeout_applied(self):
+        client = HttpClient(timeout=3.0)
+        with patch.object(client._session, 'request', return_value=MagicMock()) as mock_request:
+            client.post(self.url, params={}, timeout=None)
+            client.get(self.url, timeout=10)
+
+        self.assertEqual(mock_request.call_args_list[0][1]["timeout"], 3.0)
+        self.assertEqual(mock_request.call_args_list[1][1]["timeout"], 10)
+
+    def test_error_counted(self):
+        client = HttpClient(timeout=0.5)
+        unused = socket.socket()
+        unused.bind(("127.0.0.1", 0))
+        port = unused.getsockname()[1]
+        unused.close()
+        with self.assertRaises(requests.RequestException):
+            client.get(f"http://127.0.0.1:{port}/fhem")
+        stats = client.get_stats()[f"127.0.0.1:{port}"]
+        self.assertEqual(stats["requests"], 1)
+        self.assertEqual(stats["errors"], 1)
+
+    def test_close_waits_for_requests_in_flight(self):
+        client = HttpClient(timeout=2.0)
+        started, release = threading.Event(), threading.Event()
+
+        def slow_request(*args, **kwargs):
+            started.set()
+            release.wait(2)
+            return MagicMock(status_code=200)
+
+        with patch.object(client._session, 'request', side_effect=slow_request), \
+                patch.object(client._session, 'close') as mock_close:
+            thread = threading.Thread(target=client.post, args=(self.url,))
+            thread.start()
+            started.wait(2)
+            client.close()
+            mock_close.assert_not_called()
+
+            release.set()
+            thread.join(2)
+            mock_close.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+from Backend.influx_exporter import InfluxExporter, format_line
+
+
+class FakeInflux:
+    """Local stand-in for the InfluxDB v1 /write endpoint."""
+
+    def __init__(self):
+        self.writes = []
+        self.status = 204
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"])).decode()
+                if fake.status == 204:
+                    fake.writes.append((parse_qs(urlsplit(self.path).query), body.splitlines()))
+                self.send_response(fake.status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def lines(self) -> list:
+        return [line for _, lines in self.writes for line in lines]
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class InfluxExporterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.influx = FakeInflux()
+        self.directory = tempfile.TemporaryDirectory()
+        self.spool_path = os.path.join(self.directory.name, "spool.txt")
+
+    def tearDown(self):
+        self.influx.stop()
+        self.directory.cleanup()
+
+    def wait_for(self, predicate):
+        deadline = time.monotonic() + 5
+        while not predicate():
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+
+    def test_format_line(self):
+        self.assertEqual(format_line("Regpac_Temperature", {"room": "Living Room"}, {"temperature": 19.5}, 1733871219.0),
+                         "Regpac_Temperature,room=Living\\ Room temperature=19.5 1733871219000000000")
+        self.assertEqual(format_line("Regpac_Tempo", {}, {"today": "LOW", "code": 1, "ok": True}, 1.5),
+                         'Regpac_Tempo today="LOW",code=1i,ok=true 1500000000')
+
+    def test_batched_by_size(self):
+        exporter = InfluxExporter(url=self.influx.url, database="telegraph", batch_size=3, flush_interval=60)
+        exporter.start()
+        for index in range(6):
+            exporter.submit("Regpac_Heat", {"room": "heater"}, {"power": float(index)}, 1000.0 + index)
+        self.wait_for(lambda: len(self.influx.writes) == 2)
+        exporter.stop()
+
+        query, lines = self.influx.writes[0]
+        self.assertEqual(query, {"db": ["telegraph"], "precision": ["ns"]})
+        self.assertEqual(lines, [f"Regpac_Heat,room=heater power={float(index)} {1000 + index}000000000" for index in range(3)])
+        self.assertEqual(exporter.get_stats()["sent"], 6)
+
+    def test_batched_by_interval(self):
+        exporter = InfluxExporter(url=self.influx.url, database="telegraph", batch_size=100, flush_interval=0.05)
+        exporter.start()
+        exporter.submit("Regpac_DBG_Setpoint", {"room": "debug"}, {"setpoint": 19.0}, 1000.0)
+        self.wait_for(lambda: len(self.influx.writes) == 1)
+        exporter.stop()
+
+    def test_spooled_while_unreachable(self):
+        self.influx.status = 503
+        exporter = InfluxExporter(url=self.influx.url, database="telegraph", batch_size=2, flush_interval=60, spool_path=self.spool_path)
+        for index in range(4):
+            exporter.submit("Regpac_Heat", {}, {"power": 0.0}, 1000.0 + index)
+        exporter.flush()
+        self.assertEqual(self.influx.writes, [])
+        self.assertEqual(exporter.get_stats()["spooled"], 4)
+        self.assertGreater(exporter.get_stats()["spool_bytes"], 0)
+
+        self.influx.status = 204
+        exporter.submit("Regpac_Heat", {}, {"power": 100.0}, 2000.0)
+        exporter.flush()
+        self.assertEqual(len(self.influx.lines()), 5)
+        self.assertEqual(exporter.get_stats()["replayed"], 4)
+        self.assertFalse(os.path.exists(self.spool_path))
+
+    def test_bounded_queue_drops_oldest(self):
+        exporter = InfluxExporter(url=self.influx.url, database="telegraph", batch_size=100, flush_interval=60, max_queue=3)
+        for index in range(5):
+            exporter.submit("Regpac_Heat", {}, {"power": float(index)}, 1000.0 + index)
+        stats = exporter.get_stats()
+        self.assertEqual(stats["dropped"], 2)
+        self.assertEqual(stats["queue_length"], 3)
+        exporter.flush()
+        self.assertEqual([line.split(" ")[1] for line in self.influx.lines()], ["power=2.0", "power=3.0", "power=4.0"])
+
+    def test_rejected_points_not_spooled(self):
+        self.influx.status = 400
+        exporter = InfluxExporter(url=self.influx.url, database="telegraph", spool_path=self.spool_path)
+        exporter.submit("Regpac_Heat", {}, {"power": 0.0}, 1000.0)
+        exporter.flush()
+        self.assertEqual(exporter.get_stats()["rejected"], 1)
+        self.assertFalse(os.path.exists(self.spool_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
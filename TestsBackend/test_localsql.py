@@ -1,6 +1,10 @@
+import time
 import unittest
-from unittest.mock import mock_open, patch
-from Backend.localsql import log_heatvalue_if_change, log_setpoint, reset_previous_state
+from datetime import datetime
+from unittest.mock import mock_open, patch, call
+from Backend.localsql import LogWriter, SqliteStore, attach_scheduler, configure, flush, get_store, log_dbg_setpoint, log_heatvalue_if_change, log_measures, log_setpoint, reset_previous_state
+from Backend.scheduler import Scheduler
+from Backend.temperature import Measure
 
 
 class TestLogHeatValue(unittest.TestCase):
@@ -66,5 +70,183 @@ class TestLogHeatValue(unittest.TestCase):
         self.assertIn("setpoint eco: 19.2", log_entry)
 
 
+class TestLogWriter(unittest.TestCase):
+    def setUp(self):
+        reset_previous_state()
+
+    def tearDown(self):
+        configure({})
+        reset_previous_state()
+
+    @patch("builtins.open", new_callable=mock_open)
+    @patch("os.makedirs")
+    def test_lines_batched_until_threshold(self, mock_makedirs, mock_file):
+        configure({"max_pending_lines": 3, "flush_interval": 60})
+        log_dbg_setpoint(20.0)
+        log_dbg_setpoint(20.5)
+        log_dbg_setpoint(21.0)
+        mock_file().write.assert_not_called()
+
+        log_dbg_setpoint(21.5)
+        mock_file().write.assert_called_once()
+        lines = mock_file().write.call_args[0][0].splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertRegex(lines[0], r"^\d{4}-\d{2}-\d{2}_\d{2}:\d{2}:\d{2} debug setpoint: 20.0$")
+        self.assertTrue(lines[3].endswith("debug setpoint: 21.5"))
+
+    @patch("builtins.open", new_callable=mock_open)
+    @patch("os.makedirs")
+    def test_handle_kept_open(self, mock_makedirs, mock_file):
+        log_dbg_setpoint(20.0)
+        log_dbg_setpoint(20.5)
+        flush()
+        self.assertEqual(mock_file.call_count, 1)
+        self.assertEqual(mock_file().write.call_count, 2)
+        mock_file().close.assert_not_called()
+
+    @patch("builtins.open", new_callable=mock_open)
+    @patch("os.makedirs")
+    def test_flush_after_interval(self, mock_makedirs, mock_file):
+        scheduler = Scheduler()
+        attach_scheduler(scheduler)
+        self.addCleanup(attach_scheduler, None)
+        scheduler.start()
+        self.addCleanup(scheduler.stop)
+        configure({"max_pending_lines": 100, "flush_interval": 0.05})
+        log_dbg_setpoint(20.0)
+        mock_file().write.assert_not_called()
+        time.sleep(0.2)
+        mock_file().write.assert_called_once()
+        self.assertEqual(scheduler.get_stats()["logs_flush"]["runs"], 1)
+
+    @patch("builtins.open", new_callable=mock_open)
+    @patch("os.makedirs")
+    def test_overdue_flush_without_scheduler(self, mock_makedirs, mock_file):
+        writer = LogWriter(max_pending_lines=10, flush_interval=0.05)
+        now = time.localtime()
+        writer.write("regpac_heat", "first\n", now)
+        time.sleep(0.1)
+        mock_file().write.assert_not_called()
+        writer.write("regpac_heat", "second\n", now)
+        mock_file().write.assert_called_once_with("first\nsecond\n")
+
+    @patch("builtins.open", new_callable=mock_open)
+    @patch("os.makedirs")
+    def test_rollover_on_new_year(self, mock_makedirs, mock_file):
+        writer = LogWriter(max_pending_lines=10, flush_interval=60)
+        writer.write("regpac_heat", "2024-12-31_23:59:00 heater power: 100\n", time.strptime("2024-12-31 23:59", "%Y-%m-%d %H:%M"))
+        writer.write("regpac_heat", "2025-01-01_00:01:00 heater power: 0\n", time.strptime("2025-01-01 00:01", "%Y-%m-%d %H:%M"))
+        mock_file.assert_called_once_with("/tmp/fhem_logs/regpac_heat-2024.log", "a")
+        mock_file().close.assert_called_once()
+
+        writer.close()
+        self.assertEqual(mock_file.call_args_list[-1], call("/tmp/fhem_logs/regpac_heat-2025.log", "a"))
+        self.assertEqual(mock_file().write.call_args_list[-1][0][0], "2025-01-01_00:01:00 heater power: 0\n")
+
+
+class TestSqliteStore(unittest.TestCase):
+    def setUp(self):
+        self.store = SqliteStore(":memory:", raw_retention_days=1)
+
+    def tearDown(self):
+        self.store.close()
+
+    def count(self, table):
+        return self.store._db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def test_same_reading_stored_once(self):
+        alice = Measure(19.5, "Room Alice", datetime(2024, 12, 10, 23, 53, 39))
+        bob = Measure(18.0, "Room Bob", datetime(2024, 12, 10, 23, 50, 0))
+        self.store.add_measures([alice, bob])
+        self.store.add_measures([alice, bob])
+        self.assertEqual(self.count("measurements"), 0)
+        self.store.commit()
+        self.assertEqual(self.count("measurements"), 2)
+
+        self.store.add_measures([Measure(19.7, "Room Alice", datetime(2024, 12, 10, 23, 58, 39)), bob])
+        self.store.commit()
+        self.assertEqual(self.count("measurements"), 3)
+
+    def test_setpoints_and_tempo_on_change(self):
+        self.store.add_setpoint(1000.0, "effective", 19.0)
+        self.store.add_setpoint(1060.0, "effective", 19.0)
+        self.store.add_setpoint(1120.0, "effective", 21.0)
+        self.store.add_tempo(1000.0, "LOW", "HIGH")
+        self.store.add_tempo(2000.0, "LOW", "HIGH")
+        self.store.add_heater(1000.0, True)
+        self.store.commit()
+        self.assertEqual(self.count("setpoints"), 2)
+        self.assertEqual(self.count("tempo"), 1)
+        self.assertEqual(self.store._db.execute("SELECT ts, power FROM heater").fetchall(), [(1000.0, 100)])
+
+    def test_downsample_old_measurements(self):
+        now = datetime(2024, 12, 10, 12, 0, 0).timestamp()
+        old_hour = datetime(2024, 12, 8, 10, 0, 0)
+        self.store.add_measures([Measure(18.0, "Room Alice", old_hour.replace(minute=5))])
+        self.store.add_measures([Measure(20.0, "Room Alice", old_hour.replace(minute=35))])
+        self.store.add_measures([Measure(21.0, "Room Alice", datetime(2024, 12, 10, 11, 0, 0))])
+        self.store.commit()
+
+        self.store.downsample(now)
+        self.assertEqual(self.count("measurements"), 1)
+        rows = self.store._db.execute("SELECT ts, sensor, value_min, value_max, value_avg, samples FROM measurements_hourly").fetchall()
+        self.assertEqual(rows, [(old_hour.timestamp(), "Room Alice", 18.0, 20.0, 19.0, 2)])
+
+        # A late raw point of an already aggregated hour is merged into it
+        self.store.add_measures([Measure(22.0, "Room Alice", old_hour.replace(minute=50))])
+        self.store.commit()
+        self.store.downsample(now)
+        rows = self.store._db.execute("SELECT value_min, value_max, value_avg, samples FROM measurements_hourly").fetchall()
+        self.assertEqual(rows, [(18.0, 22.0, 20.0, 3)])
+
+    def test_query_measurements_downsampled(self):
+        start = datetime(2024, 12, 10, 0, 0, 0).timestamp()
+        for minute in range(0, 60, 5):
+            self.store.add_measures([Measure(18.0 + minute / 10, "Room Alice", datetime(2024, 12, 10, 0, minute, 0))])
+            self.store.add_measures([Measure(20.0, "Room Bob", datetime(2024, 12, 10, 0, minute, 0))])
+        self.store.commit()
+
+        points = self.store.query_measurements("Room Alice", start, start + 3600, 2)
+        self.assertEqual(points, [[start, 18.0, 20.5, 19.25], [start + 1800, 21.0, 23.5, 22.25]])
+        self.assertEqual(len(self.store.query_measurements("Room Alice", start, start + 3600, 100)), 12)
+        self.assertEqual(self.store.query_measurements("Room Charlie", start, start + 3600, 100), [])
+
+    def test_query_merges_hourly_aggregates(self):
+        old_hour = datetime(2024, 12, 8, 10, 0, 0)
+        self.store.add_measures([Measure(18.0, "Room Alice", old_hour.replace(minute=5)), Measure(20.0, "Room Alice", old_hour.replace(minute=35))])
+        self.store.commit()
+        self.store.downsample(datetime(2024, 12, 10, 12, 0, 0).timestamp())
+        self.store.add_measures([Measure(22.0, "Room Alice", old_hour.replace(minute=50))])
+        self.store.commit()
+
+        points = self.store.query_measurements("Room Alice", old_hour.timestamp(), old_hour.timestamp() + 86400, 1)
+        self.assertEqual(points, [[old_hour.timestamp(), 18.0, 22.0, 20.0]])
+
+    def test_query_heater_transitions(self):
+        self.store.add_heater(1000.0, True)
+        self.store.add_heater(2000.0, False)
+        self.store.add_heater(3000.0, True)
+        self.store.commit()
+        self.assertEqual(self.store.query_heater(1500.0, 5000.0), [[1500.0, 100], [2000.0, 0], [3000.0, 100]])
+        self.assertEqual(self.store.query_heater(0.0, 500.0), [])
+
+    @patch("builtins.open", new_callable=mock_open)
+    @patch("os.makedirs")
+    def test_text_sink_optional(self, mock_makedirs, mock_file):
+        configure({"text": False, "sqlite_path": ":memory:"})
+        try:
+            reset_previous_state()
+            log_heatvalue_if_change(True)
+            log_setpoint(21.5, 18.0)
+            log_measures([Measure(19.5, "Room Alice", datetime(2024, 12, 10, 23, 53, 39))])
+            get_store().commit()
+            mock_file().write.assert_not_called()
+            self.assertEqual(get_store()._db.execute("SELECT COUNT(*) FROM heater").fetchone()[0], 1)
+            self.assertEqual(get_store()._db.execute("SELECT COUNT(*) FROM setpoints").fetchone()[0], 2)
+            self.assertEqual(get_store()._db.execute("SELECT COUNT(*) FROM measurements").fetchone()[0], 1)
+        finally:
+            configure({})
+
+
 if __name__ == "__main__":
     unittest.main()
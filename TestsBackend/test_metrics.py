@@ -0,0 +1,57 @@
+import unittest
+
+from Backend.metrics import Counter, Gauge, Histogram, Registry, render
+
+
+class MetricsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_counter_and_gauge(self):
+        counter = self.registry.register(Counter("regpac_requests", "Requests", ("device",)))
+        counter.inc("EnO_1")
+        counter.inc("EnO_1", amount=2)
+        counter.inc('Room "A"\n')
+        self.registry.register(Gauge("regpac_level", "Level", collect=lambda: 1.5))
+
+        self.assertEqual(self.registry.render(), "\n".join([
+            "# HELP regpac_requests_total Requests",
+            "# TYPE regpac_requests_total counter",
+            'regpac_requests_total{device="EnO_1"} 3',
+            'regpac_requests_total{device="Room \\"A\\"\\n"} 1',
+            "# HELP regpac_level Level",
+            "# TYPE regpac_level gauge",
+            "regpac_level 1.5",
+        ]) + "\n")
+
+    def test_histogram_openmetrics(self):
+        histogram = self.registry.register(Histogram("regpac_duration_seconds", "Duration", buckets=(0.1, 1.0)))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value)
+
+        self.assertEqual(self.registry.render(openmetrics=True), "\n".join([
+            "# HELP regpac_duration_seconds Duration",
+            "# TYPE regpac_duration_seconds histogram",
+            'regpac_duration_seconds_bucket{le="0.1"} 2',
+            'regpac_duration_seconds_bucket{le="1.0"} 3',
+            'regpac_duration_seconds_bucket{le="+Inf"} 4',
+            "regpac_duration_seconds_sum 2.65",
+            "regpac_duration_seconds_count 4",
+        ]) + "\n# EOF\n")
+
+    def test_register_returns_existing(self):
+        first = self.registry.register(Counter("regpac_requests", "Requests"))
+        self.assertIs(self.registry.register(Counter("regpac_requests", "Requests")), first)
+
+    def test_unset_collected_metric_has_no_sample(self):
+        self.registry.register(Gauge("regpac_age_seconds", "Age", collect=lambda: None))
+        self.assertEqual(self.registry.render(), "# HELP regpac_age_seconds Age\n# TYPE regpac_age_seconds gauge\n")
+
+    def test_process_metrics(self):
+        text = render()
+        self.assertRegex(text, r"\nprocess_resident_memory_bytes [1-9]\d*\n")
+        self.assertRegex(text, r"\nregpac_threads [1-9]\d*\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+from datetime import datetime
+
+from Backend.off_peak import OffPeakSchedule, parse_hour_min
+
+
+def reference_is_in_off_peak(periods: list, current_time_str: str) -> bool:
+    # Former per-call implementation of main.is_in_off_peak
+    current_time = datetime.strptime(current_time_str, '%H:%M').time()
+    for period in periods:
+        start = datetime.strptime(period['start'], '%H:%M').time()
+        end = datetime.strptime(period['end'], '%H:%M').time()
+        if start < end:
+            if start <= current_time <= end:
+                return True
+        else:
+            if current_time >= start or current_time <= end:
+                return True
+    return False
+
+
+class OffPeakScheduleTestCase(unittest.TestCase):
+    configs = [
+        [{"start": "00:30", "end": "07:30"}, {"start": "12:30", "end": "14:00"}],
+        [{"start": "00:30", "end": "07:30"}, {"start": "12:30", "end": "14:00"}, {"start": "23:00", "end": "00:10"}],
+        [{"start": "00:00", "end": "06:00"}, {"start": "22:00", "end": "23:59"}],
+        [{"start": "22:00", "end": "06:00"}],
+        [{"start": "10:00", "end": "10:00"}],
+        [],
+    ]
+
+    def test_same_answer_as_reference(self):
+        for periods in self.configs:
+            schedule = OffPeakSchedule(periods)
+            for minute in range(24 * 60):
+                time_str = f"{minute // 60:02d}:{minute % 60:02d}"
+                self.assertEqual(schedule.is_off_peak(parse_hour_min(time_str)), reference_is_in_off_peak(periods, time_str), f"{periods} at {time_str}")
+
+    def test_minutes_until_transition(self):
+        schedule = OffPeakSchedule([{"start": "00:30", "end": "07:30"}, {"start": "12:30", "end": "14:00"}])
+        self.assertEqual(schedule.minutes_until_transition(parse_hour_min("00:00")), 30)
+        self.assertEqual(schedule.minutes_until_transition(parse_hour_min("07:30")), 1)
+        self.assertEqual(schedule.minutes_until_transition(parse_hour_min("07:31")), 5 * 60 - 1)
+        # Across midnight the next transition is tomorrow's 00:30
+        self.assertEqual(schedule.minutes_until_transition(parse_hour_min("23:00")), 90)
+
+    def test_midnight_crossing_transition(self):
+        schedule = OffPeakSchedule([{"start": "22:00", "end": "06:00"}])
+        self.assertEqual(schedule.minutes_until_transition(parse_hour_min("23:59")), 6 * 60 + 2)
+        self.assertEqual(schedule.seconds_until_transition(datetime(2024, 12, 10, 21, 59, 45)), 15.0)
+
+    def test_no_transition(self):
+        self.assertIsNone(OffPeakSchedule([]).minutes_until_transition(0))
+        self.assertIsNone(OffPeakSchedule([{"start": "10:00", "end": "10:00"}]).seconds_until_transition(datetime(2024, 12, 10, 12, 0, 0)))
+
+    def test_invalid_time(self):
+        with self.assertRaises(ValueError):
+            OffPeakSchedule([{"start": "25:00", "end": "06:00"}])
+
+
+if __name__ == '__main__':
+    unittest.main()
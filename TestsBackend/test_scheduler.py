@@ -0,0 +1,115 @@
+import threading
+import time
+import unittest
+
+from Backend.scheduler import Scheduler
+
+
+class SchedulerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = Scheduler()
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+    def test_fixed_cadence_without_drift(self):
+        runs = []
+
+        def job():
+            runs.append(time.monotonic())
+            time.sleep(0.02)  # The run time must not shift the next ticks
+
+        self.scheduler.add_job('job', job, period=0.05)
+        self.scheduler.start()
+        time.sleep(0.52)
+        self.scheduler.stop()
+
+        self.assertIn(len(runs), (10, 11))
+        for index, run in enumerate(runs):
+            self.assertAlmostEqual(run - runs[0], index * 0.05, delta=0.03)
+        stats = self.scheduler.get_stats()['job']
+        self.assertEqual(stats['overruns'], 0)
+        self.assertGreaterEqual(stats['last_duration'], 0.02)
+
+    def test_missed_ticks_skipped(self):
+        runs = []
+
+        def job():
+            runs.append(time.monotonic())
+            if len(runs) == 1:
+                time.sleep(0.17)
+
+        self.scheduler.add_job('job', job, period=0.05)
+        self.scheduler.start()
+        time.sleep(0.32)
+        self.scheduler.stop()
+
+        stats = self.scheduler.get_stats()['job']
+        self.assertEqual(stats['overruns'], 3)
+        # No burst to catch up: the second run happens on the next tick of the original grid
+        self.assertAlmostEqual(runs[1] - runs[0], 0.2, delta=0.03)
+
+    def test_failing_job_isolated(self):
+        calls = {'bad': 0, 'good': 0}
+
+        def bad():
+            calls['bad'] += 1
+            raise RuntimeError('boom')
+
+        def good():
+            calls['good'] += 1
+
+        self.scheduler.add_job('bad', bad, period=0.05)
+        self.scheduler.add_job('good', good, period=0.05)
+        self.scheduler.start()
+        time.sleep(0.22)
+        self.scheduler.stop()
+
+        self.assertGreaterEqual(calls['bad'], 4)
+        self.assertGreaterEqual(calls['good'], 4)
+        self.assertEqual(self.scheduler.get_stats()['bad']['errors'], calls['bad'])
+
+    def test_trigger_runs_once_without_changing_cadence(self):
+        ran = threading.Event()
+        runs = []
+
+        def job():
+            runs.append(time.monotonic())
+            ran.set()
+
+        self.scheduler.add_job('job', job, period=10.0, delay=10.0)
+        self.scheduler.start()
+        self.scheduler.trigger('job')
+        self.assertTrue(ran.wait(timeout=2))
+        time.sleep(0.1)
+        self.assertEqual(len(runs), 1)
+        self.assertEqual(self.scheduler.get_stats()['job']['runs'], 1)
+
+    def test_job_without_period_only_runs_when_triggered(self):
+        runs = []
+        self.scheduler.add_job('job', lambda: runs.append(time.monotonic()))
+        self.scheduler.add_job('other', lambda: None, period=0.01)
+        self.scheduler.start()
+        time.sleep(0.05)
+        self.assertEqual(runs, [])
+
+        # Triggers pending at the same time coalesce into a single run
+        self.scheduler.stop()
+        for _ in range(3):
+            self.scheduler.trigger('job')
+        self.scheduler.start()
+        time.sleep(0.05)
+        self.assertEqual(len(runs), 1)
+
+    def test_set_period(self):
+        runs = []
+        self.scheduler.add_job('job', lambda: runs.append(time.monotonic()), period=10.0)
+        self.scheduler.start()
+        time.sleep(0.05)
+        self.scheduler.set_period('job', 0.05)
+        time.sleep(0.23)
+        self.assertGreaterEqual(len(runs), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,7 @@
 import unittest
+import threading
+import time
+import requests
 import Backend.heat
 from unittest.mock import patch, MagicMock
 
@@ -11,7 +14,7 @@ class SendCmd_Actuator(unittest.TestCase):
     def tearDown(self):
         pass
 
-    @patch('Backend.heat.requests.post')
+    @patch('Backend.heat.http_client.post')
     def test_send_heat_on(self, mock_post):
         config = {
             'actuator': {'device': 'heater1'},
@@ -30,7 +33,7 @@ class SendCmd_Actuator(unittest.TestCase):
             params={"cmd": "set heater1 on", "XHR": "1"}
         )
 
-    @patch('Backend.heat.requests.post')
+    @patch('Backend.heat.http_client.post')
     def test_send_heat_off(self, mock_post):
         config = {
             'actuator': {'device': 'heater1'},
@@ -49,7 +52,7 @@ class SendCmd_Actuator(unittest.TestCase):
             params={"cmd": "set heater1 off", "XHR": "1"}
         )
 
-    @patch('Backend.heat.requests.post')
+    @patch('Backend.heat.http_client.post')
     def test_send_heat_cmd_fail(self, mock_post):
         config = {
             'actuator': {'device': 'heater1'},
@@ -68,7 +71,7 @@ class SendCmd_Actuator(unittest.TestCase):
             params={"cmd": "set heater1 off", "XHR": "1"}
         )
 
-    @patch('Backend.heat.requests.post')
+    @patch('Backend.heat.http_client.post')
     @patch('Backend.heat.time.time')
     def test_send_heat_with_time_gap(self, mock_time, mock_post):
         config = {
@@ -108,7 +111,7 @@ class SendCmd_Actuator(unittest.TestCase):
             params={"cmd": "set heater1 on", "XHR": "1"}
         )
 
-    @patch('Backend.heat.requests.post')
+    @patch('Backend.heat.http_client.post')
     @patch('Backend.heat.time.time')
     def test_send_heat_with_time_gap_and_change(self, mock_time, mock_post):
         config = {
@@ -152,7 +155,7 @@ class SendCmd_Actuator(unittest.TestCase):
             params={"cmd": "set heater1 on", "XHR": "1"}
         )
 
-    @patch('Backend.heat.requests.post')
+    @patch('Backend.heat.http_client.post')
     @patch('Backend.heat.time.time')
     def test_cornercase_send_heat_with_time_gap_and_change_and_fail(self, mock_time, mock_post):
         config = {
@@ -198,3 +201,143 @@ class SendCmd_Actuator(unittest.TestCase):
             'http://example.com',
             params={"cmd": "set heater1 off", "XHR": "1"}
         )
+
+    @patch('Backend.heat.http_client.post')
+    def test_restored_state_not_sent_again(self, mock_post):
+        mock_post.return_value = MagicMock(status_code=200)
+        config = {'actuator': {'device': 'heater1'}, 'fhem': {'url': 'http://example.com'}}
+
+        Backend.heat.restore_state(status=True, sent_at=time.time() - 60)
+        self.assertFalse(Backend.heat.is_refresh_due())
+        self.assertTrue(Backend.heat.send_heat(config=config, enable=True))
+        mock_post.assert_not_called()
+        self.assertTrue(Backend.heat.send_heat(config=config, enable=False))
+        mock_post.assert_called_once()
+
+    def test_expired_state_not_restored(self):
+        Backend.heat.restore_state(status=True, sent_at=time.time() - 7200)
+        self.assertIsNone(Backend.heat.get_heat_status())
+        self.assertTrue(Backend.heat.is_refresh_due())
+
+
+class Dispatch_Actuator(unittest.TestCase):
+    config = {
+        'actuator': {'device': 'heater1'},
+        'fhem': {'url': 'http://example.com'}
+    }
+
+    def setUp(self):
+        Backend.heat.timestamp_on_last_sent = 0.0
+        Backend.heat.status_on_last_sent = None
+        self.dispatcher = Backend.heat.ActuatorDispatcher(retry_base_delay=0.01, retry_max_delay=0.05)
+
+    def tearDown(self):
+        self.dispatcher.stop()
+        Backend.heat.ellapsed_time_before_force_sent = 3600.0
+
+    def wait_for(self, predicate):
+        deadline = time.monotonic() + 5
+        while not predicate():
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+
+    @patch('Backend.heat.http_client.post')
+    def test_superseded_commands_coalesced(self, mock_post):
+        release = threading.Event()
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+
+        def slow_post(url, params):
+            release.wait(timeout=5)
+            return mock_response
+
+        mock_post.side_effect = slow_post
+        self.dispatcher.start()
+
+        self.dispatcher.request(config=self.config, enable=True)
+        self.wait_for(lambda: mock_post.call_count == 1)
+        # Sent while the first command is still in flight: only the latest one must reach FHEM
+        self.dispatcher.request(config=self.config, enable=False)
+        self.dispatcher.request(config=self.config, enable=True)
+        self.dispatcher.request(config=self.config, enable=False)
+        release.set()
+
+        self.wait_for(lambda: Backend.heat.status_on_last_sent is False)
+        self.assertEqual(mock_post.call_count, 2)
+        self.assertEqual(mock_post.call_args_list[1], unittest.mock.call('http://example.com', params={"cmd": "set heater1 off", "XHR": "1"}))
+
+    @patch('Backend.heat.http_client.post')
+    def test_request_does_not_block(self, mock_post):
+        release = threading.Event()
+        mock_post.side_effect = lambda url, params: release.wait(timeout=5)
+        self.dispatcher.start()
+
+        start = time.monotonic()
+        self.dispatcher.request(config=self.config, enable=True)
+        self.dispatcher.request(config=self.config, enable=False)
+        self.assertLess(time.monotonic() - start, 0.1)
+        release.set()
+
+    @patch('Backend.heat.http_client.post')
+    def test_failed_command_retried(self, mock_post):
+        mock_response_fail = MagicMock()
+        mock_response_fail.status_code = 500
+        mock_response_ok = MagicMock()
+        mock_response_ok.status_code = 200
+        mock_post.side_effect = [mock_response_fail, requests.ConnectionError("down"), mock_response_ok]
+        self.dispatcher.on_sent = MagicMock()
+        self.dispatcher.start()
+
+        self.dispatcher.request(config=self.config, enable=True)
+        self.wait_for(lambda: self.dispatcher.on_sent.called)
+        self.assertIs(Backend.heat.status_on_last_sent, True)
+        self.assertEqual(mock_post.call_count, 3)
+        self.dispatcher.on_sent.assert_called_once_with()
+
+    @patch('Backend.heat.http_client.post')
+    def test_worker_survives_unexpected_error(self, mock_post):
+        mock_post.return_value = MagicMock(status_code=200)
+        self.dispatcher.on_sent = MagicMock()
+        self.dispatcher.start()
+
+        # A config without actuator device, as after a bad reload
+        self.dispatcher.request(config={'fhem': {'url': 'http://example.com'}}, enable=True)
+        self.wait_for(lambda: self.dispatcher._failures >= 1)
+        self.assertTrue(self.dispatcher._thread.is_alive())
+
+        self.dispatcher.request(config=self.config, enable=False)
+        self.wait_for(lambda: self.dispatcher.on_sent.called)
+        self.assertIs(Backend.heat.status_on_last_sent, False)
+
+    def test_idle_until_first_request(self):
+        # A restored heater state with an overdue refresh, but no command requested yet
+        Backend.heat.status_on_last_sent = True
+        Backend.heat.timestamp_on_last_sent = time.time() - 7200
+        self.assertIsNone(self.dispatcher._next_wakeup())
+
+        self.dispatcher.request(config=self.config, enable=True)
+        self.assertIsNotNone(self.dispatcher._next_wakeup())
+
+    @patch('Backend.heat.http_client.post')
+    def test_failed_refresh_still_due(self, mock_post):
+        mock_post.return_value = MagicMock(status_code=500, text="Internal Error")
+        Backend.heat.status_on_last_sent = True
+        Backend.heat.timestamp_on_last_sent = time.time() - 7200
+
+        self.assertFalse(Backend.heat.send_heat(config=self.config, enable=True))
+        self.assertTrue(Backend.heat.is_refresh_due())
+        self.assertFalse(Backend.heat.send_heat(config=self.config, enable=True))
+        self.assertEqual(mock_post.call_count, 2)
+
+    @patch('Backend.heat.http_client.post')
+    def test_periodic_refresh_resent(self, mock_post):
+        Backend.heat.ellapsed_time_before_force_sent = 0.0
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_post.return_value = mock_response
+        with patch('Backend.heat.ActuatorDispatcher._next_wakeup', return_value=0.01):
+            self.dispatcher.start()
+            self.dispatcher.request(config=self.config, enable=True)
+            self.wait_for(lambda: mock_post.call_count >= 3)
+        for call in mock_post.call_args_list:
+            self.assertEqual(call, unittest.mock.call('http://example.com', params={"cmd": "set heater1 on", "XHR": "1"}))
@@ -0,0 +1,96 @@
+import hashlib
+import json
+import threading
+import time
+import unittest
+from datetime import date
+
+from Backend.off_peak import MINUTES_PER_DAY, OffPeakSchedule
+from Backend.setpoint_planner import SetpointPlanner
+from Backend.tempo_provider import DayPrice
+
+
+class SetpointPlannerTestCase(unittest.TestCase):
+    tempo = {"temperature_reduction_high_cost": -2.0, "temperature_increase_prior_to_high_cost": 2.0}
+
+    def setUp(self):
+        self.schedule = OffPeakSchedule([{"start": "00:30", "end": "07:30"}, {"start": "12:30", "end": "14:00"}])
+        self.planner = SetpointPlanner()
+
+    def update(self, today=DayPrice.NORMAL, tomorrow=DayPrice.NORMAL, off_peak_temp=21.0, full_cost_temp=19.0, day=date(2024, 12, 10)):
+        return self.planner.update(day=day, schedule=self.schedule, off_peak_temp=off_peak_temp, full_cost_temp=full_cost_temp,
+                                   tempo_settings=self.tempo, today_price=today, tomorrow_price=tomorrow)
+
+    def test_normal_day(self):
+        self.update()
+        self.assertEqual(self.planner.lookup(0), (19.0, 'full_cost'))
+        self.assertEqual(self.planner.lookup(30), (21.0, 'off_peak'))
+        self.assertEqual(self.planner.lookup(7 * 60 + 30), (21.0, 'off_peak'))
+        self.assertEqual(self.planner.lookup(7 * 60 + 31), (19.0, 'full_cost'))
+
+    def test_tempo_red_days(self):
+        self.update(today=DayPrice.HIGH, tomorrow=DayPrice.HIGH)
+        self.assertEqual(self.planner.lookup(13 * 60), (23.0, 'off_peak + 2.0° due to Tempo tomorrow Red day'))
+        self.assertEqual(self.planner.lookup(10 * 60), (17.0, 'full_cost + -2.0° due to Tempo today Red day'))
+
+    def test_timeline_covers_today_and_tomorrow(self):
+        self.update(tomorrow=DayPrice.HIGH)
+        segments = self.planner.segments
+        self.assertEqual(segments[0], {"start": "2024-12-10T00:00:00", "end": "2024-12-10T00:30:00", "setpoint": 19.0, "reason": "full_cost"})
+        self.assertEqual(segments[1]["setpoint"], 23.0)
+        self.assertEqual(segments[1]["end"], "2024-12-10T07:31:00")
+        self.assertEqual(segments[-1]["end"], "2024-12-12T00:00:00")
+        # Tomorrow full cost hours are reduced as tomorrow is a Red day, its off-peak hours are not increased
+        tomorrow = [segment for segment in segments if segment["start"].startswith("2024-12-11")]
+        self.assertEqual([segment["setpoint"] for segment in tomorrow], [17.0, 21.0, 17.0, 21.0, 17.0])
+        for previous, following in zip(segments, segments[1:]):
+            self.assertEqual(previous["end"], following["start"])
+
+    def test_rebuilt_only_on_change(self):
+        self.assertTrue(self.update())
+        etag = self.planner.etag
+        self.assertFalse(self.update())
+        self.assertEqual(self.planner.revision, 1)
+        self.assertTrue(self.update(tomorrow=DayPrice.HIGH))
+        self.assertTrue(self.update(tomorrow=DayPrice.HIGH, off_peak_temp=20.0))
+        self.assertTrue(self.update(tomorrow=DayPrice.HIGH, off_peak_temp=20.0, day=date(2024, 12, 11)))
+        self.assertEqual(self.planner.revision, 4)
+        self.assertNotEqual(self.planner.etag, etag)
+
+    def test_concurrent_update_and_lookup(self):
+        self.update()
+        errors = []
+        stop = threading.Event()
+
+        def write(offset):
+            temperatures = [19.0 + offset, 20.0 + offset]
+            index = 0
+            while not stop.is_set():
+                index += 1
+                self.update(full_cost_temp=temperatures[index % 2])
+
+        def read():
+            while not stop.is_set():
+                try:
+                    self.planner.lookup(MINUTES_PER_DAY - 1)
+                    body, etag = self.planner.get_plan()
+                    if hashlib.sha1(body.encode()).hexdigest() != etag:
+                        errors.append("body and etag disagree")
+                except Exception as e:
+                    errors.append(repr(e))
+
+        threads = [threading.Thread(target=write, args=(offset,)) for offset in (0.0, 0.5)] + [threading.Thread(target=read)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.5)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(self.planner._today_setpoints), MINUTES_PER_DAY)
+        self.assertEqual(json.loads(self.planner.body)["revision"], self.planner.revision)
+
+
+if __name__ == '__main__':
+    unittest.main()
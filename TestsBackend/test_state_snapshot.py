@@ -0,0 +1,49 @@
+import threading
+import time
+import unittest
+
+from Backend.state_snapshot import StatePublisher
+
+
+class StatePublisherTestCase(unittest.TestCase):
+    def setUp(self):
+        self.publisher = StatePublisher()
+
+    def test_sections_serialised_once(self):
+        snapshot = self.publisher.publish(lambda: {"heater": {"heater_on": True}, "tempo": {"today": "BLUE"}})
+        self.assertEqual(snapshot.version, 1)
+        self.assertEqual(snapshot.sections["heater"].body, '{"heater_on": true}')
+        self.assertEqual(snapshot.sections["tempo"].data, {"today": "BLUE"})
+        self.assertIs(self.publisher.current, snapshot)
+
+    def test_version_moves_only_on_change(self):
+        first = self.publisher.publish(lambda: {"heater": {"heater_on": True}, "tempo": {"today": "BLUE"}})
+        self.assertIs(self.publisher.publish(lambda: {"heater": {"heater_on": True}}), first)
+
+        second = self.publisher.publish(lambda: {"heater": {"heater_on": False}})
+        self.assertEqual(second.version, 2)
+        self.assertNotEqual(second.sections["heater"].etag, first.sections["heater"].etag)
+        self.assertIs(second.sections["tempo"], first.sections["tempo"])
+        # The previous snapshot is left untouched for the readers still holding it
+        self.assertEqual(first.sections["heater"].data, {"heater_on": True})
+
+    def test_close_wakes_waiters(self):
+        snapshot = self.publisher.publish(lambda: {"heater": {"heater_on": True}})
+        threading.Timer(0.05, self.publisher.close).start()
+        start = time.monotonic()
+        self.assertIs(self.publisher.wait_for_change(snapshot.version, timeout=5), snapshot)
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertTrue(self.publisher.closed)
+
+    def test_snapshot_immutable(self):
+        snapshot = self.publisher.publish(lambda: {"heater": {"heater_on": True}})
+        with self.assertRaises(AttributeError):
+            snapshot.version = 3
+        with self.assertRaises(TypeError):
+            snapshot.sections["heater"] = None
+        with self.assertRaises(AttributeError):
+            snapshot.sections["heater"].body = "{}"
+
+
+if __name__ == '__main__':
+    unittest.main()
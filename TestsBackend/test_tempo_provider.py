@@ -7,6 +7,8 @@ current_directory = os.path.dirname(os.path.abspath(__file__))
 backend_path = os.path.join(current_directory, "../Backend")
 sys.path.insert(0, backend_path)
 
+from datetime import datetime
+
 from Backend.tempo_provider import TempoProvider, DayPrice
 
 
@@ -38,7 +40,7 @@ class TempoProviderTestCase(unittest.TestCase):
         self.assertEqual(self.provider._map_code_to_price(4), DayPrice.UNKNOWN)
         self.assertEqual(self.provider._map_code_to_price(-1), DayPrice.UNKNOWN)
 
-    @patch('Backend.tempo_provider.requests.get')
+    @patch('Backend.tempo_provider.http_client.get')
     def test_fetch_tempo_day_success(self, mock_get):
         """Test successful API call to fetch Tempo day data"""
         mock_response = MagicMock()
@@ -57,11 +59,10 @@ class TempoProviderTestCase(unittest.TestCase):
         self.assertEqual(result["codeJour"], 3)
         self.assertEqual(result["libCouleur"], "Rouge")
         mock_get.assert_called_once_with(
-            "https://www.api-couleur-tempo.fr/api/jourTempo/today",
-            timeout=10
+            "https://www.api-couleur-tempo.fr/api/jourTempo/today"
         )
 
-    @patch('Backend.tempo_provider.requests.get')
+    @patch('Backend.tempo_provider.http_client.get')
     def test_fetch_tempo_day_http_error(self, mock_get):
         """Test handling of HTTP error during API call"""
         mock_get.side_effect = Exception("Connection error")
@@ -70,7 +71,7 @@ class TempoProviderTestCase(unittest.TestCase):
 
         self.assertIsNone(result)
 
-    @patch('Backend.tempo_provider.requests.get')
+    @patch('Backend.tempo_provider.http_client.get')
     def test_fetch_tempo_day_json_error(self, mock_get):
         """Test handling of JSON parsing error"""
         mock_response = MagicMock()
@@ -82,7 +83,7 @@ class TempoProviderTestCase(unittest.TestCase):
 
         self.assertIsNone(result)
 
-    @patch('Backend.tempo_provider.requests.get')
+    @patch('Backend.tempo_provider.http_client.get')
     def test_update_success(self, mock_get):
         """Test successful update of both today and tomorrow data"""
         today_response = MagicMock()
@@ -113,7 +114,7 @@ class TempoProviderTestCase(unittest.TestCase):
         self.assertIsNotNone(self.provider.get_tomorrow_data())
         self.assertEqual(mock_get.call_count, 2)
 
-    @patch('Backend.tempo_provider.requests.get')
+    @patch('Backend.tempo_provider.http_client.get')
     def test_update_today_failure(self, mock_get):
         """Test update when today's API call fails"""
         mock_get.side_effect = Exception("Connection error")
@@ -123,7 +124,7 @@ class TempoProviderTestCase(unittest.TestCase):
         self.assertEqual(self.provider.get_today_price(), DayPrice.UNKNOWN)
         self.assertEqual(self.provider.get_tomorrow_price(), DayPrice.UNKNOWN)
 
-    @patch('Backend.tempo_provider.requests.get')
+    @patch('Backend.tempo_provider.http_client.get')
     def test_update_tomorrow_failure(self, mock_get):
         """Test update when only tomorrow's API call fails"""
         today_response = MagicMock()
@@ -142,6 +143,29 @@ class TempoProviderTestCase(unittest.TestCase):
         self.assertEqual(self.provider.get_today_price(), DayPrice.NORMAL)
         self.assertEqual(self.provider.get_tomorrow_price(), DayPrice.UNKNOWN)
 
+    def test_restore_state(self):
+        fetched_at = datetime(2025, 1, 15, 11, 5).timestamp()
+        state = {"today": "LOW", "tomorrow": "HIGH", "today_data": {"codeJour": 1}, "tomorrow_data": {"codeJour": 3}, "fetched_at": fetched_at}
+
+        self.assertTrue(self.provider.restore_state(state, now=datetime(2025, 1, 15, 18, 0)))
+        self.assertEqual(self.provider.get_today_price(), DayPrice.LOW)
+        self.assertEqual(self.provider.get_tomorrow_price(), DayPrice.HIGH)
+        self.assertEqual(self.provider.last_success, fetched_at)
+
+        # Fetched yesterday: yesterday's tomorrow is today
+        provider = TempoProvider()
+        self.assertTrue(provider.restore_state(state, now=datetime(2025, 1, 16, 7, 0)))
+        self.assertEqual(provider.get_today_price(), DayPrice.HIGH)
+        self.assertEqual(provider.get_today_data(), {"codeJour": 3})
+        self.assertEqual(provider.get_tomorrow_price(), DayPrice.UNKNOWN)
+
+        provider = TempoProvider()
+        self.assertFalse(provider.restore_state(state, now=datetime(2025, 1, 17, 7, 0)))
+        self.assertFalse(provider.restore_state(dict(state, tomorrow="PURPLE"), now=datetime(2025, 1, 15, 18, 0)))
+        self.assertFalse(provider.restore_state(TempoProvider().get_state()))
+        self.assertEqual(provider.get_today_price(), DayPrice.UNKNOWN)
+        self.assertIsNone(provider.last_success)
+
     def test_initial_state(self):
         """Test that provider initializes with UNKNOWN prices"""
         provider = TempoProvider()
@@ -150,7 +174,7 @@ class TempoProviderTestCase(unittest.TestCase):
         self.assertIsNone(provider.get_today_data())
         self.assertIsNone(provider.get_tomorrow_data())
 
-    @patch('Backend.tempo_provider.requests.get')
+    @patch('Backend.tempo_provider.http_client.get')
     def test_all_price_levels(self, mock_get):
         """Test all three price levels can be properly fetched and stored"""
         # Test Blue (Low)
@@ -168,7 +192,7 @@ class TempoProviderTestCase(unittest.TestCase):
         self.assertEqual(self.provider.get_today_price(), DayPrice.LOW)
         self.assertEqual(self.provider.get_tomorrow_price(), DayPrice.NORMAL)
 
-    @patch('Backend.tempo_provider.requests.get')
+    @patch('Backend.tempo_provider.http_client.get')
     def test_consecutive_updates(self, mock_get):
         """Test that consecutive updates properly overwrite previous data"""
         # First update
@@ -0,0 +1,54 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from Backend.warm_state import FORMAT_VERSION, WarmStateStore
+
+
+class WarmStateStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "warm_state.json")
+        self.store = WarmStateStore(self.path, max_age=60)
+        self.snapshot = {"polled_at": time.time(), "measures": [{"device": "EnO_1", "temp": 19.5, "timestamp": "2024-12-10 23:53:39"}],
+                         "heater": {"status": True, "sent_at": time.time()}}
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_save_and_load(self):
+        self.assertIsNone(self.store.load())
+        self.assertTrue(self.store.save(self.snapshot))
+        loaded = self.store.load()
+        self.assertEqual(loaded["version"], FORMAT_VERSION)
+        self.assertEqual(loaded["measures"], self.snapshot["measures"])
+        self.assertTrue(self.store.is_fresh(loaded))
+        self.assertFalse(self.store.is_fresh(loaded, now=loaded["saved_at"] + 120))
+        self.assertEqual(os.listdir(self.directory.name), ["warm_state.json"])
+
+    def test_unchanged_snapshot_not_written(self):
+        self.assertTrue(self.store.save(self.snapshot))
+        # Only the poll time moved
+        self.assertFalse(self.store.save(dict(self.snapshot, polled_at=time.time() + 1)))
+        self.assertTrue(self.store.save(dict(self.snapshot, heater={"status": False, "sent_at": time.time()})))
+        self.assertTrue(self.store.save(dict(self.snapshot, heater={"status": False, "sent_at": time.time()}), force=True))
+        self.assertEqual(self.store.get_stats(), {"writes": 3, "skipped": 1, "errors": 0})
+
+    def test_unusable_file_ignored(self):
+        with open(self.path, "w") as f:
+            f.write('{"version": 1, "meas')
+        self.assertIsNone(self.store.load())
+        with open(self.path, "w") as f:
+            json.dump({"version": FORMAT_VERSION + 1}, f)
+        self.assertIsNone(self.store.load())
+
+    def test_failed_write_counted(self):
+        store = WarmStateStore(os.path.join(self.directory.name, "missing", "warm_state.json"))
+        self.assertFalse(store.save(self.snapshot))
+        self.assertEqual(store.get_stats()["errors"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
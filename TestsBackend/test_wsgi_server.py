@@ -0,0 +1,76 @@
+import threading
+import time
+import unittest
+
+import requests
+from flask import Flask
+
+from Backend.wsgi_server import WsgiServer
+
+
+class WsgiServerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.release = threading.Event()
+
+        @self.app.route('/fast')
+        def fast():
+            return "fast"
+
+        @self.app.route('/slow')
+        def slow():
+            self.release.wait(5)
+            return "slow"
+
+        self.server = WsgiServer(self.app, {"host": "127.0.0.1", "port": 0, "threads": 2, "drain_timeout": 5})
+        self.thread = threading.Thread(target=self.server.serve, daemon=True)
+        self.thread.start()
+        self.assertTrue(self.server.wait_ready(5))
+        self.url = f"http://127.0.0.1:{self.server.effective_port}"
+
+    def tearDown(self):
+        self.release.set()
+        self.server.stop()
+        self.thread.join(10)
+
+    def test_keep_alive(self):
+        with requests.Session() as session:
+            for _ in range(3):
+                response = session.get(self.url + "/fast", timeout=5)
+                self.assertEqual(response.text, "fast")
+            self.assertEqual(response.headers.get("Connection", "keep-alive").lower(), "keep-alive")
+
+    def test_stop_drains_requests_in_progress(self):
+        result = {}
+        client = threading.Thread(target=lambda: result.setdefault("response", requests.get(self.url + "/slow", timeout=10)))
+        client.start()
+        time.sleep(0.2)  # The request is being handled
+
+        self.server.stop()
+        time.sleep(0.2)
+        self.assertTrue(self.thread.is_alive())  # Still draining
+        self.release.set()
+        client.join(10)
+        self.thread.join(10)
+
+        self.assertFalse(self.thread.is_alive())
+        self.assertEqual(result["response"].status_code, 200)
+        self.assertEqual(result["response"].text, "slow")
+        with self.assertRaises(requests.ConnectionError):
+            requests.get(self.url + "/fast", timeout=2)
+
+    def test_drain_timeout(self):
+        self.server.drain_timeout = 0.3
+        client = threading.Thread(target=lambda: self.assertRaises(requests.RequestException, requests.get, self.url + "/slow", timeout=10))
+        client.start()
+        time.sleep(0.2)
+        start = time.monotonic()
+        self.server.stop()
+        self.thread.join(10)
+        self.assertLess(time.monotonic() - start, 3)
+        self.release.set()
+        client.join(10)
+
+
+if __name__ == '__main__':
+    unittest.main()